@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import resource
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import imagehash
+from PIL import Image, ImageDraw
+from hashing import HASH_ALGORITHMS, compute_hashes_batch
+from generate_report import hash_image_file, load_hash_inputs, thumbnail_path, HASH_BATCH_SIZE
+
+# Compares the ways generate_report can hash a screenshot. Every path runs in
+# its own process so that its peak RSS can be reported separately.
+HASH_PATHS = {
+    "full": "Full decode, average_hash on the full-size image (the original report code)",
+    "decode": "hash_image_file without thumbnails: full decode under the pixel budget, downscale, save the thumbnail",
+    "thumbnail": "hash_image_file with thumbnails present (written at capture time or by an earlier report)",
+    "imagehash_all": "All five algorithms from thumbnails, one imagehash call per algorithm and image (requires imagehash)",
+    "batch_all": "All five algorithms from thumbnails, one decode per image and NumPy batches of HASH_BATCH_SIZE",
+}
+IMAGEHASH_FUNCTIONS = {
+    "ahash": imagehash.average_hash, "phash": imagehash.phash, "dhash": imagehash.dhash,
+    "whash": imagehash.whash, "colorhash": imagehash.colorhash,
+}
+
+
+def make_screenshots(folder, count, width, height, seed=0):
+    rng = random.Random(seed)
+    screenshots_folder = os.path.join(folder, "screenshots")
+    os.makedirs(screenshots_folder, exist_ok=True)
+    for i in range(count):
+        image = Image.new("RGB", (width, height), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(50):
+            x, y = rng.randrange(width - 400), rng.randrange(height - 200)
+            draw.rectangle([x, y, x + 400, y + 200], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        image.save(os.path.join(screenshots_folder, f"site-{i}.example.com.png"))
+
+
+def peak_rss_mb():
+    """Peak RSS of this process; VmHWM is preferred because Linux carries ru_maxrss over from the parent"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_path(folder, path_name, threads):
+    """Hash every screenshot in folder with one path; returns the timing and this process's peak RSS"""
+    screenshots_folder = os.path.join(folder, "screenshots")
+    images = sorted(os.listdir(screenshots_folder))
+
+    def hash_one(img):
+        path = os.path.join(screenshots_folder, img)
+        if path_name == "full":
+            with Image.open(path) as image:
+                return {"ahash": str(imagehash.average_hash(image))}
+        if path_name == "imagehash_all":
+            with Image.open(thumbnail_path(folder, img)) as image:
+                return {algorithm: str(function(image)) for algorithm, function in IMAGEHASH_FUNCTIONS.items()}
+        return hash_image_file(path, thumbnail_path(folder, img))
+
+    def load_one(img):
+        return load_hash_inputs(os.path.join(screenshots_folder, img), thumbnail_path(folder, img), HASH_ALGORITHMS)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        if path_name == "batch_all":
+            hashes = []
+            for start in range(0, len(images), HASH_BATCH_SIZE):
+                hashes.extend(compute_hashes_batch(list(executor.map(load_one, images[start:start + HASH_BATCH_SIZE])), HASH_ALGORITHMS)[1])
+        else:
+            hashes = list(executor.map(hash_one, images))
+    elapsed = time.perf_counter() - started
+    return {
+        "images": len(images),
+        "seconds": elapsed,
+        "images_per_second": len(images) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "hashes": dict(zip(images, hashes)),
+    }
+
+
+def run_path_in_subprocess(folder, path_name, threads):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-path", path_name, "--work-dir", folder, "--threads", str(threads)],
+        stdout=subprocess.PIPE, check=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the screenshot hashing paths of generate_report.")
+    parser.add_argument("-n", "--images", type=int, default=8, help="Number of synthetic screenshots (default: 8)")
+    parser.add_argument("--width", type=int, default=1920, help="Screenshot width in pixels (default: 1920)")
+    parser.add_argument("--height", type=int, default=30000, help="Screenshot height in pixels (default: 30000)")
+    parser.add_argument("-t", "--threads", type=int, default=4, help="Hashing threads (default: 4)")
+    parser.add_argument("-w", "--work-dir", help="Folder for the synthetic screenshots (default: a temporary folder, removed afterwards)")
+    parser.add_argument("-r", "--results", help="Write the results as JSON to this file")
+    parser.add_argument("--run-path", choices=HASH_PATHS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_path:
+        print(json.dumps(run_path(args.work_dir, args.run_path, args.threads)))
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="dscreenshoter-bench-")
+    print(f"Generating {args.images} screenshots of {args.width}x{args.height} in {work_dir}...")
+    make_screenshots(work_dir, args.images, args.width, args.height)
+
+    results = {"config": {k: v for k, v in vars(args).items() if k not in ("run_path", "results", "work_dir")}, "paths": {}}
+    # "decode" writes the thumbnails that "thumbnail" then uses, so the order matters
+    shutil.rmtree(os.path.join(work_dir, "thumbnails"), ignore_errors=True)
+    for path_name in HASH_PATHS:
+        result = run_path_in_subprocess(work_dir, path_name, args.threads)
+        results["paths"][path_name] = result
+        print(f"{path_name:<13} {result['seconds']:>8.2f}s  {result['images_per_second']:>7.2f} images/s  peak RSS {result['peak_rss_mb']:>8.1f} MB")
+
+    # Perceptual hashes may differ slightly between paths; report how many bits do
+    full_hashes = results["paths"]["full"]["hashes"]
+    for path_name in ("decode", "thumbnail"):
+        distances = [bin(int(full_hashes[img]["ahash"], 16) ^ int(h["ahash"], 16)).count("1") for img, h in results["paths"][path_name]["hashes"].items()]
+        results["paths"][path_name]["max_distance_to_full"] = max(distances) if distances else 0
+        print(f"{path_name:<13} max Hamming distance to the full-decode hash: {results['paths'][path_name]['max_distance_to_full']}")
+    reference_hashes = results["paths"]["imagehash_all"]["hashes"]
+    for algorithm in HASH_ALGORITHMS:
+        distances = [bin(int(reference_hashes[img][algorithm], 16) ^ int(h[algorithm], 16)).count("1") for img, h in results["paths"]["batch_all"]["hashes"].items()]
+        print(f"batch_all     max Hamming distance to imagehash {algorithm}: {max(distances) if distances else 0}")
+
+    if args.results:
+        with open(args.results, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.results}")
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import cProfile
+import pstats
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from generate_report import generate_report, thumbnail_path, HASH_CACHE_FILE, HASH_CACHE_VERSION, REPORT_DATA_FILE, REPORT_SEARCH_FILE
+
+# Report generation at scale. Decoding is measured by bench_hashing.py, so
+# the screenshots here are tiny files whose hashes are already known (from
+# the hash cache or from the capture workers, as in a real scan); what is
+# timed is everything else generate_report does with 100k of them.
+
+
+def tiny_image_bytes(image_format):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (200, 200, 200)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+EXCERPT_WORDS = (
+    "login sign in password username welcome dashboard admin portal home page not found forbidden access denied "
+    "error server internal gateway default nginx apache iis test index of parent directory copyright all rights reserved "
+    "contact about privacy policy terms cookies accept search menu news blog shop cart account register support"
+).split()
+
+
+def random_hash(rng, templates):
+    """A hash near one of the templates, so that the report has clusters of several sizes"""
+    value = rng.choice(templates)
+    for _ in range(rng.randrange(8)):
+        value ^= 1 << rng.randrange(64)
+    return f"{value:016x}"
+
+
+def add_screenshots(folder, start, count, rng, templates, report_info, cache_entries=None):
+    """Write count screenshots with thumbnails; their hashes go to the hash cache or, like a capture, to domain_details"""
+    png_data, jpeg_data = tiny_image_bytes("PNG"), tiny_image_bytes("JPEG")
+    screenshots_folder = os.path.join(folder, "screenshots")
+    os.makedirs(screenshots_folder, exist_ok=True)
+    os.makedirs(os.path.join(folder, "thumbnails"), exist_ok=True)
+    for i in range(start, start + count):
+        domain = f"site-{i}.example{i % 50}.com"
+        filename = f"{domain}.png"
+        path = os.path.join(screenshots_folder, filename)
+        with open(path, "wb") as f:
+            f.write(png_data)
+        with open(thumbnail_path(folder, filename), "wb") as f:
+            f.write(jpeg_data)
+        stat = os.stat(path)
+        os.utime(thumbnail_path(folder, filename), ns=(stat.st_mtime_ns, stat.st_mtime_ns))
+        hashes = {"ahash": random_hash(rng, templates)}
+        report_info["successful_domains_order"].append(domain)
+        report_info["domain_urls"][domain] = f"https://{domain}/"
+        report_info["domain_titles"][domain] = f"Title of {domain}"
+        report_info["domain_status_codes"][domain] = rng.choice(["200", "200", "200", "301", "403", "404", "500"])
+        # About 200 characters, like the excerpts collected with -c/--csv
+        report_info["domain_body_excerpts"][domain] = " ".join(rng.choice(EXCERPT_WORDS) for _ in range(30))[:200]
+        details = {"screenshot": filename}
+        if cache_entries is None:
+            details.update({"hashes": hashes, "screenshot_size": stat.st_size})
+        else:
+            cache_entries[filename] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hashes": hashes}
+        report_info["domain_details"][domain] = details
+
+
+def save_report_info(folder, report_info):
+    with open(os.path.join(folder, "report_info.json"), "w") as f:
+        json.dump(report_info, f)
+
+
+def timed_report(folder, profile_rows=0):
+    """Run generate_report quietly; returns seconds and, if asked, the top of its profile"""
+    profiler = cProfile.Profile() if profile_rows else None
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        if profiler:
+            profiler.runcall(generate_report, folder)
+        else:
+            generate_report(folder)
+    elapsed = time.perf_counter() - started
+    if profiler:
+        stats_output = io.StringIO()
+        pstats.Stats(profiler, stream=stats_output).sort_stats("cumulative").print_stats(profile_rows)
+        print(stats_output.getvalue())
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generate_report on a large number of already hashed screenshots.")
+    parser.add_argument("-n", "--images", type=int, default=100000, help="Screenshots in the initial report (default: 100000)")
+    parser.add_argument("-a", "--append", type=int, default=1000, help="Screenshots added by a later capture (default: 1000)")
+    parser.add_argument("-w", "--work-dir", help="Folder for the synthetic scan (default: a temporary folder, removed afterwards)")
+    parser.add_argument("-r", "--results", help="Write the results as JSON to this file")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="Print the N most expensive calls of every run")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="dscreenshoter-bench-")
+    rng = random.Random(0)
+    templates = [rng.getrandbits(64) for _ in range(max(1, args.images // 50))]
+    report_info = {"successful_domains_order": [], "domain_urls": {}, "domain_titles": {}, "domain_status_codes": {}, "domain_body_excerpts": {}, "domain_details": {}}
+    cache_entries = {}
+
+    print(f"Generating {args.images} screenshots in {work_dir}...")
+    add_screenshots(work_dir, 0, args.images, rng, templates, report_info, cache_entries)
+    save_report_info(work_dir, report_info)
+    with open(os.path.join(work_dir, HASH_CACHE_FILE), "w") as f:
+        json.dump({"version": HASH_CACHE_VERSION, "entries": cache_entries}, f)
+
+    results = {"config": {k: v for k, v in vars(args).items() if k not in ("results", "work_dir", "profile")}, "runs": {}}
+    runs = [("initial", None), ("unchanged", None), ("append", args.append)]
+    for name, append in runs:
+        if append:
+            add_screenshots(work_dir, args.images, append, rng, templates, report_info)
+            save_report_info(work_dir, report_info)
+        seconds = timed_report(work_dir, args.profile)
+        results["runs"][name] = {"seconds": seconds}
+        print(f"{name:<10} {seconds:>8.2f}s")
+    results["report_data_bytes"] = os.path.getsize(os.path.join(work_dir, REPORT_DATA_FILE))
+    results["report_search_bytes"] = os.path.getsize(os.path.join(work_dir, REPORT_SEARCH_FILE))
+    print(f"{REPORT_DATA_FILE}: {results['report_data_bytes'] / (1024 * 1024):.1f} MB, "
+          f"{REPORT_SEARCH_FILE}: {results['report_search_bytes'] / (1024 * 1024):.1f} MB")
+
+    if args.results:
+        with open(args.results, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.results}")
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import ssl
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Synthetic sites used by run_benchmark.py. Every page type is reachable on any
+# *.localhost host name (Chrome resolves them to 127.0.0.1), so each benchmark
+# target gets its own screenshot file and its own final URL.
+
+PAGE_TYPES = ["static", "slow", "spa", "tall", "cookie", "redirect", "dead", "tls"]
+
+STATIC_PAGE = """<!DOCTYPE html>
+<html><head><title>Static fixture {host}</title></head>
+<body style="font-family: sans-serif; background: #{color}">
+<h1>Static page for {host}</h1>
+{paragraphs}
+</body></html>"""
+
+SPA_PAGE = """<!DOCTYPE html>
+<html><head><title>SPA fixture</title></head>
+<body><div id="app">Loading...</div>
+<script>
+  // Heavy client-side rendering: build a large DOM after a busy loop
+  var start = Date.now();
+  while (Date.now() - start < {busy_ms}) {{ Math.sqrt(Math.random()); }}
+  var app = document.getElementById("app");
+  app.innerHTML = "";
+  for (var i = 0; i < {rows}; i++) {{
+    var row = document.createElement("div");
+    row.textContent = "Row " + i + " rendered by JavaScript";
+    row.style.padding = "4px";
+    row.style.background = i % 2 ? "#eef" : "#fff";
+    app.appendChild(row);
+  }}
+  document.title = "SPA fixture rendered";
+</script></body></html>"""
+
+TALL_PAGE = """<!DOCTYPE html>
+<html><head><title>Tall fixture</title></head>
+<body style="margin: 0">
+<div style="height: {height}px; background: linear-gradient(#667eea, #764ba2)">Tall page ({height}px)</div>
+</body></html>"""
+
+COOKIE_PAGE = """<!DOCTYPE html>
+<html><head><title>Cookie banner fixture</title></head>
+<body style="font-family: sans-serif">
+<h1>Page behind a cookie banner</h1>
+{paragraphs}
+<div id="cookie-banner" style="position: fixed; bottom: 0; left: 0; right: 0; padding: 20px; background: #333; color: white">
+  We use cookies.
+  <button onclick="document.getElementById('cookie-banner').remove()">Settings</button>
+  <button id="accept-all" onclick="document.getElementById('cookie-banner').remove()">Accept all</button>
+</div>
+</body></html>"""
+
+
+def lorem(count):
+    return "\n".join(f"<p>Paragraph {i}: lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>" for i in range(count))
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def send_page(self, body, status=200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", f'"{hash(body) & 0xffffffff:x}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        host = (self.headers.get("Host") or "localhost").split(":")[0]
+        page = parsed.path.strip("/").split("/")[0] or "static"
+
+        if page in ("static", "tls"):
+            color = f"{abs(hash(host)) & 0xffffff:06x}"
+            self.send_page(STATIC_PAGE.format(host=host, color=color, paragraphs=lorem(20)))
+        elif page == "slow":
+            time.sleep(float(query.get("delay", ["2"])[0]))
+            self.send_page(STATIC_PAGE.format(host=host, color="ffeeee", paragraphs=lorem(10)))
+        elif page == "spa":
+            self.send_page(SPA_PAGE.format(busy_ms=int(query.get("busy_ms", ["300"])[0]), rows=int(query.get("rows", ["2000"])[0])))
+        elif page == "tall":
+            self.send_page(TALL_PAGE.format(height=int(query.get("height", ["30000"])[0])))
+        elif page == "cookie":
+            self.send_page(COOKIE_PAGE.format(paragraphs=lorem(30)))
+        elif page == "redirect":
+            # Redirect chains from many hosts end on one shared portal, like subdomains of a login site
+            hops = int(query.get("hops", ["2"])[0])
+            location = f"/redirect?hops={hops - 1}" if hops > 1 else f"http://portal.localhost:{self.server.server_address[1]}/static"
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_page("<html><body>Not found</body></html>", status=404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def free_port():
+    """A port with nothing listening on it (used for the dead-port targets)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_self_signed_cert(directory):
+    """Create a self-signed certificate with the openssl CLI; None if openssl is not available"""
+    cert_path = os.path.join(directory, "fixture.crt")
+    key_path = os.path.join(directory, "fixture.key")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-keyout", key_path, "-out", cert_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return cert_path, key_path
+
+
+def start_fixture_servers():
+    """Start the HTTP and (if possible) HTTPS fixture servers; returns a dict of ports and a stop function"""
+    servers = []
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    http_server.daemon_threads = True
+    servers.append(http_server)
+    ports = {"http": http_server.server_address[1], "https": None, "dead": free_port()}
+
+    cert_dir = tempfile.mkdtemp(prefix="dscreenshoter-bench-")
+    cert = make_self_signed_cert(cert_dir)
+    if cert:
+        https_server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        https_server.daemon_threads = True
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*cert)
+        https_server.socket = context.wrap_socket(https_server.socket, server_side=True)
+        servers.append(https_server)
+        ports["https"] = https_server.server_address[1]
+
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    return ports, stop
+
+
+def fixture_target(page_type, index, ports):
+    """Target string for the index-th site of the given page type"""
+    host = f"{page_type}-{index}.localhost"
+    if page_type == "dead":
+        return f"http://{host}:{ports['dead']}/"
+    if page_type == "tls":
+        if not ports["https"]:
+            return None
+        return f"https://{host}:{ports['https']}/tls"
+    params = {"slow": "?delay=2", "spa": "?busy_ms=300&rows=2000", "tall": "?height=30000", "redirect": "?hops=3"}.get(page_type, "")
+    return f"http://{host}:{ports['http']}/{page_type}{params}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the benchmark fixture sites until interrupted.")
+    parser.parse_args()
+    ports, stop = start_fixture_servers()
+    for page_type in PAGE_TYPES:
+        print(f"{page_type:<10} {fixture_target(page_type, 0, ports)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop()
@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import resource
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from dscreenshoter import take_screenshot, normalize_target, get_webdriver_path, percentile, TIMING_STAGES
+from generate_report import generate_report, REPORT_DATA_FILE
+from fixture_server import PAGE_TYPES, start_fixture_servers, fixture_target
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def latency_stats(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def start_rss_sampler(interval=0.5):
+    """Sample the RSS of Chrome/chromedriver processes in the background; returns a function that stops it and gives the peak"""
+    state = {"peak": 0}
+    stop_event = threading.Event()
+
+    def loop():
+        while not stop_event.is_set():
+            state["peak"] = max(state["peak"], metrics.driver_rss_bytes() or 0)
+            stop_event.wait(interval)
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+
+    def stop():
+        stop_event.set()
+        thread.join()
+        return state["peak"]
+
+    return stop
+
+
+def bench_normalize_target(iterations):
+    samples = [
+        "example.com", "https://example.com", "http://example.com:8080", "sub.example.com:8443",
+        "192.168.1.1", "192.168.1.1:3000", "10.0.0.0/28", "https://api.example.com:8443",
+    ]
+    started = time.perf_counter()
+    for i in range(iterations):
+        normalize_target(samples[i % len(samples)], ports="8000,8080" if i % 2 else None)
+    elapsed = time.perf_counter() - started
+    return {"iterations": iterations, "seconds": elapsed, "calls_per_second": iterations / elapsed if elapsed else 0.0}
+
+
+def bench_capture(targets, output_folder, threads, timeout, webdriver_path, get_csv_data):
+    final_url_index = {}
+    results = []
+    stop_sampler = start_rss_sampler()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [
+            (page_type, executor.submit(take_screenshot, target, output_folder, timeout, webdriver_path, get_csv_data, True, None, final_url_index))
+            for page_type, target in targets
+        ]
+        for page_type, future in futures:
+            success, working_url, _, _, _, details = future.result()
+            results.append((page_type, working_url, details))
+    elapsed = time.perf_counter() - started
+    peak_driver_rss = stop_sampler()
+
+    succeeded = [r for r in results if r[1]]
+    totals = [r[2].get("timings", {}).get("total", 0.0) for r in results]
+    stages = {}
+    for stage in TIMING_STAGES:
+        values = [r[2]["timings"][stage] for r in results if stage in r[2].get("timings", {})]
+        if values:
+            stages[stage] = latency_stats(values)
+    per_type = {}
+    for page_type in sorted(set(r[0] for r in results)):
+        rows = [r for r in results if r[0] == page_type]
+        per_type[page_type] = {
+            "targets": len(rows),
+            "succeeded": sum(1 for r in rows if r[1]),
+            "aliases": sum(1 for r in rows if r[2].get("alias_of")),
+            "latency": latency_stats([r[2].get("timings", {}).get("total", 0.0) for r in rows]),
+        }
+    return {
+        "targets": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "seconds": elapsed,
+        "pages_per_minute": len(succeeded) / elapsed * 60 if elapsed else 0.0,
+        "latency": latency_stats(totals),
+        "stages": stages,
+        "page_types": per_type,
+        "peak_driver_rss_bytes": peak_driver_rss,
+    }
+
+
+def make_synthetic_screenshots(output_folder, count, seed=0):
+    """Write count PNG screenshots of varied sizes (with many near-duplicates) for report-only runs"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    screenshots_folder = os.path.join(output_folder, "screenshots")
+    os.makedirs(screenshots_folder, exist_ok=True)
+    templates = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(max(1, count // 20))]
+    domains = []
+    for i in range(count):
+        domain = f"site-{i}.example.com"
+        width = 1920
+        height = rng.choice([1080, 2400, 6000])
+        image = Image.new("RGB", (width, height), templates[i % len(templates)])
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, 0, width, 120], fill=(40, 40, 40))
+        draw.text((40, 40), domain, fill=(255, 255, 255))
+        for _ in range(10):
+            x, y = rng.randrange(width - 200), rng.randrange(200, height - 100)
+            draw.rectangle([x, y, x + 200, y + 80], fill=templates[(i + 1) % len(templates)])
+        image.save(os.path.join(screenshots_folder, f"{domain}.png"))
+        domains.append(domain)
+    with open(os.path.join(output_folder, "report_info.json"), "w") as f:
+        json.dump({
+            "successful_domains_order": domains,
+            "domain_urls": {d: f"https://{d}" for d in domains},
+            "domain_titles": {d: f"Title of {d}" for d in domains},
+        }, f)
+
+
+def bench_report(output_folder, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        generate_report(output_folder)
+        timings.append(time.perf_counter() - started)
+    report_path = os.path.join(output_folder, "report.html")
+    data_path = os.path.join(output_folder, REPORT_DATA_FILE)
+    return {
+        "runs": runs,
+        "seconds": timings,
+        "images": len(os.listdir(os.path.join(output_folder, "screenshots"))),
+        "report_bytes": os.path.getsize(report_path) if os.path.exists(report_path) else 0,
+        "report_data_bytes": os.path.getsize(data_path) if os.path.exists(data_path) else 0,
+    }
+
+
+def compare(previous_path, results):
+    with open(previous_path, "r") as f:
+        previous = json.load(f)
+    rows = [
+        ("capture pages/minute", ("capture", "pages_per_minute")),
+        ("capture latency p50", ("capture", "latency", "p50")),
+        ("capture latency p95", ("capture", "latency", "p95")),
+        ("capture latency p99", ("capture", "latency", "p99")),
+        ("normalize_target calls/s", ("normalize_target", "calls_per_second")),
+        ("report seconds (last run)", ("report", "seconds", -1)),
+        ("peak RSS (MB)", ("memory", "peak_rss_mb")),
+    ]
+    print(f"\nComparison with {previous_path}:")
+    for label, path in rows:
+        old, new = previous, results
+        try:
+            for key in path:
+                old, new = old[key], new[key]
+        except (KeyError, IndexError, TypeError):
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"  {label:<28}{old:>12.2f} -> {new:>12.2f}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the capture pipeline and report generation against local fixture sites.")
+    parser.add_argument("-n", "--scale", type=int, default=40, help="Number of capture targets (spread over the page types, default: 40)")
+    parser.add_argument("-t", "--threads", type=int, default=4, help="Capture threads (default: 4)")
+    parser.add_argument("-T", "--timeout", type=int, default=15, help="Page load timeout in seconds (default: 15)")
+    parser.add_argument("--page-types", default=",".join(PAGE_TYPES), help=f"Comma-separated page types to include (default: {','.join(PAGE_TYPES)})")
+    parser.add_argument("-c", "--csv", action="store_true", help="Collect CSV data (status code, body excerpt) during capture")
+    parser.add_argument("--skip-capture", action="store_true", help="Do not run Chrome; benchmark report generation on synthetic screenshots")
+    parser.add_argument("--synthetic-images", type=int, default=500, help="Synthetic screenshots to generate with --skip-capture (default: 500)")
+    parser.add_argument("--report-runs", type=int, default=2, help="Times generate_report is run (later runs show caching effects, default: 2)")
+    parser.add_argument("--normalize-iterations", type=int, default=100000, help="normalize_target calls to time (default: 100000)")
+    parser.add_argument("-w", "--work-dir", help="Output folder for the benchmark run (default: a temporary folder, removed afterwards)")
+    parser.add_argument("-r", "--results", default="bench_results.json", help="Machine-readable results file (default: bench_results.json)")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="dscreenshoter-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "results", "work_dir")},
+    }
+
+    print(f"normalize_target: {args.normalize_iterations} calls...")
+    results["normalize_target"] = bench_normalize_target(args.normalize_iterations)
+
+    if args.skip_capture:
+        print(f"Generating {args.synthetic_images} synthetic screenshots in {work_dir}...")
+        make_synthetic_screenshots(work_dir, args.synthetic_images)
+    else:
+        webdriver_path = get_webdriver_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.ini"))
+        ports, stop = start_fixture_servers()
+        page_types = [p.strip() for p in args.page_types.split(",") if p.strip()]
+        targets = []
+        for i in range(args.scale):
+            page_type = page_types[i % len(page_types)]
+            target = fixture_target(page_type, i, ports)
+            if target:
+                targets.append((page_type, target))
+        print(f"Capturing {len(targets)} fixture targets with {args.threads} threads...")
+        try:
+            results["capture"] = bench_capture(targets, work_dir, args.threads, args.timeout, webdriver_path, args.csv)
+        finally:
+            stop()
+
+    print("Generating report...")
+    results["report"] = bench_report(work_dir, args.report_runs)
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    results["memory"] = {
+        "peak_rss_mb": self_usage / scale,
+        "peak_children_rss_mb": children_usage / scale,
+        "peak_driver_rss_mb": results.get("capture", {}).get("peak_driver_rss_bytes", 0) / (1024 * 1024),
+    }
+
+    with open(args.results, "w") as f:
+        json.dump(results, f, indent=2)
+
+    capture = results.get("capture")
+    if capture:
+        print(f"Capture: {capture['succeeded']}/{capture['targets']} ok, {capture['pages_per_minute']:.1f} pages/minute, "
+              f"latency p50 {capture['latency']['p50']:.2f}s p95 {capture['latency']['p95']:.2f}s p99 {capture['latency']['p99']:.2f}s")
+    print(f"Report: {', '.join(f'{s:.2f}s' for s in results['report']['seconds'])} for {results['report']['images']} images")
+    print(f"Peak RSS: {results['memory']['peak_rss_mb']:.1f} MB (driver peak {results['memory']['peak_driver_rss_mb']:.1f} MB)")
+    print(f"Results written to {args.results}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
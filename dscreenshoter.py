@@ -20,7 +20,20 @@ from urllib.parse import urlparse
 import subprocess
 import logging
 import json
-from generate_report import generate_report
+import shutil
+import hashlib
+import sqlite3
+import threading
+import metrics
+from fingerprints import page_content, compute_fingerprints, FINGERPRINT_KINDS
+from signatures import load_signatures, classify_page
+from storage import (STORAGE_MODES, ARCHIVE_FILE, blob_digest, blob_path, store_blob, link_file, build_blob_index, write_blob_manifest,
+                     archive_put, screenshot_exists, open_screenshot, split_archive_path, sharded_path, load_screenshot_manifest,
+                     record_screenshot, screenshot_paths, screenshot_output_folder)
+from generate_report import generate_report, hash_screenshot_bytes, thumbnail_path, template_groups
+
+final_url_lock = threading.Lock()
+blob_lock = threading.Lock()
 
 def banner():
     print(r"""         _                                  _           _            
@@ -36,7 +49,7 @@ def ensure_session_dir():
     os.makedirs(session_dir, exist_ok=True)
     return session_dir
 
-def save_session(session_file, processed_domains, remaining_domains, screenshots_done, failed_domains, successful_domains_order=None, domain_urls=None, domain_titles=None, domain_status_codes=None, domain_body_excerpts=None):
+def save_session(session_file, processed_domains, remaining_domains, screenshots_done, failed_domains, successful_domains_order=None, domain_urls=None, domain_titles=None, domain_status_codes=None, domain_body_excerpts=None, domain_details=None):
     session_dir = ensure_session_dir()
     session_path = os.path.join(session_dir, session_file)
     session_data = {
@@ -49,6 +62,7 @@ def save_session(session_file, processed_domains, remaining_domains, screenshots
         "domain_titles": domain_titles or {},
         "domain_status_codes": domain_status_codes or {},
         "domain_body_excerpts": domain_body_excerpts or {},
+        "domain_details": domain_details or {},
     }
     try:
         with open(session_path, "w") as f:
@@ -368,7 +382,428 @@ def safe_filename(value):
     return re.sub(r"[^a-zA-Z0-9._-]", "_", value)
 
 
-def take_screenshot(domain, output_folder, timeout, webdriver_path, get_csv_data=False, accept_cookies=True, ports=None):
+def normalize_final_url(url):
+    """Canonical form of a post-redirect URL used as the deduplication key"""
+    try:
+        parsed = urlparse(url)
+        port = parsed.port
+    except ValueError:
+        return url
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if port and not ((scheme == "https" and port == 443) or (scheme == "http" and port == 80)):
+        host = f"{host}:{port}"
+    path = parsed.path.rstrip("/") or "/"
+    query = f"?{parsed.query}" if parsed.query else ""
+    return f"{scheme}://{host}{path}{query}"
+
+
+def build_final_url_index(domain_details):
+    """Map already captured final URLs to the domain and screenshot that own them"""
+    index = {}
+    for domain, details in (domain_details or {}).items():
+        final_url = details.get("final_url")
+        if final_url and details.get("screenshot") and not details.get("alias_of"):
+            index.setdefault(normalize_final_url(final_url), {"domain": domain, "screenshot": details["screenshot"]})
+    return index
+
+
+def screenshot_filename(url):
+    """Scheme, host and port of url as a file name, so every endpoint of a host gets its own screenshot"""
+    parsed = urlparse(url)
+    if not parsed.netloc:
+        return safe_filename(parsed.path) + ".png"
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    return safe_filename(f"{parsed.scheme}-{parsed.hostname}-{port}") + ".png"
+
+
+def load_previous_run(previous_folder):
+    """Load the results of an earlier run for --rescan, keyed by target"""
+    report_info_path = os.path.join(previous_folder, "report_info.json")
+    if not os.path.exists(report_info_path):
+        raise FileNotFoundError(f"No report_info.json found in '{previous_folder}'.")
+    with open(report_info_path, "r") as f:
+        report_info = json.load(f)
+    domain_urls = report_info.get("domain_urls", {})
+    domain_titles = report_info.get("domain_titles", {})
+    domain_status_codes = report_info.get("domain_status_codes", {})
+    domain_body_excerpts = report_info.get("domain_body_excerpts", {})
+    domain_details = report_info.get("domain_details", {})
+    # Flat, sharded or archive layout: the previous screenshots come from one listing, manifest or query
+    previous_paths = screenshot_paths(previous_folder)
+    previous_results = {}
+    for domain in report_info.get("successful_domains_order", []):
+        url = domain_urls.get(domain)
+        if not url:
+            continue
+        details = domain_details.get(domain, {})
+        if details.get("alias_of") or details.get("skipped"):
+            continue
+        # Runs that did not record the file name named it after the host alone
+        filename = details.get("screenshot") or safe_filename((urlparse(url).netloc or url).split(":")[0]) + ".png"
+        screenshot_path = previous_paths.get(filename)
+        if not screenshot_path:
+            continue
+        previous_results[domain] = {
+            "url": url,
+            "title": domain_titles.get(domain, ""),
+            "status_code": domain_status_codes.get(domain, ""),
+            "body_excerpt": domain_body_excerpts.get(domain, ""),
+            "screenshot": filename,
+            "screenshot_path": os.path.abspath(screenshot_path),
+            "final_url": details.get("final_url", url),
+            "validators": details.get("validators", {}),
+            "hashes": details.get("hashes", {}),
+            "fingerprints": details.get("fingerprints", {}),
+            "category": details.get("category", ""),
+            "signature": details.get("signature", ""),
+            "screenshot_size": details.get("screenshot_size"),
+            "blob": details.get("blob", ""),
+        }
+    return previous_results
+
+
+def fetch_validators(url, timeout, previous_validators=None, max_body_bytes=5 * 1024 * 1024):
+    """Collect cheap change signals for url, cheapest first.
+
+    Returns (unchanged, validators). unchanged is True only when the
+    signals match previous_validators; the body is downloaded and hashed
+    only when ETag and Last-Modified cannot decide.
+    """
+    previous_validators = previous_validators or {}
+    headers = {}
+    if previous_validators.get("etag"):
+        headers["If-None-Match"] = previous_validators["etag"]
+    if previous_validators.get("last_modified"):
+        headers["If-Modified-Since"] = previous_validators["last_modified"]
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout, verify=False, stream=True, allow_redirects=True)
+    except requests.RequestException:
+        return False, {}
+    try:
+        if response.status_code == 304 and previous_validators:
+            return True, dict(previous_validators)
+        validators = {
+            "status_code": response.status_code,
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+            "content_length": response.headers.get("Content-Length", ""),
+        }
+        if not previous_validators or previous_validators.get("status_code") not in (None, response.status_code):
+            unchanged = False
+        elif validators["etag"] and previous_validators.get("etag"):
+            return validators["etag"] == previous_validators["etag"], validators
+        elif validators["last_modified"] and previous_validators.get("last_modified"):
+            if validators["last_modified"] != previous_validators["last_modified"]:
+                return False, validators
+            if validators["content_length"] and previous_validators.get("content_length") and validators["content_length"] != previous_validators["content_length"]:
+                return False, validators
+            unchanged = None
+        elif validators["content_length"] and previous_validators.get("content_length") and validators["content_length"] != previous_validators["content_length"]:
+            return False, validators
+        else:
+            unchanged = None
+
+        body_hash = hashlib.sha256()
+        received = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            body_hash.update(chunk)
+            received += len(chunk)
+            if received >= max_body_bytes:
+                break
+        validators["body_hash"] = body_hash.hexdigest()
+        if unchanged is None:
+            unchanged = validators["body_hash"] == previous_validators.get("body_hash")
+        return unchanged, validators
+    except requests.RequestException:
+        return False, {}
+    finally:
+        response.close()
+
+
+def carry_forward_screenshot(source_path, output_folder, filename, archive=None, screenshot_manifest=None):
+    """Reference an unchanged screenshot from a previous run (hardlink, copy as fallback), or add it to archive"""
+    if archive:
+        target_path = os.path.join(archive, filename)
+    elif screenshot_manifest is not None:
+        target_path = sharded_path(output_folder, filename)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    else:
+        screenshots_folder = os.path.join(output_folder, "screenshots")
+        os.makedirs(screenshots_folder, exist_ok=True)
+        target_path = os.path.join(screenshots_folder, filename)
+    if screenshot_exists(target_path):
+        if screenshot_manifest is not None:
+            record_screenshot(output_folder, screenshot_manifest, filename)
+        return True
+    try:
+        if archive or split_archive_path(source_path)[0]:
+            # One end is an archive: the PNG bytes are copied
+            with open_screenshot(source_path) as f:
+                data = f.read()
+            if archive:
+                archive_put(archive, filename, data)
+            else:
+                with open(target_path, "wb") as f:
+                    f.write(data)
+        else:
+            try:
+                os.link(source_path, target_path)
+            except OSError:
+                shutil.copy2(source_path, target_path)
+    except (OSError, sqlite3.Error) as e:
+        logging.getLogger('general_errors').error(f"Failed to carry forward '{source_path}': {e}")
+        return False
+    if screenshot_manifest is not None:
+        record_screenshot(output_folder, screenshot_manifest, filename)
+    # The thumbnail is optional: without it the report rebuilds it from the screenshot
+    # Sharded and archive outputs keep it in the shard folder of its screenshot
+    source_folder = screenshot_output_folder(source_path)
+    source_thumbnail = thumbnail_path(source_folder, filename, source_path == sharded_path(source_folder, filename) or split_archive_path(source_path)[0] is not None)
+    target_thumbnail = thumbnail_path(output_folder, filename, screenshot_manifest is not None or bool(archive))
+    if os.path.exists(source_thumbnail) and not os.path.exists(target_thumbnail):
+        os.makedirs(os.path.dirname(target_thumbnail), exist_ok=True)
+        try:
+            os.link(source_thumbnail, target_thumbnail)
+        except OSError:
+            try:
+                shutil.copy2(source_thumbnail, target_thumbnail)
+            except OSError:
+                pass
+    return True
+
+
+TIMING_STAGES = ["rescan_check", "launch", "navigation", "consent", "fingerprint", "resize", "encode", "write", "hash", "metadata", "quit"]
+
+
+def add_timing(timings, stage, started):
+    timings[stage] = round(timings.get(stage, 0.0) + time.perf_counter() - started, 4)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(-(-pct * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_timings(output_folder, domain_details, top=10):
+    """Print p50/p95/p99 per capture stage and the slowest targets, and save them to timings_summary.json"""
+    per_stage = {stage: [] for stage in TIMING_STAGES + ["total"]}
+    totals = []
+    for domain, details in domain_details.items():
+        timings = details.get("timings")
+        if not timings:
+            continue
+        for stage, value in timings.items():
+            if stage in per_stage:
+                per_stage[stage].append(value)
+        totals.append((timings.get("total", 0.0), domain))
+    if not totals:
+        return None
+
+    summary = {"targets": len(totals), "stages": {}, "slowest": []}
+    print(f"\nTimings per stage over {len(totals)} targets (seconds):")
+    print(f"  {'stage':<14}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for stage, values in per_stage.items():
+        if not values:
+            continue
+        stats = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values),
+        }
+        summary["stages"][stage] = stats
+        print(f"  {stage:<14}{stats['count']:>8}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}")
+
+    print(f"Slowest {min(top, len(totals))} targets:")
+    for total, domain in sorted(totals, reverse=True)[:top]:
+        timings = domain_details[domain]["timings"]
+        slowest_stage = max((s for s in timings if s != "total"), key=lambda s: timings[s], default="")
+        summary["slowest"].append({"site": domain, "total": total, "slowest_stage": slowest_stage, "timings": timings})
+        print(f"  {total:>8.2f}s  {domain}  (slowest stage: {slowest_stage})")
+
+    summary_path = os.path.join(output_folder, "timings_summary.json")
+    try:
+        with open(summary_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    except Exception as e:
+        logging.getLogger('general_errors').error(f"Failed to save timings summary: {str(e)}")
+    return summary
+
+
+def classify_error(error):
+    """Coarse error class of a capture failure, used for the failure metrics"""
+    if isinstance(error, TimeoutException):
+        return "timeout"
+    message = str(error)
+    if "ERR_NAME_NOT_RESOLVED" in message:
+        return "dns"
+    if "ERR_CONNECTION_REFUSED" in message:
+        return "connection_refused"
+    if "ERR_CONNECTION_TIMED_OUT" in message or "ERR_TIMED_OUT" in message:
+        return "timeout"
+    if "ERR_CONNECTION_RESET" in message or "ERR_CONNECTION_CLOSED" in message or "ERR_EMPTY_RESPONSE" in message:
+        return "connection_reset"
+    if "ERR_SSL" in message or "ERR_CERT" in message:
+        return "tls"
+    if isinstance(error, WebDriverException):
+        return "webdriver"
+    return "other"
+
+
+def capture_outcome(working_url, details):
+    if not working_url:
+        return "failed"
+    if details.get("alias_of"):
+        return "alias"
+    if details.get("rescan") == "unchanged":
+        return "unchanged"
+    if details.get("skipped"):
+        return "skipped"
+    return "captured"
+
+
+def record_endpoints(endpoints, get_csv_data, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details):
+    """Record the other live endpoints of a --port target as rows (and metrics targets) of their own; returns how many screenshots they wrote (aliases write none)"""
+    added = 0
+    for endpoint, (success, working_url, page_title, status_code, body_excerpt, details) in endpoints.items():
+        metrics.record_target(capture_outcome(working_url, details), details.get("error_class"))
+        if (success or endpoint not in successful_domains_order) and not details.get("skipped") and not details.get("alias_of"):
+            added += 1
+        if endpoint not in successful_domains_order:
+            successful_domains_order.append(endpoint)
+        domain_urls[endpoint] = working_url
+        if page_title:
+            domain_titles[endpoint] = page_title
+        domain_details[endpoint] = details
+        if get_csv_data:
+            domain_status_codes[endpoint] = str(status_code) if status_code is not None else ""
+            domain_body_excerpts[endpoint] = str(body_excerpt) if body_excerpt else ""
+    return added
+
+
+def collect_page_data(driver, get_csv_data):
+    try:
+        page_title = driver.title
+    except:
+        page_title = ""
+
+    if not get_csv_data:
+        return page_title, None, ""
+
+    status_code = 200
+    try:
+        status_code = int(driver.execute_script("""
+            try {
+                var entries = performance.getEntriesByType('navigation');
+                if (entries && entries.length > 0) {
+                    return entries[0].responseStatus || entries[0].status || 200;
+                }
+                return 200;
+            } catch(e) {
+                return 200;
+            }
+        """))
+    except:
+        status_code = 200
+
+    body_excerpt = ""
+    try:
+        body_excerpt = driver.execute_script("""
+            try {
+                var text = document.body.innerText || document.body.textContent || '';
+                return text.trim().substring(0, 200).replace(/\\s+/g, ' ');
+            } catch(e) {
+                return '';
+            }
+        """)
+        if not body_excerpt:
+            body_excerpt = ""
+    except:
+        body_excerpt = ""
+    return page_title, status_code, body_excerpt
+
+
+def rescan_previous(domain, previous, output_folder, timeout, get_csv_data, timings, started_at, final_url_index=None, blob_index=None, archive=None, screenshot_manifest=None):
+    """Re-scan check of one capture against its previous record ({} if it is new).
+
+    Returns (result, rescan_details): result is the take_screenshot result
+    when the page is unchanged and its screenshot was carried forward, else None.
+    """
+    if not previous:
+        return None, {"rescan": "new"}
+    started = time.perf_counter()
+    unchanged, validators = fetch_validators(previous["url"], timeout, previous.get("validators"))
+    add_timing(timings, "rescan_check", started)
+    started = time.perf_counter()
+    carried = unchanged and carry_forward_screenshot(previous["screenshot_path"], output_folder, previous["screenshot"], archive, screenshot_manifest)
+    if carried:
+        add_timing(timings, "write", started)
+        timings["total"] = round(time.perf_counter() - started_at, 4)
+        details = {
+            "final_url": previous.get("final_url", previous["url"]),
+            "screenshot": previous["screenshot"],
+            "rescan": "unchanged",
+            "carried_from": previous["screenshot_path"],
+            "validators": validators,
+            "timings": timings,
+        }
+        if previous.get("hashes"):
+            details["hashes"] = previous["hashes"]
+            details["screenshot_size"] = previous.get("screenshot_size")
+        for key in ("fingerprints", "category", "signature"):
+            if previous.get(key):
+                details[key] = previous[key]
+        # Content-addressed storage: the carried screenshot becomes (or already is) a blob of this run
+        if blob_index is not None:
+            digest = previous.get("blob")
+            try:
+                if not digest:
+                    with open_screenshot(previous["screenshot_path"]) as f:
+                        digest = blob_digest(f.read())
+                if not archive and not os.path.exists(blob_path(output_folder, digest)):
+                    link_file(os.path.join(output_folder, "screenshots", previous["screenshot"]), blob_path(output_folder, digest))
+                details["blob"] = digest
+                with blob_lock:
+                    blob_index.setdefault(digest, {"screenshot": previous["screenshot"], "hashes": previous.get("hashes", {})})
+            except OSError as e:
+                logging.getLogger('general_errors').error(f"Failed to store '{previous['screenshot_path']}' as a blob: {e}")
+        if final_url_index is not None:
+            with final_url_lock:
+                final_url_index.setdefault(normalize_final_url(details["final_url"]), {"domain": domain, "screenshot": previous["screenshot"]})
+        status_code = previous.get("status_code") if get_csv_data else None
+        return (True, previous["url"], previous.get("title", ""), status_code, previous.get("body_excerpt", ""), details), {}
+    return None, {"rescan": "changed", "validators": validators}
+
+
+def take_screenshot(domain, output_folder, timeout, webdriver_path, get_csv_data=False, accept_cookies=True, ports=None, final_url_index=None, previous=None,
+                    signatures=None, skip_categories=None, blob_index=None, archive=None, screenshot_manifest=None, previous_endpoints=None):
+    """Capture the first live URL of domain, or with --port every live endpoint in the same browser session.
+
+    With --port the first live endpoint is the target's result and the others
+    are returned in its details under "endpoints", keyed by their URL, each
+    with its own screenshot. previous_endpoints maps those URLs to their
+    re-scan records.
+    """
+    # The target's details share this timings dict; "quit" and "total" are added in the finally block
+    timings = {}
+    target_started = time.perf_counter()
+
+    # Re-scan mode: previous is this target's record from the earlier run ({} if it is new); with --port every endpoint is checked in the loop below
+    has_custom_ports = ports is not None and ports.strip()
+    rescan_details = {}
+    # Sharded and archive storage keep thumbnails in the <ab>/<cd> folders of their screenshot
+    sharded_thumbnails = screenshot_manifest is not None or bool(archive)
+    if previous is not None and not has_custom_ports:
+        result, rescan_details = rescan_previous(domain, previous, output_folder, timeout, get_csv_data, timings, target_started, final_url_index, blob_index, archive, screenshot_manifest)
+        if result:
+            return result
+
     options = Options()
     options.add_argument("--headless=new")
     options.add_argument("--disable-gpu")
@@ -377,6 +812,7 @@ def take_screenshot(domain, output_folder, timeout, webdriver_path, get_csv_data
     options.add_argument("--ignore-certificate-errors")
     options.add_argument("--allow-insecure-localhost")
 
+    started = time.perf_counter()
     try:
         service = Service(webdriver_path)
         driver = webdriver.Chrome(service=service, options=options)
@@ -384,18 +820,38 @@ def take_screenshot(domain, output_folder, timeout, webdriver_path, get_csv_data
 
     except Exception as e:
         logging.getLogger('general_errors').error(f"{domain}: WebDriver initialization failed: {e}")
-        return False, None
+        metrics.inc("browser_launches", result="failed")
+        add_timing(timings, "launch", started)
+        timings["total"] = round(time.perf_counter() - target_started, 4)
+        return False, None, "", None, "", {"timings": timings, "error_class": "driver_launch"}
+    metrics.inc("browser_launches", result="ok")
+    add_timing(timings, "launch", started)
+    last_error_class = None
 
     try:
         urls = normalize_target(domain, ports=ports)
         urls_sorted = sorted(urls, key=lambda x: (0 if x.startswith('https://') else 1))
         
-        # If custom ports are specified, try all URLs; otherwise stop at first success
-        has_custom_ports = ports is not None and ports.strip()
-        first_success = None
+        # If custom ports are specified, capture every live URL; otherwise stop at first success
+        results = {}
 
         for url in urls_sorted:
+            # The first live endpoint is the target's row, every later one gets its own row keyed by its URL
+            endpoint = url if results else domain
+            endpoint_timings = timings if endpoint == domain else {}
+            endpoint_started = time.perf_counter()
+            if has_custom_ports and previous is not None:
+                endpoint_previous = previous if previous.get("url") == url else (previous_endpoints or {}).get(url, {})
+                result, rescan_details = rescan_previous(endpoint, endpoint_previous, output_folder, timeout, get_csv_data, endpoint_timings, endpoint_started,
+                                                         final_url_index, blob_index, archive, screenshot_manifest)
+                if result:
+                    results[endpoint] = result
+                    continue
+            started = time.perf_counter()
             try:
+                if results:
+                    # The previous endpoint left the window resized to its full page
+                    driver.set_window_size(1920, 1080)
                 driver.set_page_load_timeout(timeout)
                 driver.get(url)
                 
@@ -407,8 +863,33 @@ def take_screenshot(domain, output_folder, timeout, webdriver_path, get_csv_data
                         time.sleep(0.5)
                 else:
                     time.sleep(0.3)
+
+                try:
+                    final_url = driver.current_url or url
+                except Exception:
+                    final_url = url
+                add_timing(endpoint_timings, "navigation", started)
+
+                # Another target already captured the page this one redirects to: record an alias
+                if final_url_index is not None and final_url.startswith(("http://", "https://")):
+                    with final_url_lock:
+                        owner = final_url_index.get(normalize_final_url(final_url))
+                    if owner and owner["domain"] != endpoint:
+                        started = time.perf_counter()
+                        page_title, status_code, body_excerpt = collect_page_data(driver, get_csv_data)
+                        add_timing(endpoint_timings, "metadata", started)
+                        details = {"final_url": final_url, "alias_of": owner["domain"], "screenshot": owner["screenshot"], "timings": endpoint_timings}
+                        details.update(rescan_details)
+                        result = (False, url, page_title, status_code, body_excerpt, details)
+                        if not has_custom_ports:
+                            return result
+                        results[endpoint] = result
+                        if endpoint != domain:
+                            endpoint_timings["total"] = round(time.perf_counter() - endpoint_started, 4)
+                        continue
                 
                 # Automatically accept cookie consent banners if enabled
+                started = time.perf_counter()
                 if accept_cookies:
                     try:
                         from selenium.webdriver.common.by import By
@@ -613,7 +1094,38 @@ def take_screenshot(domain, output_folder, timeout, webdriver_path, get_csv_data
                                 pass
                     except:
                         pass
+                add_timing(endpoint_timings, "consent", started)
+
+                # Text and DOM fingerprints and the boilerplate category, before the page is resized and encoded
+                started = time.perf_counter()
+                page_title, page_text, fingerprints = "", "", {}
+                try:
+                    page_title = driver.title or ""
+                    page_text, page_tags = page_content(driver)
+                    fingerprints = compute_fingerprints(page_text, page_tags, page_title)
+                except Exception as e:
+                    logging.getLogger('domain_errors').error(f"{domain}: Failed to fingerprint {url} → {e}")
+                category, signature = classify_page(signatures, page_title, page_text, fingerprints) if signatures else ("", "")
+                add_timing(endpoint_timings, "fingerprint", started)
+
+                # Known boilerplate the user asked to skip: record it without taking the screenshot
+                if category and skip_categories and (category in skip_categories or "all" in skip_categories):
+                    started = time.perf_counter()
+                    page_title, status_code, body_excerpt = collect_page_data(driver, get_csv_data)
+                    add_timing(endpoint_timings, "metadata", started)
+                    details = {"final_url": final_url, "category": category, "signature": signature, "skipped": True, "timings": endpoint_timings}
+                    if fingerprints:
+                        details["fingerprints"] = fingerprints
+                    details.update(rescan_details)
+                    result = (False, url, page_title, status_code, body_excerpt, details)
+                    if not has_custom_ports:
+                        return result
+                    results[endpoint] = result
+                    if endpoint != domain:
+                        endpoint_timings["total"] = round(time.perf_counter() - endpoint_started, 4)
+                    continue
 
+                started = time.perf_counter()
                 total_width = driver.execute_script("return document.body.scrollWidth")
                 total_height = driver.execute_script("return document.body.scrollHeight")
                 
@@ -624,114 +1136,154 @@ def take_screenshot(domain, output_folder, timeout, webdriver_path, get_csv_data
                 
                 driver.set_window_size(total_width, total_height)
                 time.sleep(0.2)
+                add_timing(endpoint_timings, "resize", started)
+
+                filename = screenshot_filename(url)
+                if archive:
+                    screenshot_path = os.path.join(archive, filename)
+                    existed_before = screenshot_exists(screenshot_path)
+                elif screenshot_manifest is not None:
+                    # Sharded: the manifest says which files exist, no folder is looked at
+                    screenshot_path = sharded_path(output_folder, filename)
+                    os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
+                    existed_before = filename in screenshot_manifest
+                else:
+                    screenshots_folder = os.path.join(output_folder, "screenshots")
+                    os.makedirs(screenshots_folder, exist_ok=True)
+                    screenshot_path = os.path.join(screenshots_folder, filename)
+                    existed_before = os.path.exists(screenshot_path)
 
-                parsed = urlparse(url)
-                host = parsed.netloc if parsed.netloc else parsed.path
-                # Extract domain without port for consistent filename
-                domain_only = host.split(':')[0] if ':' in host else host
-                filename = safe_filename(domain_only) + ".png"
-                screenshots_folder = os.path.join(output_folder, "screenshots")
-                os.makedirs(screenshots_folder, exist_ok=True)
-                screenshot_path = os.path.join(screenshots_folder, filename)
-                existed_before = os.path.exists(screenshot_path)
-
-                # Save screenshot only if not already saved (for custom ports, save only for first success)
+                # Save screenshot only if not already saved (each endpoint has its own file)
                 should_save_screenshot = not existed_before
-                if has_custom_ports and first_success is not None:
-                    # Already have a successful result, skip saving screenshot for subsequent attempts
-                    should_save_screenshot = False
                 
+                image_hashes = None
                 if should_save_screenshot:
-                    driver.save_screenshot(screenshot_path)
-                    if not (os.path.exists(screenshot_path) and os.path.getsize(screenshot_path) > 5000):
+                    started = time.perf_counter()
+                    png_data = driver.get_screenshot_as_png()
+                    add_timing(endpoint_timings, "encode", started)
+                    if len(png_data) <= 5000:
+                        last_error_class = "empty_capture"
                         continue
-
-                try:
-                    page_title = driver.title
-                except:
-                    page_title = ""
-                
-                if get_csv_data:
-                    status_code = 200
-                    try:
-                        status_code = int(driver.execute_script("""
-                            try {
-                                var entries = performance.getEntriesByType('navigation');
-                                if (entries && entries.length > 0) {
-                                    return entries[0].responseStatus || entries[0].status || 200;
-                                }
-                                return 200;
-                            } catch(e) {
-                                return 200;
-                            }
-                        """))
-                    except:
-                        status_code = 200
-                    
-                    body_excerpt = ""
-                    try:
-                        body_excerpt = driver.execute_script("""
-                            try {
-                                var text = document.body.innerText || document.body.textContent || '';
-                                return text.trim().substring(0, 200).replace(/\\s+/g, ' ');
-                            } catch(e) {
-                                return '';
-                            }
-                        """)
-                        if not body_excerpt:
-                            body_excerpt = ""
-                    except:
-                        body_excerpt = ""
-                else:
-                    status_code = None
-                    body_excerpt = ""
+                    started = time.perf_counter()
+                    known_blob = None
+                    if blob_index is not None:
+                        # Content-addressed: the PNG is written once per digest and linked (or archived) under the target's name
+                        digest = blob_digest(png_data)
+                        if archive:
+                            archive_put(archive, filename, png_data, digest)
+                        else:
+                            link_file(store_blob(output_folder, png_data, digest)[0], screenshot_path)
+                        with blob_lock:
+                            known_blob = blob_index.get(digest)
+                    else:
+                        with open(screenshot_path, "wb") as f:
+                            f.write(png_data)
+                        if screenshot_manifest is not None:
+                            record_screenshot(output_folder, screenshot_manifest, filename)
+                    add_timing(endpoint_timings, "write", started)
+                    # Hash the in-memory capture and save its thumbnail so the report never has to decode it again
+                    started = time.perf_counter()
+                    known_thumbnail = thumbnail_path(output_folder, known_blob["screenshot"], sharded_thumbnails) if known_blob else None
+                    if known_blob and known_blob.get("hashes") and os.path.exists(known_thumbnail):
+                        # Identical to an earlier capture: reuse its hashes and thumbnail
+                        image_hashes = dict(known_blob["hashes"])
+                        link_file(known_thumbnail, thumbnail_path(output_folder, filename, sharded_thumbnails))
+                    else:
+                        try:
+                            image_hashes = hash_screenshot_bytes(png_data, thumbnail_path(output_folder, filename, sharded_thumbnails))
+                        except Exception as e:
+                            logging.getLogger('domain_errors').error(f"{domain}: Failed to hash screenshot {filename} → {e}")
+                        if blob_index is not None and image_hashes:
+                            with blob_lock:
+                                blob_index.setdefault(digest, {"screenshot": filename, "hashes": image_hashes})
+                    add_timing(endpoint_timings, "hash", started)
+
+                if final_url_index is not None and final_url.startswith(("http://", "https://")):
+                    with final_url_lock:
+                        final_url_index.setdefault(normalize_final_url(final_url), {"domain": endpoint, "screenshot": filename})
+
+                started = time.perf_counter()
+                page_title, status_code, body_excerpt = collect_page_data(driver, get_csv_data)
+                add_timing(endpoint_timings, "metadata", started)
+                details = {"final_url": final_url, "screenshot": filename, "timings": endpoint_timings}
+                if image_hashes:
+                    details["hashes"] = image_hashes
+                    details["screenshot_size"] = len(png_data)
+                    # Signatures on perceptual hashes can only match now
+                    if not category and signatures:
+                        category, signature = classify_page(signatures, page_title, page_text, fingerprints, image_hashes)
+                if should_save_screenshot and blob_index is not None:
+                    details["blob"] = digest
+                if fingerprints:
+                    details["fingerprints"] = fingerprints
+                if category:
+                    details["category"] = category
+                    details["signature"] = signature
+                if previous is not None:
+                    details.update(rescan_details)
+                # Every capture records its change signals, so any run can be the baseline of a later --rescan
+                if not details.get("validators"):
+                    started = time.perf_counter()
+                    details["validators"] = fetch_validators(url, timeout)[1]
+                    add_timing(endpoint_timings, "rescan_check", started)
                 
-                result = (not existed_before, url, page_title, status_code, body_excerpt)
+                result = (not existed_before, url, page_title, status_code, body_excerpt, details)
                 
-                # If custom ports are specified, continue trying all URLs but save first success
-                if has_custom_ports:
-                    if first_success is None:
-                        first_success = result
-                    # Continue to try all ports even if one works
-                    continue
-                else:
-                    # No custom ports: return first success
+                # No custom ports: return first success
+                if not has_custom_ports:
                     return result
+                # Custom ports: keep the result and go on with the next endpoint
+                results[endpoint] = result
+                if endpoint != domain:
+                    endpoint_timings["total"] = round(time.perf_counter() - endpoint_started, 4)
 
             except Exception as e:
+                add_timing(endpoint_timings, "navigation", started)
+                if endpoint != domain:
+                    endpoint_timings["total"] = round(time.perf_counter() - endpoint_started, 4)
+                last_error_class = classify_error(e)
                 logging.getLogger('domain_errors').error(f"{domain}: URL error {url} → {e}")
                 continue
 
-        # If custom ports were specified, return first success (or failure if none worked)
-        if has_custom_ports:
-            if first_success is not None:
-                return first_success
-            return False, None, "", None, ""
+        # If custom ports were specified, the first live endpoint carries the others (or failure if none worked)
+        if results:
+            endpoint_results = iter(results.items())
+            result = next(endpoint_results)[1]
+            endpoints = dict(endpoint_results)
+            if endpoints:
+                result[5]["endpoints"] = endpoints
+            return result
         
-        return False, None, "", None, ""
+        return False, None, "", None, "", {"timings": timings, "error_class": last_error_class or "no_response"}
 
     except Exception as e:
         logging.getLogger('domain_errors').error(f"{domain}: Unexpected error during screenshot: {e}")
-        return False, None, "", None, ""
+        return False, None, "", None, "", {"timings": timings, "error_class": classify_error(e)}
 
     finally:
+        started = time.perf_counter()
         try:
             driver.quit()
         except:
             pass
+        add_timing(timings, "quit", started)
+        timings["total"] = round(time.perf_counter() - target_started, 4)
 
 
-def process_domains(domains, output_folder, vpn_dir, max_requests, threads, timeout, webdriver_path, session_file, delay, vpn_mode, get_csv_data=False, accept_cookies=True, ports=None):
+def process_domains(domains, output_folder, vpn_dir, max_requests, threads, timeout, webdriver_path, session_file, delay, vpn_mode, get_csv_data=False, accept_cookies=True, ports=None, dedup_final_urls=True, previous_results=None,
+                    signatures=None, skip_categories=None, storage="files"):
 
-    # Create screenshots subdirectory
-    screenshots_folder = os.path.join(output_folder, "screenshots")
-    os.makedirs(screenshots_folder, exist_ok=True)
+    # Create screenshots subdirectory (or the archive that replaces it)
+    archive = os.path.join(output_folder, ARCHIVE_FILE) if storage == "archive" else None
+    if not archive:
+        os.makedirs(os.path.join(output_folder, "screenshots"), exist_ok=True)
 
     vpn_process = None
     session = load_session(session_file)
     domain_titles = {}
     domain_status_codes = {}
     domain_body_excerpts = {}
+    domain_details = {}
     if session:
         processed_domains_raw = session.get("processed_domains", [])
         screenshots_done = session.get("screenshots_done", 0)
@@ -741,6 +1293,7 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
         domain_titles = session.get("domain_titles", {})
         domain_status_codes = session.get("domain_status_codes", {})
         domain_body_excerpts = session.get("domain_body_excerpts", {})
+        domain_details = session.get("domain_details", {})
         
         def normalize_domain_for_session(d):
             """Normalize expanded URLs to original domains"""
@@ -785,6 +1338,7 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                     domain_titles = {}
                     domain_status_codes = {}
                     domain_body_excerpts = {}
+                    domain_details = {}
                     domains = list(set(domains))
                     break
 
@@ -803,8 +1357,13 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
         domain_titles = {}
         domain_status_codes = {}
         domain_body_excerpts = {}
+        domain_details = {}
         domains = list(set(domains))
 
+    final_url_index = build_final_url_index(domain_details) if dedup_final_urls else None
+    blob_index = build_blob_index(domain_details) if storage in ("cas", "archive") else None
+    screenshot_manifest = load_screenshot_manifest(output_folder) if storage == "sharded" else None
+
     domains_to_process = []
     
     for d in domains:
@@ -832,6 +1391,7 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
 
         progress_bar_domains.update(len(processed_domains))
         progress_bar_screenshots.update(screenshots_done)
+        metrics.set_gauge("targets_pending", len(remaining_domains))
 
         ip_counter = 0
 
@@ -865,6 +1425,7 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                             if current_ip:
                                 connected = True
                                 ip_counter += 1
+                                metrics.inc("vpn_rotations", mode=vpn_mode)
                                 tqdm.write(f"Connected with IP #{ip_counter}: {current_ip}")
                             else:
                                 tqdm.write("OpenVPN connection failed. Retrying...")
@@ -884,6 +1445,7 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                             if current_ip:
                                 connected = True
                                 ip_counter += 1
+                                metrics.inc("vpn_rotations", mode=vpn_mode)
                                 tqdm.write(f"Connected with NordVPN, IP #{ip_counter}: {current_ip}")
                             else:
                                 tqdm.write("NordVPN connection failed. Retrying...")
@@ -893,7 +1455,7 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
 
                     if not connected:
                         tqdm.write("Could not connect to VPN after 5 attempts. Saving session and exiting...")
-                        save_session(session_file, processed_domains, remaining_domains[i:], screenshots_done, failed_domains, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts)
+                        save_session(session_file, processed_domains, remaining_domains[i:], screenshots_done, failed_domains, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
                         sys.exit(1)
 
 
@@ -905,7 +1467,8 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                 interrupted = False
 
                 futures = {
-                    executor.submit(take_screenshot, domain, output_folder, timeout, webdriver_path, get_csv_data, accept_cookies, ports): domain
+                    executor.submit(metrics.track_in_flight(take_screenshot), domain, output_folder, timeout, webdriver_path, get_csv_data, accept_cookies, ports, final_url_index, previous_results.get(domain, {}) if previous_results is not None else None,
+                                    signatures, skip_categories, blob_index, archive, screenshot_manifest, previous_results): domain
                     for domain in batch_domains
                 }
 
@@ -914,10 +1477,14 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                     for future in as_completed(futures):
 
                         domain = futures[future]
+                        metrics.add_gauge("targets_pending", -1)
 
                         try:
                             result = future.result()
-                            if len(result) == 5:
+                            details = {}
+                            if len(result) == 6:
+                                success, working_url, page_title, status_code, body_excerpt, details = result
+                            elif len(result) == 5:
                                 success, working_url, page_title, status_code, body_excerpt = result
                             elif len(result) == 3:
                                 success, working_url, page_title = result
@@ -925,6 +1492,9 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                             else:
                                 success, working_url = result
                                 page_title, status_code, body_excerpt = "", None, ""
+                            metrics.record_target(capture_outcome(working_url, details), details.get("error_class"))
+                            # --port: the other live endpoints of the target come back with it, each recorded as its own row
+                            endpoints = details.pop("endpoints", {})
 
                             completed_requests += 1
                             progress_bar_requests.update(1)
@@ -933,7 +1503,7 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                             progress_bar_domains.update(1)
 
                             if working_url:
-                                if success or domain not in successful_domains_order:
+                                if (success or domain not in successful_domains_order) and not details.get("skipped") and not details.get("alias_of"):
                                     screenshots_done += 1
                                     progress_bar_screenshots.update(1)
                                 failed_domains.discard(domain)
@@ -942,21 +1512,29 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
                                 domain_urls[domain] = working_url
                                 if page_title:
                                     domain_titles[domain] = page_title
+                                if details:
+                                    domain_details[domain] = details
                                 if get_csv_data:
                                     domain_status_codes[domain] = str(status_code) if status_code is not None else ""
                                     domain_body_excerpts[domain] = str(body_excerpt) if body_excerpt else ""
                             else:
                                 failed_domains.add(domain)
+                                if details:
+                                    domain_details[domain] = details
+                            added = record_endpoints(endpoints, get_csv_data, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
+                            screenshots_done += added
+                            progress_bar_screenshots.update(added)
 
                         except Exception:
                             logging.getLogger('domain_errors').error(f"{domain}: Unexpected error.")
+                            metrics.record_target("failed", "exception")
                             failed_domains.add(domain)
 
                 except KeyboardInterrupt:
                     interrupted = True
 
                 finally:
-                    save_session(session_file, processed_domains, remaining_domains[i + completed_requests:], screenshots_done, failed_domains, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts)
+                    save_session(session_file, processed_domains, remaining_domains[i + completed_requests:], screenshots_done, failed_domains, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
 
                     if interrupted:
                         tqdm.write(f"\nOperation canceled by user. Session saved as '{session_file}'.")
@@ -980,26 +1558,45 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
         if vpn_mode == "openvpn" and vpn_process:
             disconnect_openvpn(vpn_process)
 
-        save_session(session_file, processed_domains, [], screenshots_done, failed_domains, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts)
+        save_session(session_file, processed_domains, [], screenshots_done, failed_domains, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
         
         report_info_path = os.path.join(output_folder, "report_info.json")
         report_info = {
             "successful_domains_order": successful_domains_order,
             "domain_urls": domain_urls,
-            "domain_titles": domain_titles
+            "domain_titles": domain_titles,
+            "domain_status_codes": domain_status_codes,
+            "domain_body_excerpts": domain_body_excerpts,
+            "domain_details": domain_details
         }
         
         if get_csv_data:
-            generate_csv(output_folder, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts)
+            generate_csv(output_folder, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
         try:
             with open(report_info_path, "w") as f:
                 json.dump(report_info, f)
         except Exception as e:
             logging.getLogger('general_errors').error(f"Failed to save report info: {str(e)}")
+        if storage == "cas":
+            try:
+                stored = write_blob_manifest(output_folder, domain_details)
+                print(f"Content-addressed storage: {len(stored)} screenshots in {len({entry['blob'] for entry in stored.values()})} unique blobs.")
+            except Exception as e:
+                logging.getLogger('general_errors').error(f"Failed to save blob manifest: {str(e)}")
 
         progress_bar_domains.close()
         progress_bar_screenshots.close()
         progress_bar_requests.close()
+
+        summarize_timings(output_folder, domain_details)
+
+        if previous_results is not None:
+            rescan_counts = {"unchanged": 0, "changed": 0, "new": 0}
+            for domain in successful_domains_order:
+                state = domain_details.get(domain, {}).get("rescan")
+                if state in rescan_counts:
+                    rescan_counts[state] += 1
+            print(f"\nRe-scan: {rescan_counts['unchanged']} unchanged (carried forward), {rescan_counts['changed']} changed, {rescan_counts['new']} new.")
         
         if screenshots_done > 0 or len(successful_domains_order) > 0:
             print("\nGenerating report...")
@@ -1015,19 +1612,33 @@ def process_domains(domains, output_folder, vpn_dir, max_requests, threads, time
         print("All domains have been processed.")
 
 
-def generate_csv(output_folder, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts):
+def generate_csv(output_folder, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details=None):
     import csv
     csv_path = os.path.join(output_folder, "report.csv")
     try:
         with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.writer(csvfile)
-            writer.writerow(['site', 'status_code', 'title', 'body_excerpt'])
+            writer.writerow(['site', 'status_code', 'title', 'body_excerpt', 'final_url', 'alias_of', 'screenshot', 'rescan_status', 'category']
+                            + [f"{kind}_fingerprint" for kind in FINGERPRINT_KINDS] + ['template_group']
+                            + [f"time_{stage}" for stage in TIMING_STAGES + ["total"]])
+            domain_details = domain_details or {}
+            templates = template_groups(domain_details)
+            # Where each screenshot is, relative to the output folder, from the archive, the sharded manifest or the folder
+            paths = {name: os.path.relpath(path, output_folder).replace(os.sep, "/") for name, path in screenshot_paths(output_folder).items()}
             
             for domain in successful_domains_order:
                 status_code = domain_status_codes.get(domain, "")
                 title = domain_titles.get(domain, "")
                 body_excerpt = domain_body_excerpts.get(domain, "")
-                writer.writerow([domain, status_code, title, body_excerpt])
+                details = domain_details.get(domain, {})
+                timings = details.get("timings", {})
+                # Aliases share the fingerprints and template group of the target they resolved to
+                source = domain_details.get(details["alias_of"], {}) if details.get("alias_of") else details
+                fingerprints = source.get("fingerprints", {})
+                writer.writerow([domain, status_code, title, body_excerpt, details.get("final_url", ""), details.get("alias_of", ""), paths.get(source.get("screenshot"), ""),
+                                 details.get("rescan", ""), source.get("category", "")]
+                                + [fingerprints.get(kind, "") for kind in FINGERPRINT_KINDS] + [templates.get(details.get("alias_of") or domain, "")]
+                                + [timings.get(stage, "") for stage in TIMING_STAGES + ["total"]])
         
         print(f"CSV report generated at: {csv_path}")
     except Exception as e:
@@ -1035,10 +1646,12 @@ def generate_csv(output_folder, successful_domains_order, domain_urls, domain_ti
         print(f"Warning: Could not generate CSV: {str(e)}")
 
 
-def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, threads, timeout, webdriver_path, delay, vpn_mode, get_csv_data=False, accept_cookies=True, ports=None):
-    # Create screenshots subdirectory
-    screenshots_folder = os.path.join(output_folder, "screenshots")
-    os.makedirs(screenshots_folder, exist_ok=True)
+def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, threads, timeout, webdriver_path, delay, vpn_mode, get_csv_data=False, accept_cookies=True, ports=None, dedup_final_urls=True, previous_results=None,
+                         signatures=None, skip_categories=None, storage="files"):
+    # Create screenshots subdirectory (or the archive that replaces it)
+    archive = os.path.join(output_folder, ARCHIVE_FILE) if storage == "archive" else None
+    if not archive:
+        os.makedirs(os.path.join(output_folder, "screenshots"), exist_ok=True)
 
     retry_file = f"{os.path.basename(session_file)}.retry.session"
     successful_domains_order = []
@@ -1046,6 +1659,7 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
     domain_titles = {}
     domain_status_codes = {}
     domain_body_excerpts = {}
+    domain_details = {}
     
     main_session = load_session(session_file)
     if main_session:
@@ -1054,6 +1668,11 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
         domain_titles = main_session.get("domain_titles", {})
         domain_status_codes = main_session.get("domain_status_codes", {})
         domain_body_excerpts = main_session.get("domain_body_excerpts", {})
+        domain_details = main_session.get("domain_details", {})
+
+    final_url_index = build_final_url_index(domain_details) if dedup_final_urls else None
+    blob_index = build_blob_index(domain_details) if storage in ("cas", "archive") else None
+    screenshot_manifest = load_screenshot_manifest(output_folder) if storage == "sharded" else None
     
     while True:
         retry_session = load_retry_session(retry_file)
@@ -1108,6 +1727,7 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
         progress_bar_requests = tqdm(total=max_requests if max_requests else 0, desc="Requests / total", position=2, unit="dom")
         progress_bar_domains.update(len(processed_domains))
         progress_bar_screenshots.update(screenshots_done)
+        metrics.set_gauge("targets_pending", len(remaining_domains))
         vpn_process = None
         ip_counter = 0
         with ThreadPoolExecutor(max_workers=threads) as executor:
@@ -1133,6 +1753,7 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
                             if current_ip:
                                 connected = True
                                 ip_counter += 1
+                                metrics.inc("vpn_rotations", mode=vpn_mode)
                                 tqdm.write(f"Connected with IP #{ip_counter}: {current_ip}")
                             else:
                                 tqdm.write("OpenVPN connection failed. Retrying...")
@@ -1147,6 +1768,7 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
                             if current_ip:
                                 connected = True
                                 ip_counter += 1
+                                metrics.inc("vpn_rotations", mode=vpn_mode)
                                 tqdm.write(f"Connected with NordVPN, IP #{ip_counter}: {current_ip}")
                             else:
                                 tqdm.write("NordVPN connection failed. Retrying...")
@@ -1160,15 +1782,20 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
                 progress_bar_requests.reset()
                 completed_requests = 0
                 futures = {
-                    executor.submit(take_screenshot, domain, output_folder, timeout, webdriver_path, get_csv_data, accept_cookies, ports): domain
+                    executor.submit(metrics.track_in_flight(take_screenshot), domain, output_folder, timeout, webdriver_path, get_csv_data, accept_cookies, ports, final_url_index, previous_results.get(domain, {}) if previous_results is not None else None,
+                                    signatures, skip_categories, blob_index, archive, screenshot_manifest, previous_results): domain
                     for domain in batch_domains
                 }
                 try:
                     for future in as_completed(futures):
                         domain = futures[future]
+                        metrics.add_gauge("targets_pending", -1)
                         try:
                             result = future.result()
-                            if len(result) == 5:
+                            details = {}
+                            if len(result) == 6:
+                                success, working_url, page_title, status_code, body_excerpt, details = result
+                            elif len(result) == 5:
                                 success, working_url, page_title, status_code, body_excerpt = result
                             elif len(result) == 3:
                                 success, working_url, page_title = result
@@ -1176,6 +1803,9 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
                             else:
                                 success, working_url = result
                                 page_title, status_code, body_excerpt = "", None, ""
+                            metrics.record_target(capture_outcome(working_url, details), details.get("error_class"))
+                            # --port: the other live endpoints of the target come back with it, each recorded as its own row
+                            endpoints = details.pop("endpoints", {})
                             processed_domains.append(domain)
                             progress_bar_domains.update(1)
                             progress_bar_requests.update(1)
@@ -1190,6 +1820,8 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
                                     domain_urls[domain] = working_url
                                 if page_title:
                                     domain_titles[domain] = page_title
+                                if details:
+                                    domain_details[domain] = details
                                 if get_csv_data:
                                     domain_status_codes[domain] = str(status_code) if status_code is not None else ""
                                     domain_body_excerpts[domain] = str(body_excerpt) if body_excerpt else ""
@@ -1201,13 +1833,21 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
                                     domain_urls[domain] = working_url
                                 if page_title:
                                     domain_titles[domain] = page_title
+                                if details:
+                                    domain_details[domain] = details
                                 if get_csv_data:
                                     domain_status_codes[domain] = str(status_code) if status_code is not None else ""
                                     domain_body_excerpts[domain] = str(body_excerpt) if body_excerpt else ""
                             else:
                                 failed_domains_set.add(domain)
+                                if details:
+                                    domain_details[domain] = details
+                            added = record_endpoints(endpoints, get_csv_data, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
+                            screenshots_done += added
+                            progress_bar_screenshots.update(added)
                         except Exception:
                             logging.getLogger('domain_errors').error(f"{domain}: Unexpected error during retry.")
+                            metrics.record_target("failed", "exception")
                             failed_domains_set.add(domain)
                 except KeyboardInterrupt:
                     print("\nInterrupted during retry. Saving retry session...")
@@ -1251,24 +1891,35 @@ def retry_failed_domains(session_file, output_folder, vpn_dir, max_requests, thr
                          domain_urls,
                          domain_titles,
                          domain_status_codes,
-                         domain_body_excerpts)
+                         domain_body_excerpts,
+                         domain_details)
         else:
-            save_session(session_file, [], [], 0, failed_domains_set, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts)
+            save_session(session_file, [], [], 0, failed_domains_set, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
         
         report_info_path = os.path.join(output_folder, "report_info.json")
         report_info = {
             "successful_domains_order": successful_domains_order,
             "domain_urls": domain_urls,
-            "domain_titles": domain_titles
+            "domain_titles": domain_titles,
+            "domain_status_codes": domain_status_codes,
+            "domain_body_excerpts": domain_body_excerpts,
+            "domain_details": domain_details
         }
         
         if get_csv_data:
-            generate_csv(output_folder, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts)
+            generate_csv(output_folder, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
         try:
             with open(report_info_path, "w") as f:
                 json.dump(report_info, f)
         except Exception as e:
             logging.getLogger('general_errors').error(f"Failed to save report info: {str(e)}")
+        if storage == "cas":
+            try:
+                stored = write_blob_manifest(output_folder, domain_details)
+                print(f"Content-addressed storage: {len(stored)} screenshots in {len({entry['blob'] for entry in stored.values()})} unique blobs.")
+            except Exception as e:
+                logging.getLogger('general_errors').error(f"Failed to save blob manifest: {str(e)}")
+        summarize_timings(output_folder, domain_details)
         if failed_domains_set:
             print(f"{len(failed_domains_set)} domains still failing after retry.")
             while True:
@@ -1324,7 +1975,14 @@ def main():
     parser.add_argument("-D", "--delay", type=int, default=0, help="Delay (in seconds) before connecting to the new VPN (default: 0)")
     parser.add_argument("-c", "--csv", action="store_true", help="Generate a CSV file with domain, status code, title, and body excerpt")
     parser.add_argument("--no-cookie-accept", action="store_true", help="Disable automatic cookie consent banner acceptance (enabled by default)")
-    parser.add_argument("--port", help="Additional ports to try (comma-separated, e.g., 8000,8001,8002). Default ports 80 and 443 are always tried first. When custom ports are specified, all ports (default + custom) are tested even if a default port works.")
+    parser.add_argument("--no-dedup", action="store_true", help="Disable final-URL deduplication (by default, targets redirecting to a page already captured are recorded as aliases instead of being rendered again)")
+    parser.add_argument("--rescan", metavar="PREVIOUS_OUTPUT", help="Re-scan against a previous output folder: targets whose ETag, Last-Modified, content length or body hash did not change reuse the previous screenshot instead of being rendered again")
+    parser.add_argument("--signatures", metavar="FILE", action="append", default=[], help="Additional boilerplate signature file (JSON, same format as signatures.json), checked before the bundled signatures; can be repeated")
+    parser.add_argument("--skip-categories", metavar="CATEGORIES", help="Comma-separated boilerplate categories (e.g. parked,default-page, or 'all') whose pages are recorded without taking the screenshot")
+    parser.add_argument("--storage", choices=STORAGE_MODES, default="files", help="Screenshot storage: one PNG per target (files), each unique PNG once under blobs/, named by its SHA-256 and hardlinked into screenshots/ (cas), every PNG in the single SQLite file screenshots.sqlite (archive), or one PNG per target under hash-prefixed subfolders screenshots/ab/cd/ with a manifest (sharded) (default: files)")
+    parser.add_argument("--metrics-port", metavar="[HOST:]PORT", help="Expose live Prometheus/OpenMetrics metrics at http://HOST:PORT/metrics (HOST defaults to 127.0.0.1; IPv6 in brackets, e.g. [::1]:9108)")
+    parser.add_argument("--metrics-file", metavar="PATH", help="Periodically rewrite live metrics to PATH in the Prometheus text format (e.g. for the node_exporter textfile collector)")
+    parser.add_argument("--port", help="Additional ports to try (comma-separated, e.g., 8000,8001,8002). Default ports 80 and 443 are always tried first. When custom ports are specified, all ports (default + custom) are tested even if a default port works, and every live endpoint gets its own screenshot and result row.")
     args = parser.parse_args()
     if args.vpn_mode == "none":
         if args.max_requests:
@@ -1365,6 +2023,17 @@ def main():
         logging.getLogger('general_errors').error(error_message)
         sys.exit(1)
     setup_logging(args.screenshot_dir)
+    if args.metrics_port:
+        try:
+            metrics.start_metrics_server(args.metrics_port)
+            print(f"Metrics available at http://{args.metrics_port if ':' in args.metrics_port else '127.0.0.1:' + args.metrics_port}/metrics")
+        except Exception as e:
+            error_message = f"Cannot start metrics server on '{args.metrics_port}': {str(e)}"
+            print(f"Error: {error_message}")
+            logging.getLogger('general_errors').error(error_message)
+            sys.exit(1)
+    if args.metrics_file:
+        metrics.start_metrics_file(args.metrics_file)
     
     if args.stdin:
         if args.domains:
@@ -1407,9 +2076,28 @@ def main():
         logging.getLogger('general_errors').error(error_message)
         sys.exit(1)
     domains = list(set(domains))
+    try:
+        signatures = load_signatures(args.signatures)
+    except Exception as e:
+        error_message = f"Cannot load signatures: {str(e)}"
+        print(f"Error: {error_message}")
+        logging.getLogger('general_errors').error(error_message)
+        sys.exit(1)
+    skip_categories = {c.strip() for c in args.skip_categories.split(",") if c.strip()} if args.skip_categories else None
+    previous_results = None
+    if args.rescan:
+        try:
+            previous_results = load_previous_run(args.rescan)
+        except Exception as e:
+            error_message = f"Cannot load previous run for re-scan: {str(e)}"
+            print(f"Error: {error_message}")
+            logging.getLogger('general_errors').error(error_message)
+            sys.exit(1)
+        print(f"Re-scan mode: {len(previous_results)} previous captures loaded from '{args.rescan}'.")
     try:
         accept_cookies = not args.no_cookie_accept
-        process_domains(domains, args.screenshot_dir, args.vpn_dir if args.vpn_dir else "", args.max_requests, args.threads, args.timeout, webdriver_path, session_file, args.delay, args.vpn_mode, args.csv, accept_cookies, args.port)
+        process_domains(domains, args.screenshot_dir, args.vpn_dir if args.vpn_dir else "", args.max_requests, args.threads, args.timeout, webdriver_path, session_file, args.delay, args.vpn_mode, args.csv, accept_cookies, args.port, not args.no_dedup, previous_results,
+                        signatures, skip_categories, args.storage)
     except KeyboardInterrupt:
         print("\nOperation canceled by user.")
         sys.exit(0)
@@ -1428,7 +2116,8 @@ def main():
                 retry_choice = input().strip().lower()
                 if retry_choice == 'y':
                     accept_cookies = not args.no_cookie_accept
-                    continue_retry = retry_failed_domains(session_file, args.screenshot_dir, args.vpn_dir if args.vpn_dir else "", args.max_requests, args.threads, args.timeout, webdriver_path, args.delay, args.vpn_mode, args.csv, accept_cookies, args.port)
+                    continue_retry = retry_failed_domains(session_file, args.screenshot_dir, args.vpn_dir if args.vpn_dir else "", args.max_requests, args.threads, args.timeout, webdriver_path, args.delay, args.vpn_mode, args.csv, accept_cookies, args.port, not args.no_dedup, previous_results,
+                        signatures, skip_categories, args.storage)
                     if not continue_retry:
                         break
                     session = load_session(session_file)
@@ -1451,7 +2140,8 @@ def main():
                                 domain_titles = session.get("domain_titles", {})
                                 domain_status_codes = session.get("domain_status_codes", {})
                                 domain_body_excerpts = session.get("domain_body_excerpts", {})
-                                generate_csv(args.screenshot_dir, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts)
+                                domain_details = session.get("domain_details", {})
+                                generate_csv(args.screenshot_dir, successful_domains_order, domain_urls, domain_titles, domain_status_codes, domain_body_excerpts, domain_details)
                         break
                 elif retry_choice == 'n':
                     print("Retry skipped.")
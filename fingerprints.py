@@ -0,0 +1,69 @@
+import re
+import hashlib
+from collections import Counter
+
+import numpy as np
+from hashing import pack_bits
+
+# Text and DOM fingerprints of a loaded page, computed by the capture workers
+# while the page is still open. Each one is a 64-bit SimHash, so pages built
+# from the same template get hashes a few bits apart even when their branding
+# or wording differs, and they compare like the perceptual hashes.
+
+FINGERPRINT_KINDS = ["text", "structure", "title"]
+# Caps on what the page script returns, so very large pages stay cheap to fingerprint
+FINGERPRINT_MAX_TEXT = 100000
+FINGERPRINT_MAX_TAGS = 20000
+# Consecutive elements per structure feature and characters per title feature
+STRUCTURE_SHINGLE = 4
+TITLE_NGRAM = 3
+
+# Visible text and the element sequence in document order, each element as "tag:depth"
+PAGE_FINGERPRINT_SCRIPT = f"""
+    try {{
+        var tags = [];
+        var walk = function(element, depth) {{
+            for (var child = element.firstElementChild; child && tags.length < {FINGERPRINT_MAX_TAGS}; child = child.nextElementSibling) {{
+                tags.push(child.tagName.toLowerCase() + ':' + depth);
+                walk(child, depth + 1);
+            }}
+        }};
+        walk(document.documentElement, 0);
+        var text = document.body ? (document.body.innerText || document.body.textContent || '') : '';
+        return {{text: text.substring(0, {FINGERPRINT_MAX_TEXT}), tags: tags.join(' ')}};
+    }} catch(e) {{
+        return {{text: '', tags: ''}};
+    }}
+"""
+
+
+def simhash(features):
+    """64-bit SimHash (hex) of a sequence of features, each weighted by how often it occurs; None without features"""
+    counts = Counter(features)
+    if not counts:
+        return None
+    digests = b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in counts)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(counts), 8), axis=1).astype(np.int64)
+    weights = (bits * 2 - 1).T @ np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    return f"{int(pack_bits((weights > 0).reshape(1, -1))[0]):016x}"
+
+
+def shingles(items, size):
+    return [" ".join(items[i:i + size]) for i in range(max(1, len(items) - size + 1))] if items else []
+
+
+def compute_fingerprints(text, tags, title):
+    """Fingerprints of a page from its visible text, its "tag:depth" sequence and its title, as {kind: hex}"""
+    normalized_title = " ".join(title.lower().split())
+    fingerprints = {
+        "text": simhash(re.findall(r"\w+", text.lower())),
+        "structure": simhash(shingles(tags.split(), STRUCTURE_SHINGLE)),
+        "title": simhash(normalized_title[i:i + TITLE_NGRAM] for i in range(max(1, len(normalized_title) - TITLE_NGRAM + 1)) if normalized_title),
+    }
+    return {kind: value for kind, value in fingerprints.items() if value}
+
+
+def page_content(driver):
+    """(visible text, "tag:depth" sequence) of the page currently loaded in driver"""
+    page = driver.execute_script(PAGE_FINGERPRINT_SCRIPT) or {}
+    return page.get("text") or "", page.get("tags") or ""
@@ -1,96 +1,1361 @@
 import os
+import io
+import re
 import json
 import html
+import shutil
+import struct
+import base64
+import hashlib
+import operator
+import threading
 from PIL import Image
-import imagehash
+from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
+from hashing import HASH_ALGORITHMS, prepare_hash_inputs, compute_hashes, compute_hashes_batch
+from storage import ARCHIVE_FILE, SCREENSHOTS_FOLDER, link_file, archive_entries, load_screenshot_manifest, screenshot_stat, open_screenshot, shard_folder, shard_previews
 
-def generate_report(output_folder, columns=4):
-    report_path = os.path.join(output_folder, "report.html")
-    screenshots_folder = os.path.join(output_folder, "screenshots")
-    if not os.path.exists(screenshots_folder):
-        print("No screenshots directory found in the specified directory.")
-        return
-    image_files = [f for f in os.listdir(screenshots_folder) if f.endswith(".png")]
-    if not image_files:
-        print("No screenshots found in the screenshots directory.")
-        return
-    
-    report_info_path = os.path.join(output_folder, "report_info.json")
-    successful_domains_order = []
-    domain_urls = {}
-    domain_titles = {}
-    
-    if os.path.exists(report_info_path):
+HASH_CACHE_FILE = "hash_cache.json"
+HASH_CACHE_VERSION = 3
+# Hashes the report computes unless told otherwise; the capture workers compute all of HASH_ALGORITHMS
+DEFAULT_HASH_ALGORITHMS = ["ahash"]
+HASH_BATCH_SIZE = 256
+HASH_DOWNSCALE_SIZE = 512
+THUMBNAILS_FOLDER = "thumbnails"
+THUMBNAIL_QUALITY = 80
+TILES_FOLDER = "tiles"
+TILES_INFO_FILE = "tiles.json"
+# Screenshots with a side longer than this get a tile pyramid, so the modal never loads the whole PNG
+TILE_THRESHOLD = 4096
+TILE_SIZE = 512
+# Upper bound on the pixels of full-resolution screenshots decoded at the same time (about 1 GB of RGBA)
+DECODE_PIXEL_BUDGET = 256 * 1024 * 1024
+CLUSTERS_FILE = "clusters.json"
+REPORT_INDEX_FILE = "report_index.json"
+REPORT_INDEX_VERSION = 1
+# Screenshots whose hashes differ in at most this many of the 64 bits are grouped into one cluster
+CLUSTER_THRESHOLD = 4
+# Pages whose structure fingerprints differ in at most this many bits are built from the same template
+TEMPLATE_THRESHOLD = 3
+
+decode_budget = threading.Condition()
+decode_pixels_in_use = 0
+
+
+def hash_base_image(image):
+    """Downscale a screenshot to at most HASH_DOWNSCALE_SIZE pixels per side (the image every hash is computed on)"""
+    factor = max(1, max(image.size) // HASH_DOWNSCALE_SIZE)
+    if factor > 1:
+        image = image.reduce(factor)
+    return image
+
+
+def compute_image_hashes(image, algorithms=DEFAULT_HASH_ALGORITHMS):
+    """Perceptual hashes of a screenshot, computed on a copy downscaled to at most HASH_DOWNSCALE_SIZE pixels per side"""
+    return compute_hashes(hash_base_image(image), algorithms)
+
+
+def thumbnail_path(output_folder, filename, sharded=False):
+    folder = os.path.join(output_folder, THUMBNAILS_FOLDER)
+    return os.path.join(shard_folder(folder, filename) if sharded else folder, os.path.splitext(filename)[0] + ".jpg")
+
+
+def save_thumbnail(image, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    image.convert("RGB").save(tmp_path, "JPEG", quality=THUMBNAIL_QUALITY)
+    os.replace(tmp_path, path)
+
+
+def hash_screenshot_bytes(png_data, thumbnail=None, algorithms=HASH_ALGORITHMS):
+    """Hash a screenshot that is still in memory (used by the capture workers), saving its thumbnail to the given path"""
+    with Image.open(io.BytesIO(png_data)) as image:
+        base = hash_base_image(image)
+        if thumbnail:
+            save_thumbnail(base, thumbnail)
+        return compute_hashes(base, algorithms)
+
+
+def acquire_decode_budget(pixels):
+    """Wait until a full decode of pixels fits in DECODE_PIXEL_BUDGET (an oversized image runs alone)"""
+    global decode_pixels_in_use
+    with decode_budget:
+        while decode_pixels_in_use and decode_pixels_in_use + pixels > DECODE_PIXEL_BUDGET:
+            decode_budget.wait()
+        decode_pixels_in_use += pixels
+
+
+def release_decode_budget(pixels):
+    global decode_pixels_in_use
+    with decode_budget:
+        decode_pixels_in_use -= pixels
+        decode_budget.notify_all()
+
+
+def thumbnail_is_fresh(path, thumbnail):
+    try:
+        return os.stat(thumbnail).st_mtime_ns >= screenshot_stat(path)[1]
+    except OSError:
+        return False
+
+
+def decode_base_image(path, thumbnail=None):
+    """Fully decode a screenshot file into its hash base image, saving that as the thumbnail.
+
+    Pillow cannot decode PNG at reduced resolution, so full decodes share
+    DECODE_PIXEL_BUDGET and the full-size pixels are released as soon as
+    the base image is made.
+    """
+    with open_screenshot(path) as f, Image.open(f) as image:
+        pixels = image.width * image.height
+        acquire_decode_budget(pixels)
         try:
-            with open(report_info_path, "r") as f:
-                report_info = json.load(f)
-                successful_domains_order = report_info.get("successful_domains_order", [])
-                domain_urls = report_info.get("domain_urls", {})
-                domain_titles = report_info.get("domain_titles", {})
-        except Exception as e:
-            print(f"Warning: Could not load report info: {e}")
+            base = hash_base_image(image)
+            base.load()
+        finally:
+            release_decode_budget(pixels)
+    if thumbnail:
+        try:
+            save_thumbnail(base, thumbnail)
+        except OSError:
+            pass
+    return base
+
 
-    def compute_hash(img):
-        img_path = os.path.join(screenshots_folder, img)
+def load_hash_inputs(path, thumbnail=None, algorithms=DEFAULT_HASH_ALGORITHMS):
+    """Prepare the inputs of the requested hashes, from the thumbnail when it is at least as new as the screenshot"""
+    if thumbnail and thumbnail_is_fresh(path, thumbnail):
         try:
-            img_hash = str(imagehash.average_hash(Image.open(img_path)))
-            return img, img_hash
-        except Exception as e:
-            print(f"Failed to process image {img}: {e}")
-            return img, None
+            with Image.open(thumbnail) as image:
+                return prepare_hash_inputs(hash_base_image(image), algorithms)
+        except OSError:
+            pass
+    return prepare_hash_inputs(decode_base_image(path, thumbnail), algorithms)
 
-    image_hashes = {}
-    with ThreadPoolExecutor() as executor:
-        results = list(tqdm(executor.map(compute_hash, image_files), total=len(image_files), desc="Processing images"))
 
-    for img, img_hash in results:
-        if img_hash is not None:
-            image_hashes[img] = img_hash
-    
-    filename_to_domain = {}
-    for img in image_files:
-        domain = os.path.splitext(img)[0]
-        filename_to_domain[img] = domain
-    
-    ordered_images = []
-    seen_domains = set()
-    
-    for domain in successful_domains_order:
-        for img in image_files:
-            img_domain = os.path.splitext(img)[0]
-            if img_domain == domain and img not in ordered_images:
-                ordered_images.append(img)
-                seen_domains.add(domain)
-                break
-    
-    for img in image_files:
-        if img not in ordered_images:
-            ordered_images.append(img)
+def ensure_thumbnail(path, thumbnail):
+    """Create the thumbnail of a screenshot unless an up-to-date one exists; returns whether it exists afterwards"""
+    if thumbnail_is_fresh(path, thumbnail):
+        return True
+    try:
+        decode_base_image(path, thumbnail)
+    except Exception as e:
+        print(f"Failed to create thumbnail for {path}: {e}")
+    return thumbnail_is_fresh(path, thumbnail)
+
+
+def image_size(path):
+    """(width, height) of a screenshot, read from the PNG header without decoding"""
+    with open_screenshot(path) as f:
+        header = f.read(24)
+        if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+            return struct.unpack(">II", header[16:24])
+        f.seek(0)
+        with Image.open(f) as image:
+            return image.size
+
+
+def tile_levels(width, height):
+    """Pyramid levels of an image: level 0 is full size, each next one half as large, the last one fits in a tile"""
+    levels = 1
+    while max(width, height) > TILE_SIZE << (levels - 1):
+        levels += 1
+    return levels
+
+
+def tiles_folder(output_folder, filename, sharded=False):
+    folder = os.path.join(output_folder, TILES_FOLDER)
+    return os.path.join(shard_folder(folder, filename) if sharded else folder, os.path.splitext(filename)[0])
+
+
+def tiles_are_fresh(path, folder):
+    try:
+        with open(os.path.join(folder, TILES_INFO_FILE), "r") as f:
+            info = json.load(f)
+        size, mtime_ns = screenshot_stat(path)
+    except (OSError, ValueError):
+        return False
+    return [info.get("size"), info.get("mtime_ns"), info.get("tile_size")] == [size, mtime_ns, TILE_SIZE]
+
+
+def build_tiles(path, folder):
+    """Cut a screenshot into the JPEG tiles of its pyramid, folder/<level>/<column>_<row>.jpg, unless they are up to date.
+
+    tiles.json is written last, so an interrupted build is redone on the
+    next run. Returns whether the tiles exist afterwards.
+    """
+    if tiles_are_fresh(path, folder):
+        return True
+    try:
+        size, mtime_ns = screenshot_stat(path)
+        shutil.rmtree(folder, ignore_errors=True)
+        with open_screenshot(path) as f, Image.open(f) as image:
+            width, height = image.size
+            acquire_decode_budget(width * height)
+            try:
+                level_image = image
+                for level in range(tile_levels(width, height)):
+                    level_folder = os.path.join(folder, str(level))
+                    os.makedirs(level_folder, exist_ok=True)
+                    for top in range(0, level_image.height, TILE_SIZE):
+                        for left in range(0, level_image.width, TILE_SIZE):
+                            tile = level_image.crop((left, top, min(left + TILE_SIZE, level_image.width), min(top + TILE_SIZE, level_image.height)))
+                            tile.convert("RGB").save(os.path.join(level_folder, f"{left // TILE_SIZE}_{top // TILE_SIZE}.jpg"), "JPEG", quality=THUMBNAIL_QUALITY)
+                    level_image = level_image.reduce(2)
+            finally:
+                release_decode_budget(width * height)
+        write_file_atomic(os.path.join(folder, TILES_INFO_FILE), json.dumps({
+            "width": width, "height": height, "tile_size": TILE_SIZE, "size": size, "mtime_ns": mtime_ns,
+        }))
+        return True
+    except Exception as e:
+        print(f"Failed to create tiles for {path}: {e}")
+        return False
+
+
+def group_linked_copies(images, same_file):
+    """Group images that are hardlinks of one file (same_file: image -> (device, inode)), in their original order"""
+    groups = {}
+    for img in images:
+        groups.setdefault(same_file.get(img, img), []).append(img)
+    return list(groups.values())
+
+
+def hash_image_file(path, thumbnail=None, algorithms=DEFAULT_HASH_ALGORITHMS):
+    return compute_hashes_batch([load_hash_inputs(path, thumbnail, algorithms)], algorithms)[1][0]
+
+
+def load_hash_cache(output_folder):
+    """Perceptual hashes of earlier runs, keyed by screenshot filename with the size and mtime they were computed for"""
+    cache_path = os.path.join(output_folder, HASH_CACHE_FILE)
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+        # Older versions hashed the full decoded image, not the downscaled hash base: recompute them
+        if cache.get("version") != HASH_CACHE_VERSION:
+            return {}
+        return cache.get("entries", {})
+    except Exception as e:
+        print(f"Warning: Could not load hash cache: {e}")
+        return {}
+
+
+def save_hash_cache(output_folder, entries):
+    cache_path = os.path.join(output_folder, HASH_CACHE_FILE)
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"version": HASH_CACHE_VERSION, "entries": entries}, f)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"Warning: Could not save hash cache: {e}")
+
+
+def load_report_index(output_folder, cluster_hash, threshold):
+    """Screenshots included by the last report run: filename -> domain, size, mtime, dimensions, thumbnail, tiles and cluster.
+
+    The clusters are only reusable with the same hash and threshold, so an
+    index written with other settings counts as empty.
+    """
+    index_path = os.path.join(output_folder, REPORT_INDEX_FILE)
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, "r") as f:
+            index = json.load(f)
+        if index.get("version") != REPORT_INDEX_VERSION or index.get("cluster_hash") != cluster_hash or index.get("threshold") != threshold:
+            return {}
+        return index.get("images", {})
+    except Exception as e:
+        print(f"Warning: Could not load report index: {e}")
+        return {}
+
+
+def save_report_index(output_folder, cluster_hash, threshold, images):
+    try:
+        write_file_atomic(os.path.join(output_folder, REPORT_INDEX_FILE), json.dumps({
+            "version": REPORT_INDEX_VERSION,
+            "cluster_hash": cluster_hash,
+            "threshold": threshold,
+            "images": images,
+        }, separators=(",", ":")))
+    except Exception as e:
+        print(f"Warning: Could not save report index: {e}")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def hash_chunks(value, count, bits=64):
+    """Split value into count contiguous bit ranges; hashes within count - 1 bits of each other share at least one"""
+    bounds = [bits * i // count for i in range(count + 1)]
+    return [(value >> start) & ((1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+
+
+def cluster_hashes(image_hashes, threshold=CLUSTER_THRESHOLD, previous=None):
+    """Group screenshots whose hashes are within threshold bits of each other (transitively).
+
+    Returns (clusters, sizes): clusters maps each screenshot to a cluster ID,
+    sizes maps each ID to its number of screenshots. IDs are numbered from
+    the largest cluster down, so they are stable for an unchanged set.
+
+    previous maps screenshots already clustered by an earlier run (with the
+    same hashes and threshold) to their cluster IDs. Their clusters are kept
+    as they are and only the hashes of the other screenshots are compared.
+    """
+    screenshots_by_value = {}
+    for img, img_hash in image_hashes.items():
+        screenshots_by_value.setdefault(int(img_hash, 16), []).append(img)
+    values = sorted(screenshots_by_value)
+
+    # Union-find over distinct hash values; identical hashes are already grouped above
+    parent = {value: value for value in values}
+
+    def find(value):
+        while parent[value] != value:
+            parent[value] = parent[parent[value]]
+            value = parent[value]
+        return value
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b and hamming_distance(a, b) <= threshold:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    new_values = None
+    if previous:
+        first_values = {}
+        for img, cluster_id in previous.items():
+            value = int(image_hashes[img], 16)
+            root, other = find(value), find(first_values.setdefault(cluster_id, value))
+            if root != other:
+                parent[max(root, other)] = min(root, other)
+        new_values = {int(img_hash, 16) for img, img_hash in image_hashes.items() if img not in previous}
+
+    # Multi-index hashing: only hashes sharing one of the threshold + 1 bit ranges exactly are compared
+    bits = max((len(h) * 4 for h in image_hashes.values()), default=64)
+    if 0 < threshold < bits and new_values != set():
+        buckets = {}
+        for value in values:
+            for index, chunk in enumerate(hash_chunks(value, threshold + 1, bits)):
+                buckets.setdefault((index, chunk), []).append(value)
+        for bucket in buckets.values():
+            if new_values is None:
+                for i, value in enumerate(bucket):
+                    for other in bucket[i + 1:]:
+                        union(value, other)
+            else:
+                # Pairs of earlier screenshots were compared by the run that clustered them
+                for value in bucket:
+                    if value in new_values:
+                        for other in bucket:
+                            if other != value:
+                                union(value, other)
+    elif threshold >= bits:
+        for value in values:
+            parent[value] = values[0]
+
+    members = {}
+    for value in values:
+        members.setdefault(find(value), []).extend(screenshots_by_value[value])
+    ordered = sorted(members.values(), key=lambda imgs: (-len(imgs), min(imgs)))
+    clusters = {}
+    sizes = {}
+    for cluster_id, imgs in enumerate(ordered, 1):
+        sizes[cluster_id] = len(imgs)
+        for img in imgs:
+            clusters[img] = cluster_id
+    return clusters, sizes
+
+
+def template_groups(domain_details, threshold=TEMPLATE_THRESHOLD):
+    """Group captured pages by their structure fingerprint; maps each domain in a group of two or more to its group ID"""
+    structures = {
+        domain: details["fingerprints"]["structure"] for domain, details in domain_details.items()
+        if details.get("fingerprints", {}).get("structure") and not details.get("alias_of")
+    }
+    groups, sizes = cluster_hashes(structures, threshold)
+    return {domain: group for domain, group in groups.items() if sizes[group] > 1}
+
+
+def save_clusters(output_folder, clusters, sizes, threshold, algorithm="ahash"):
+    cluster_members = {}
+    for img, cluster_id in clusters.items():
+        cluster_members.setdefault(cluster_id, []).append(img)
+    try:
+        with open(os.path.join(output_folder, CLUSTERS_FILE), "w") as f:
+            json.dump({
+                "algorithm": algorithm,
+                "threshold": threshold,
+                "clusters": [
+                    {"id": cluster_id, "size": sizes[cluster_id], "screenshots": sorted(cluster_members[cluster_id])}
+                    for cluster_id in sorted(sizes)
+                ],
+            }, f, indent=2)
+    except Exception as e:
+        print(f"Warning: Could not save clusters: {e}")
+
+
+REPORT_DATA_FILE = "report_data.js"
+# Columns of each row in report_data.js (the script in REPORT_SCRIPT indexes them by position)
+REPORT_FIELDS = ["img", "url", "title", "thumb", "ahash", "cluster", "rescan", "aliases", "category", "tiles", "domain"]
+
+
+REPORT_SEARCH_FILE = "report_search.js"
+# Fields of the search index; the page accepts them as qualifiers, e.g. status:403 or title:login
+SEARCH_FIELDS = ["domain", "url", "title", "status", "body", "category"]
+
+
+def report_data_script(data, variable="REPORT_DATA"):
+    """The report rows as a script (pages opened from file:// cannot fetch JSON)"""
+    data_json = json.dumps(data, separators=(",", ":"))
+    # JSON.parse on a string literal is parsed much faster than the equivalent object literal
+    return f"window.{variable} = JSON.parse('" + data_json.replace("\\", "\\\\").replace("'", "\\'") + "');\n"
+
+
+def search_tokens(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def build_search_index(rows, status_codes, body_excerpts):
+    """Inverted index over the searchable fields of the report rows.
+
+    For every field, tokens is the sorted list of distinct words and rows[i]
+    lists the rows containing tokens[i] as a comma-separated string of
+    deltas. The page only decodes the lists of the tokens a query matches.
+    """
+    url_index, title_index, aliases_index, category_index = (REPORT_FIELDS.index(field) for field in ("url", "title", "aliases", "category"))
+    domains = [row[REPORT_FIELDS.index("domain")] for row in rows]
+    field_texts = {
+        "domain": (" ".join([domain, *row[aliases_index]]) for domain, row in zip(domains, rows)),
+        "url": (row[url_index] for row in rows),
+        "title": (row[title_index] for row in rows),
+        "status": (str(status_codes.get(domain) or "") for domain in domains),
+        "body": (body_excerpts.get(domain) or "" for domain in domains),
+        "category": (row[category_index] for row in rows),
+    }
+    index = {}
+    for field in SEARCH_FIELDS:
+        postings = {}
+        for row_number, text in enumerate(field_texts[field]):
+            for token in search_tokens(text):
+                postings.setdefault(token, []).append(row_number)
+        tokens = sorted(postings)
+        index[field] = {
+            "tokens": tokens,
+            "rows": [",".join(map(str, map(operator.sub, postings[token], [0, *postings[token][:-1]]))) for token in tokens],
+        }
+    return {"fields": SEARCH_FIELDS, "index": index}
+
+
+def search_index_key(rows, status_codes, body_excerpts):
+    """Digest of everything build_search_index reads, to skip rebuilding an unchanged index"""
+    searched = [REPORT_FIELDS.index(field) for field in ("domain", "url", "title", "aliases", "category")]
+    inputs = []
+    for row in rows:
+        domain = row[searched[0]]
+        inputs.append([*(row[i] for i in searched), status_codes.get(domain), body_excerpts.get(domain)])
+    return hashlib.sha1(json.dumps([SEARCH_FIELDS, inputs]).encode("utf-8")).hexdigest()[:12]
+
+
+def write_search_index(path, rows, status_codes, body_excerpts):
+    """Write the search index script unless the one at path was built from the same inputs; returns its version"""
+    key = search_index_key(rows, status_codes, body_excerpts)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.readline().rstrip("\n") == f"// {key}":
+                return key
+    except OSError:
+        pass
+    write_file_atomic(path, f"// {key}\n" + report_data_script(build_search_index(rows, status_codes, body_excerpts), "REPORT_SEARCH"))
+    return key
+
+
+def cluster_rows(rows):
+    """Row numbers of every cluster with more than one row, so the page can exclude a cluster without scanning the rows"""
+    cluster_index = REPORT_FIELDS.index("cluster")
+    members = {}
+    for row_number, row in enumerate(rows):
+        members.setdefault(row[cluster_index], []).append(row_number)
+    return {cluster_id: row_numbers for cluster_id, row_numbers in members.items() if len(row_numbers) > 1}
+
+
+def category_rows(rows):
+    """Row numbers of every boilerplate category, for excluding a whole category from the gallery"""
+    category_index = REPORT_FIELDS.index("category")
+    members = {}
+    for row_number, row in enumerate(rows):
+        if row[category_index]:
+            members.setdefault(row[category_index], []).append(row_number)
+    return members
 
-    sidebar_domains = []
-    for img in ordered_images:
-        if img in image_hashes:
-            domain = os.path.splitext(img)[0]
-            domain_url = domain_urls.get(domain, f"https://{domain}")
-            if not domain_url.startswith(("http://", "https://")):
-                domain_url = f"https://{domain_url}"
-            page_title = domain_titles.get(domain, "")
-            sidebar_domains.append({
-                'domain': domain,
-                'url': domain_url,
-                'img': img,
-                'title': page_title
-            })
 
-    html_content = f"""
+def similarity_index(rows, image_hashes, algorithm):
+    """Packed hashes for the page's "similar" search: 8 big-endian bytes per row in row order, base64-encoded.
+
+    A linear scan over the packed hashes finds the nearest rows of 100k
+    screenshots in a few milliseconds, so no tree or bucket structure is shipped.
+    """
+    img_index = REPORT_FIELDS.index("img")
+    packed = b"".join(int(image_hashes[row[img_index]][algorithm], 16).to_bytes(8, "big") for row in rows)
+    return {"algorithm": algorithm, "hashes": base64.b64encode(packed).decode("ascii")}
+
+
+def write_file_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_report_data(output_folder, data):
+    """Write report_data.js; returns a version of its contents for cache busting"""
+    script = report_data_script(data)
+    write_file_atomic(os.path.join(output_folder, REPORT_DATA_FILE), script)
+    return hashlib.sha1(script.encode("utf-8")).hexdigest()[:12]
+
+
+REPORT_SCRIPT = """
+            (function() {
+            const data = window.REPORT_DATA || { rows: [], clusterSizes: {} };
+            const rows = data.rows;
+            // Le pagine degli shard stanno in una sottocartella: base è il percorso verso la cartella di output
+            const base = data.base || "";
+            // Colonne di ogni riga (REPORT_FIELDS in generate_report.py)
+            const IMG = 0, URL = 1, TITLE = 2, THUMB = 3, CLUSTER = 5, RESCAN = 6, ALIASES = 7, CATEGORY = 8, TILES = 9, DOMAIN = 10;
+            // Altezze fisse: solo le righe visibili esistono nel DOM
+            const GALLERY_ROW_HEIGHT = 320;
+            const GALLERY_MIN_WIDTH = 200;
+            const GALLERY_GAP = 20;
+            const SIDEBAR_ROW_HEIGHT = 96;
+            const OVERSCAN = 2;
+            // Screenshot mostrati da "Show similar"
+            const SIMILAR_COUNT = 12;
+            // Zoom del visualizzatore a tile: passo dei pulsanti e ingrandimento massimo
+            const ZOOM_STEP = 1.5;
+            const MAX_ZOOM = 2;
+            // Campi di cui la pagina ha il testo completo (REPORT_DATA) per cercare frasi esatte
+            const PHRASE_FIELDS = ["domain", "url", "title"];
+
+            let modal = document.getElementById("modal");
+            let modalImage = document.getElementById("modal-image");
+            let modalDomainName = document.getElementById("modal-domain-name");
+            let modalDomainTitle = document.getElementById("modal-domain-title");
+            let modalDomainUrl = document.getElementById("modal-domain-url");
+            let modalContent = document.getElementById("modal-content");
+            let modalTiles = document.getElementById("modal-tiles");
+            let tileCanvas = document.getElementById("tile-canvas");
+            let zoomControls = document.getElementById("zoom-controls");
+            let similarButton = document.getElementById("similar-button");
+            let similarStrip = document.getElementById("similar-strip");
+            let galleryContainer = document.getElementById("gallery-container");
+            let gallery = document.getElementById("gallery");
+            let galleryWindow = document.getElementById("gallery-window");
+            let domainList = document.getElementById("domain-list");
+            let domainSpacer = document.getElementById("domain-spacer");
+            let domainWindow = document.getElementById("domain-window");
+            let currentIndex = -1;
+            let activeRow = -1;
+            let galleryList = [];
+            // Posizione di ogni riga nella galleria, -1 se esclusa
+            let galleryPosition = new Int32Array(rows.length).fill(-1);
+            let galleryColumns = 1;
+            let galleryRange = "";
+            let sidebarList = [];
+            let sidebarPosition = new Map();
+            let sidebarRange = "";
+            let searchTexts = null;
+            let searchIndex = null;
+            let searchPostings = new Map();
+            let currentSearch = "";
+            let phraseTexts = {};
+            let contextMenu = null;
+            let selectedCluster = "";
+            let selectedRow = -1;
+            let showSimilar = false;
+            let similarHi = null;
+            let similarLo = null;
+            let tileRow = -1;
+            let tileScale = 1;
+            let tileFitScale = 1;
+            let tileImages = new Map();
+            // Cluster e categorie esclusi (con le loro righe) e un bit per riga: le righe escluse hanno il bit a 1
+            let filters = new Map();
+            let excluded = new Uint32Array((rows.length + 31) >>> 5);
+
+            function escapeHtml(text) {
+                return String(text).replace(/[&<>"']/g, c => ({ "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" })[c]);
+            }
+
+            function domainOf(row) {
+                return rows[row][DOMAIN];
+            }
+
+            // Nome del file senza estensione: thumbnails/<nome>.jpg e tiles/<nome>/
+            function fileStem(row) {
+                const img = rows[row][IMG];
+                const dot = img.lastIndexOf(".");
+                return dot > 0 ? img.slice(0, dot) : img;
+            }
+
+            // --storage sharded: screenshots/<ab>/<cd>/<file> (e thumbnails/ e tiles/ nelle stesse cartelle, anche con --storage archive), dai primi due byte dell'hash FNV-1a del nome (shard_prefix in storage.py)
+            function shardPrefix(name) {
+                let value = 0x811c9dc5;
+                for (const byte of new TextEncoder().encode(name)) value = Math.imul(value ^ byte, 0x01000193) >>> 0;
+                return (value >>> 24).toString(16).padStart(2, "0") + "/" + ((value >>> 16) & 0xff).toString(16).padStart(2, "0") + "/";
+            }
+
+            function screenshotSrc(row) {
+                return base + "screenshots/" + (data.sharded ? shardPrefix(rows[row][IMG]) : "") + encodeURIComponent(rows[row][IMG]);
+            }
+
+            function thumbnailSrc(row) {
+                return rows[row][THUMB] ? base + "thumbnails/" + (data.sharded || data.archived ? shardPrefix(rows[row][IMG]) : "") + encodeURIComponent(fileStem(row) + ".jpg") : screenshotSrc(row);
+            }
+
+            function clusterSize(cluster) {
+                return data.clusterSizes[cluster] || 1;
+            }
+
+            // Righe di un cluster: precalcolate in clusterRows, un cluster assente ha solo la riga stessa
+            function clusterMembers(cluster, row) {
+                return (data.clusterRows && data.clusterRows[cluster]) || [row];
+            }
+
+            function setExcluded(members, value) {
+                for (const row of members) {
+                    if (value) excluded[row >>> 5] |= 1 << (row & 31);
+                    else excluded[row >>> 5] &= ~(1 << (row & 31));
+                }
+            }
+
+            // Galleria: righe col bit di esclusione a 0 (parole a 0 = 32 righe visibili in blocco)
+            function rebuildGallery() {
+                galleryList = [];
+                galleryPosition.fill(-1);
+                for (let word = 0; word < excluded.length; word++) {
+                    const bits = excluded[word];
+                    const end = Math.min(rows.length, (word + 1) << 5);
+                    for (let row = word << 5; row < end; row++) {
+                        if (bits === 0 || !(bits & (1 << (row & 31)))) {
+                            galleryPosition[row] = galleryList.length;
+                            galleryList.push(row);
+                        }
+                    }
+                }
+                renderGallery(true);
+            }
+
+            function renderGallery(force) {
+                galleryColumns = Math.max(1, Math.floor((gallery.clientWidth + GALLERY_GAP) / (GALLERY_MIN_WIDTH + GALLERY_GAP)));
+                const totalRows = Math.ceil(galleryList.length / galleryColumns);
+                gallery.style.height = `${Math.max(0, totalRows * GALLERY_ROW_HEIGHT - GALLERY_GAP)}px`;
+                const scrollTop = galleryContainer.scrollTop - gallery.offsetTop;
+                const first = Math.max(0, Math.floor(scrollTop / GALLERY_ROW_HEIGHT) - OVERSCAN);
+                const last = Math.min(totalRows, Math.ceil((scrollTop + galleryContainer.clientHeight) / GALLERY_ROW_HEIGHT) + OVERSCAN);
+                const range = `${first}:${last}:${galleryColumns}`;
+                if (!force && range === galleryRange) return;
+                galleryRange = range;
+                galleryWindow.style.transform = `translateY(${first * GALLERY_ROW_HEIGHT}px)`;
+                galleryWindow.style.gridTemplateColumns = `repeat(${galleryColumns}, minmax(0, 1fr))`;
+                const parts = [];
+                for (let i = first * galleryColumns; i < Math.min(galleryList.length, last * galleryColumns); i++) {
+                    parts.push(galleryItemHtml(galleryList[i]));
+                }
+                galleryWindow.innerHTML = parts.join("");
+            }
+
+            function galleryItemHtml(row) {
+                const entry = rows[row];
+                const domain = escapeHtml(domainOf(row));
+                const aliases = entry[ALIASES];
+                const cluster = entry[CLUSTER];
+                const size = clusterSize(cluster);
+                return `<div class="gallery-item" data-row="${row}">
+                        <img src="${thumbnailSrc(row)}" alt="${domain}" data-cluster="${cluster}" loading="lazy">
+                        <div class="caption">
+                            <div class="domain-name">${domain}</div>
+                            ${entry[TITLE] ? `<div class="domain-title">${escapeHtml(entry[TITLE])}</div>` : ""}
+                            <a href="${escapeHtml(entry[URL])}" class="domain-url" target="_blank">${domain}</a>
+                            ${aliases.length ? `<div class="domain-aliases" title="${escapeHtml(aliases.join(", "))}">+${aliases.length} aliases</div>` : ""}
+                            ${entry[RESCAN] === "changed" || entry[RESCAN] === "new" ? `<span class="rescan-badge ${entry[RESCAN]}">${entry[RESCAN]}</span>` : ""}
+                            ${size > 1 ? `<span class="cluster-badge" title="Near-duplicate cluster ${cluster}">#${cluster} &times;${size}</span>` : ""}
+                            ${entry[CATEGORY] ? `<span class="category-badge" title="Known boilerplate page">${escapeHtml(entry[CATEGORY])}</span>` : ""}
+                        </div>
+                    </div>`;
+            }
+
+            // Indice di ricerca (report_search.js): token ordinati per campo e righe in delta
+            function tokenize(text) {
+                return text.toLowerCase().match(/[\\p{L}\\p{N}_]+/gu) || [];
+            }
+
+            // Visita le righe di un token; solo le liste lunghe restano in cache decodificate
+            function forEachRow(field, position, visit) {
+                const encoded = searchIndex.index[field].rows[position];
+                if (encoded.length < 64) {
+                    let row = 0;
+                    for (const delta of encoded.split(",")) {
+                        row += Number(delta);
+                        visit(row);
+                    }
+                    return;
+                }
+                const key = field + ":" + position;
+                let list = searchPostings.get(key);
+                if (!list) {
+                    list = [];
+                    let row = 0;
+                    for (const delta of encoded.split(",")) {
+                        row += Number(delta);
+                        list.push(row);
+                    }
+                    searchPostings.set(key, list);
+                }
+                list.forEach(visit);
+            }
+
+            // Token che contengono la parola cercata, o che iniziano con essa (status:4 = 4xx, parole dopo un separatore)
+            function matchingTokens(field, word, prefix) {
+                const tokens = searchIndex.index[field].tokens;
+                const positions = [];
+                if (prefix || field === "status") {
+                    let low = 0, high = tokens.length;
+                    while (low < high) {
+                        const mid = (low + high) >> 1;
+                        if (tokens[mid] < word) low = mid + 1; else high = mid;
+                    }
+                    for (let i = low; i < tokens.length && tokens[i].startsWith(word); i++) positions.push(i);
+                } else {
+                    for (let i = 0; i < tokens.length; i++) {
+                        if (tokens[i].includes(word)) positions.push(i);
+                    }
+                }
+                return positions;
+            }
+
+            function matchWord(fields, word, prefix, visit) {
+                for (const field of fields) {
+                    for (const position of matchingTokens(field, word, prefix)) forEachRow(field, position, visit);
+                }
+            }
+
+            // Stima delle righe di una parola: la lunghezza delle liste codificate
+            function wordCost(fields, word, prefix) {
+                let cost = 0;
+                for (const field of fields) {
+                    for (const position of matchingTokens(field, word, prefix)) cost += searchIndex.index[field].rows[position].length;
+                }
+                return cost;
+            }
+
+            // Testo in minuscolo di un campo, calcolato alla prima verifica di una frase
+            function fieldText(row, field) {
+                const texts = phraseTexts[field] || (phraseTexts[field] = new Array(rows.length));
+                if (texts[row] === undefined) {
+                    const entry = rows[row];
+                    const text = field === "domain" ? domainOf(row) + " " + entry[ALIASES].join(" ") : field === "url" ? entry[URL] : entry[TITLE];
+                    texts[row] = text.toLowerCase();
+                }
+                return texts[row];
+            }
+
+            // Termini della query: "campo:valore" cerca solo in quel campo, le parole libere in tutti.
+            // Un testo con punteggiatura o spazi (site-12, example.com) va cercato così com'è in dominio, URL e titolo
+            function parseQuery(query) {
+                const terms = [];
+                const pattern = /(?:([a-z]+):)?(?:"([^"]*)"|(\\S+))/gi;
+                let match;
+                while ((match = pattern.exec(query)) !== null) {
+                    const qualifier = match[1] ? match[1].toLowerCase() : "";
+                    const known = searchIndex.fields.includes(qualifier);
+                    const value = match[2] !== undefined ? match[2] : match[3];
+                    const text = (known || !qualifier ? value : match[0]).toLowerCase();
+                    const fields = known ? [qualifier] : searchIndex.fields;
+                    const words = tokenize(text);
+                    const phraseFields = fields.filter(field => PHRASE_FIELDS.includes(field));
+                    if (words.length === 1 && words[0] === text) {
+                        terms.push({ fields: fields, words: words, phrase: null });
+                    } else if (words.length && phraseFields.length) {
+                        terms.push({ fields: phraseFields, words: words, phrase: text });
+                    } else {
+                        words.forEach(word => terms.push({ fields: fields, words: [word], phrase: null }));
+                    }
+                }
+                return terms;
+            }
+
+            // Righe che soddisfano tutti i termini: matched[row] conta i termini già soddisfatti
+            function searchRows(query) {
+                const terms = parseQuery(query);
+                const matched = new Uint16Array(rows.length);
+                const checked = new Uint16Array(rows.length);
+                terms.forEach(function(term, t) {
+                    if (term.phrase === null) {
+                        matchWord(term.fields, term.words[0], false, function(row) {
+                            if (matched[row] === t) matched[row] = t + 1;
+                        });
+                        return;
+                    }
+                    // La parola più selettiva restringe le righe, poi si controlla il testo completo.
+                    // Le parole dopo un separatore sono l'inizio di un token (ricerca binaria), la prima può esserne una parte qualsiasi
+                    let best = 0, bestCost = Infinity;
+                    const prefix = term.words.map((word, i) => i > 0 || !term.phrase.startsWith(word));
+                    term.words.forEach(function(word, i) {
+                        const cost = wordCost(term.fields, word, prefix[i]);
+                        if (cost < bestCost) { best = i; bestCost = cost; }
+                    });
+                    matchWord(term.fields, term.words[best], prefix[best], function(row) {
+                        // Una riga può comparire in più campi: il testo si controlla una volta sola
+                        if (matched[row] !== t || checked[row] === t + 1) return;
+                        checked[row] = t + 1;
+                        if (term.fields.some(field => fieldText(row, field).includes(term.phrase))) matched[row] = t + 1;
+                    });
+                });
+                const result = [];
+                for (let row = 0; row < rows.length; row++) {
+                    if (matched[row] === terms.length) result.push(row);
+                }
+                return result;
+            }
+
+            // Senza indice (non ancora caricato o mancante): sottostringa su dominio, URL e alias
+            function scanRows(searchLower) {
+                if (!searchTexts) {
+                    searchTexts = rows.map((entry, row) => (domainOf(row) + " " + entry[URL] + " " + entry[ALIASES].join(" ")).toLowerCase());
+                }
+                const result = [];
+                for (let row = 0; row < rows.length; row++) {
+                    if (searchTexts[row].includes(searchLower)) result.push(row);
+                }
+                return result;
+            }
+
+            // Sidebar: righe che corrispondono alla ricerca
+            function filterDomains(searchTerm) {
+                currentSearch = searchTerm;
+                const query = searchTerm.trim();
+                if (!query) {
+                    sidebarList = rows.map((entry, row) => row);
+                } else if (searchIndex) {
+                    sidebarList = searchRows(query);
+                } else {
+                    sidebarList = scanRows(query.toLowerCase());
+                }
+                sidebarPosition = new Map();
+                sidebarList.forEach((row, position) => sidebarPosition.set(row, position));
+                const countEl = document.getElementById("domain-count");
+                if (countEl) {
+                    countEl.textContent = `Showing ${sidebarList.length} of ${rows.length} domains`;
+                }
+                domainList.scrollTop = 0;
+                renderSidebar(true);
+            }
+
+            function useSearchIndex() {
+                if (!window.REPORT_SEARCH || searchIndex) return;
+                searchIndex = window.REPORT_SEARCH;
+                if (currentSearch.trim()) filterDomains(currentSearch);
+            }
+
+            function renderSidebar(force) {
+                domainSpacer.style.height = `${sidebarList.length * SIDEBAR_ROW_HEIGHT}px`;
+                const first = Math.max(0, Math.floor(domainList.scrollTop / SIDEBAR_ROW_HEIGHT) - OVERSCAN);
+                const last = Math.min(sidebarList.length, Math.ceil((domainList.scrollTop + domainList.clientHeight) / SIDEBAR_ROW_HEIGHT) + OVERSCAN);
+                const range = `${first}:${last}`;
+                if (!force && range === sidebarRange) return;
+                sidebarRange = range;
+                domainWindow.style.transform = `translateY(${first * SIDEBAR_ROW_HEIGHT}px)`;
+                const parts = [];
+                for (let i = first; i < last; i++) {
+                    const row = sidebarList[i];
+                    const entry = rows[row];
+                    const aliases = entry[ALIASES];
+                    parts.push(`<li class="domain-item${row === activeRow ? " active" : ""}" data-row="${row}">
+                        <div class="domain-name">${escapeHtml(domainOf(row))}</div>
+                        ${entry[TITLE] ? `<div class="domain-title">${escapeHtml(entry[TITLE])}</div>` : ""}
+                        <a href="${escapeHtml(entry[URL])}" class="domain-url" target="_blank">${escapeHtml(entry[URL])}</a>
+                        ${aliases.length ? `<div class="domain-aliases" title="${escapeHtml(aliases.join(", "))}">+${aliases.length} aliases: ${escapeHtml(aliases.join(", "))}</div>` : ""}
+                    </li>`);
+                }
+                domainWindow.innerHTML = parts.join("");
+            }
+
+            function scrollToDomain(row) {
+                const position = sidebarPosition.get(row);
+                if (position === undefined) return;
+                const top = position * SIDEBAR_ROW_HEIGHT - domainList.clientHeight / 2 + SIDEBAR_ROW_HEIGHT / 2;
+                domainList.scrollTo({ top: Math.max(0, top), behavior: "smooth" });
+            }
+
+            function scrollToGalleryItem(position) {
+                const top = gallery.offsetTop + Math.floor(position / galleryColumns) * GALLERY_ROW_HEIGHT - galleryContainer.clientHeight / 2 + GALLERY_ROW_HEIGHT / 2;
+                galleryContainer.scrollTo({ top: Math.max(0, top), behavior: "smooth" });
+            }
+
+            function openModal(position) {
+                if (position === undefined || position < 0 || position >= galleryList.length) return;
+                currentIndex = position;
+                // Prima visibile: il visualizzatore a tile misura il suo riquadro
+                modal.classList.add("active");
+                showModalImage(currentIndex);
+            }
+
+            function closeModal() {
+                modal.classList.remove("active");
+                clearTiles();
+                tileRow = -1;
+                currentIndex = -1;
+                activeRow = -1;
+                renderSidebar(true);
+            }
+
+            function navigate(direction) {
+                if (currentIndex === -1 || galleryList.length === 0) return;
+                currentIndex = (currentIndex + direction + galleryList.length) % galleryList.length;
+                showModalImage(currentIndex);
+            }
+
+            function showModalImage(index) {
+                if (index < 0 || index >= galleryList.length) return;
+                const row = galleryList[index];
+                const entry = rows[row];
+                // Solo il modal carica lo screenshot originale, o le sue tile se è molto grande
+                if (entry[TILES]) {
+                    modalImage.removeAttribute("src");
+                    modalImage.style.display = "none";
+                    modalTiles.style.display = "block";
+                    zoomControls.style.display = "";
+                    showTiles(row);
+                } else {
+                    clearTiles();
+                    tileRow = -1;
+                    modalTiles.style.display = "none";
+                    zoomControls.style.display = "none";
+                    modalImage.style.display = "";
+                    // Gli screenshot in screenshots.sqlite (--storage archive) arrivano solo da --serve: aperto da disco, la miniatura
+                    modalImage.src = data.archived && location.protocol === "file:" ? thumbnailSrc(row) : screenshotSrc(row);
+                }
+                modalDomainName.textContent = domainOf(row);
+                modalDomainTitle.textContent = entry[TITLE];
+                modalDomainTitle.style.display = entry[TITLE] ? "" : "none";
+                modalDomainUrl.href = entry[URL];
+                modalDomainUrl.textContent = entry[URL];
+                activeRow = row;
+                renderSidebar(true);
+                scrollToDomain(row);
+                if (showSimilar) renderSimilar(row);
+            }
+
+            // Livelli della piramide (tile_levels in generate_report.py): il livello 0 è a piena risoluzione, ognuno dimezza il precedente
+            function tileLevels(width, height, tileSize) {
+                let levels = 1;
+                while (Math.max(width, height) > tileSize * 2 ** (levels - 1)) levels++;
+                return levels;
+            }
+
+            function clearTiles() {
+                tileCanvas.textContent = "";
+                tileImages.clear();
+            }
+
+            function showTiles(row) {
+                const [width, height] = rows[row][TILES];
+                tileRow = row;
+                clearTiles();
+                // All'apertura la pagina occupa la larghezza del riquadro e si scorre in verticale
+                tileFitScale = Math.min(1, modalTiles.clientWidth / width);
+                tileScale = tileFitScale;
+                modalTiles.scrollTop = 0;
+                modalTiles.scrollLeft = 0;
+                setTileScale(tileFitScale, 0, 0);
+            }
+
+            // Cambia lo zoom tenendo fermo il punto (x, y) del riquadro
+            function setTileScale(scale, x, y) {
+                const [width, height] = rows[tileRow][TILES];
+                scale = Math.min(MAX_ZOOM, Math.max(Math.min(tileFitScale, modalTiles.clientHeight / height), scale));
+                const ratio = scale / tileScale;
+                const left = (modalTiles.scrollLeft + x) * ratio - x;
+                const top = (modalTiles.scrollTop + y) * ratio - y;
+                if (scale !== tileScale) clearTiles();
+                tileScale = scale;
+                tileCanvas.style.width = `${Math.ceil(width * scale)}px`;
+                tileCanvas.style.height = `${Math.ceil(height * scale)}px`;
+                modalTiles.scrollLeft = left;
+                modalTiles.scrollTop = top;
+                renderTiles();
+            }
+
+            function zoomTiles(factor, x, y) {
+                if (tileRow < 0) return;
+                if (x === undefined) {
+                    x = modalTiles.clientWidth / 2;
+                    y = modalTiles.clientHeight / 2;
+                }
+                setTileScale(tileScale * factor, x, y);
+            }
+
+            // Solo le tile visibili (più una fila sopra e sotto) stanno nel DOM, dal livello più piccolo che non perde dettaglio
+            function renderTiles() {
+                if (tileRow < 0) return;
+                const [width, height, tileSize] = rows[tileRow][TILES];
+                const levels = tileLevels(width, height, tileSize);
+                const density = tileScale * (window.devicePixelRatio || 1);
+                let level = 0;
+                while (level + 1 < levels && density * 2 ** (level + 1) <= 1) level++;
+                const factor = 2 ** level;
+                const levelWidth = Math.ceil(width / factor);
+                const levelHeight = Math.ceil(height / factor);
+                const span = tileSize * factor * tileScale;
+                const firstColumn = Math.max(0, Math.floor(modalTiles.scrollLeft / span));
+                const lastColumn = Math.min(Math.ceil(levelWidth / tileSize) - 1, Math.floor((modalTiles.scrollLeft + modalTiles.clientWidth) / span));
+                const firstRow = Math.max(0, Math.floor(modalTiles.scrollTop / span) - 1);
+                const lastRow = Math.min(Math.ceil(levelHeight / tileSize) - 1, Math.floor((modalTiles.scrollTop + modalTiles.clientHeight) / span) + 1);
+                const folder = base + "tiles/" + (data.sharded || data.archived ? shardPrefix(rows[tileRow][IMG]) : "") + encodeURIComponent(fileStem(tileRow)) + "/" + level + "/";
+                const visible = new Set();
+                for (let tileY = firstRow; tileY <= lastRow; tileY++) {
+                    for (let tileX = firstColumn; tileX <= lastColumn; tileX++) {
+                        const key = `${level}/${tileX}_${tileY}`;
+                        visible.add(key);
+                        if (tileImages.has(key)) continue;
+                        const tile = document.createElement("img");
+                        tile.className = "tile";
+                        tile.alt = "";
+                        tile.style.left = `${Math.floor(tileX * span)}px`;
+                        tile.style.top = `${Math.floor(tileY * span)}px`;
+                        tile.style.width = `${Math.ceil(Math.min(tileSize, levelWidth - tileX * tileSize) * factor * tileScale)}px`;
+                        tile.style.height = `${Math.ceil(Math.min(tileSize, levelHeight - tileY * tileSize) * factor * tileScale)}px`;
+                        tile.src = folder + `${tileX}_${tileY}.jpg`;
+                        tileCanvas.appendChild(tile);
+                        tileImages.set(key, tile);
+                    }
+                }
+                for (const [key, tile] of tileImages) {
+                    if (!visible.has(key)) {
+                        tile.remove();
+                        tileImages.delete(key);
+                    }
+                }
+            }
+
+            // Hash di tutte le righe (data.similarity): 8 byte per riga, divisi in due Uint32 al primo uso
+            function loadSimilarity() {
+                if (!similarHi) {
+                    const bytes = atob(data.similarity.hashes);
+                    similarHi = new Uint32Array(rows.length);
+                    similarLo = new Uint32Array(rows.length);
+                    for (let row = 0; row < rows.length; row++) {
+                        const offset = row * 8;
+                        similarHi[row] = ((bytes.charCodeAt(offset) << 24) | (bytes.charCodeAt(offset + 1) << 16) | (bytes.charCodeAt(offset + 2) << 8) | bytes.charCodeAt(offset + 3)) >>> 0;
+                        similarLo[row] = ((bytes.charCodeAt(offset + 4) << 24) | (bytes.charCodeAt(offset + 5) << 16) | (bytes.charCodeAt(offset + 6) << 8) | bytes.charCodeAt(offset + 7)) >>> 0;
+                    }
+                }
+            }
+
+            function popcount(x) {
+                x -= (x >>> 1) & 0x55555555;
+                x = (x & 0x33333333) + ((x >>> 2) & 0x33333333);
+                return (((x + (x >>> 4)) & 0x0f0f0f0f) * 0x01010101) >>> 24;
+            }
+
+            // Le count righe più vicine (distanza di Hamming), escluse quelle filtrate: un solo passaggio con un secchio per distanza
+            function similarRows(target, count) {
+                loadSimilarity();
+                const hi = similarHi[target], lo = similarLo[target];
+                const buckets = Array.from({ length: 65 }, () => []);
+                let found = 0, limit = 64;
+                for (let row = 0; row < rows.length; row++) {
+                    if (row === target || (excluded[row >>> 5] & (1 << (row & 31)))) continue;
+                    const distance = popcount(similarHi[row] ^ hi) + popcount(similarLo[row] ^ lo);
+                    if (distance > limit) continue;
+                    buckets[distance].push(row);
+                    found++;
+                    // Appena i secchi più vicini bastano, quelli oltre non servono più
+                    while (limit > 0 && found - buckets[limit].length >= count) {
+                        found -= buckets[limit].length;
+                        buckets[limit] = [];
+                        limit--;
+                    }
+                }
+                const result = [];
+                for (let distance = 0; distance <= limit && result.length < count; distance++) {
+                    for (const row of buckets[distance]) {
+                        if (result.length === count) break;
+                        result.push([row, distance]);
+                    }
+                }
+                return result;
+            }
+
+            function renderSimilar(row) {
+                const similar = similarRows(row, SIMILAR_COUNT);
+                similarStrip.innerHTML = similar.length ? similar.map(([other, distance]) => {
+                    const domain = escapeHtml(domainOf(other));
+                    return `<div class="similar-item" data-row="${other}" title="${domain} (${distance} bits apart)">
+                        <img src="${thumbnailSrc(other)}" alt="${domain}" loading="lazy">
+                        <span class="similar-distance">${distance}</span>
+                    </div>`;
+                }).join("") : `<div class="similar-empty">No other screenshots</div>`;
+            }
+
+            function toggleSimilar() {
+                showSimilar = !showSimilar;
+                similarButton.classList[showSimilar ? "add" : "remove"]("active");
+                modalContent.classList[showSimilar ? "add" : "remove"]("with-similar");
+                if (showSimilar && currentIndex >= 0) renderSimilar(galleryList[currentIndex]);
+                // La striscia cambia l'altezza del riquadro delle tile
+                renderTiles();
+            }
+
+            // Context menu per escludere immagini simili o un'intera categoria
+            function createContextMenu() {
+                if (!contextMenu) {
+                    contextMenu = document.createElement("div");
+                    contextMenu.className = "context-menu";
+                    contextMenu.id = "context-menu";
+                    const button = document.createElement("button");
+                    button.textContent = "Exclude all similar images";
+                    button.onclick = excludeImages;
+                    contextMenu.appendChild(button);
+                    const categoryButton = document.createElement("button");
+                    categoryButton.id = "exclude-category";
+                    categoryButton.onclick = excludeCategory;
+                    contextMenu.appendChild(categoryButton);
+                    document.body.appendChild(contextMenu);
+                }
+                const category = selectedRow >= 0 ? rows[selectedRow][CATEGORY] : "";
+                const categoryButton = document.getElementById("exclude-category");
+                categoryButton.textContent = `Exclude all "${category}" pages`;
+                categoryButton.style.display = category ? "" : "none";
+                return contextMenu;
+            }
+
+            // Esclude l'intero cluster di quasi-duplicati
+            function excludeImages() {
+                const cluster = Number(selectedCluster);
+                if (!filters.has(cluster) && selectedRow >= 0) {
+                    const members = clusterMembers(cluster, selectedRow);
+                    filters.set(cluster, members);
+                    setExcluded(members, true);
+                    addFilterInfo(cluster, thumbnailSrc(members[0]), `Cluster ${cluster}: ${members.length} images`);
+                    rebuildGallery();
+                }
+                if (contextMenu) {
+                    contextMenu.style.display = "none";
+                }
+            }
+
+            // Esclude tutte le pagine della categoria (precalcolate in categoryRows)
+            function excludeCategory() {
+                const category = selectedRow >= 0 ? rows[selectedRow][CATEGORY] : "";
+                const key = "category:" + category;
+                if (category && !filters.has(key)) {
+                    const members = (data.categoryRows && data.categoryRows[category]) || [selectedRow];
+                    filters.set(key, members);
+                    setExcluded(members, true);
+                    addFilterInfo(key, thumbnailSrc(members[0]), `${category}: ${members.length} pages`);
+                    rebuildGallery();
+                }
+                if (contextMenu) {
+                    contextMenu.style.display = "none";
+                }
+            }
+
+            function addFilterInfo(key, src, label) {
+                let filterInfo = document.getElementById("filter-info");
+                if (!filterInfo) {
+                    filterInfo = document.createElement("div");
+                    filterInfo.id = "filter-info";
+                    filterInfo.className = "filter-info";
+                    document.querySelector(".header").appendChild(filterInfo);
+                }
+                const filterItem = document.createElement("div");
+                filterItem.className = "filter-item";
+                filterItem.dataset.filter = key;
+                filterItem.title = label;
+                filterItem.innerHTML = `
+                    <img src="${src}" alt="Filter">
+                    <button onclick="removeFilter('${escapeHtml(key)}')">X</button>
+                `;
+                filterInfo.appendChild(filterItem);
+            }
+
+            function removeFilter(key) {
+                key = String(key).startsWith("category:") ? String(key) : Number(key);
+                if (!filters.has(key)) return;
+                setExcluded(filters.get(key), false);
+                filters.delete(key);
+                // Una categoria e un cluster possono avere righe in comune: restano escluse quelle degli altri filtri
+                filters.forEach(members => setExcluded(members, true));
+                document.querySelectorAll(`.filter-item[data-filter='${key}']`).forEach(item => item.remove());
+                const filterInfo = document.getElementById("filter-info");
+                if (filterInfo && filterInfo.children.length === 0) {
+                    filterInfo.remove();
+                }
+                rebuildGallery();
+            }
+
+            document.addEventListener("click", function(event) {
+                if (contextMenu && !event.target.closest(".context-menu")) {
+                    contextMenu.style.display = "none";
+                }
+            });
+
+            // Tastiera
+            document.addEventListener("keydown", function(event) {
+                if (modal.classList.contains("active")) {
+                    if (event.key === "ArrowLeft") navigate(-1);
+                    if (event.key === "ArrowRight") navigate(1);
+                    if (event.key === "Escape") closeModal();
+                    if (event.key === "+" || event.key === "=") zoomTiles(ZOOM_STEP);
+                    if (event.key === "-") zoomTiles(1 / ZOOM_STEP);
+                }
+            });
+
+            // Click fuori dal modal per chiudere
+            modal.addEventListener("click", function(event) {
+                if (event.target === modal) {
+                    closeModal();
+                }
+            });
+
+            // Funzione globale per removeFilter (chiamata dal filter button)
+            window.removeFilter = removeFilter;
+
+            // Rendi le funzioni globali per gli onclick
+            window.navigate = navigate;
+            window.closeModal = closeModal;
+
+            // Ridisegna al massimo una volta per frame durante lo scroll
+            function onFrame(callback) {
+                let pending = false;
+                return function() {
+                    if (pending) return;
+                    pending = true;
+                    requestAnimationFrame(function() {
+                        pending = false;
+                        callback(false);
+                    });
+                };
+            }
+
+            function setup() {
+                rebuildGallery();
+                filterDomains("");
+                galleryContainer.addEventListener("scroll", onFrame(renderGallery), { passive: true });
+                domainList.addEventListener("scroll", onFrame(renderSidebar), { passive: true });
+                window.addEventListener("resize", onFrame(function() {
+                    renderGallery(true);
+                    renderSidebar(true);
+                    renderTiles();
+                }));
+
+                // Visualizzatore a tile: scroll, Ctrl + rotella per lo zoom sotto il puntatore, pulsanti
+                modalTiles.addEventListener("scroll", onFrame(renderTiles), { passive: true });
+                modalTiles.addEventListener("wheel", function(event) {
+                    if (!event.ctrlKey) return;
+                    event.preventDefault();
+                    const rect = modalTiles.getBoundingClientRect();
+                    zoomTiles(event.deltaY < 0 ? ZOOM_STEP : 1 / ZOOM_STEP, event.clientX - rect.left, event.clientY - rect.top);
+                }, { passive: false });
+                document.getElementById("zoom-in").addEventListener("click", function() { zoomTiles(ZOOM_STEP); });
+                document.getElementById("zoom-out").addEventListener("click", function() { zoomTiles(1 / ZOOM_STEP); });
+                document.getElementById("zoom-fit").addEventListener("click", function() { if (tileRow >= 0) setTileScale(tileFitScale, 0, 0); });
+
+                // L'indice di ricerca arriva con uno script async, magari già caricato
+                useSearchIndex();
+                document.getElementById("search-data").addEventListener("load", useSearchIndex);
+
+                // Barra di ricerca per i domini
+                const searchBox = document.getElementById("domain-search");
+                let searchTimer = null;
+                searchBox.addEventListener("input", function(e) {
+                    clearTimeout(searchTimer);
+                    searchTimer = setTimeout(function() { filterDomains(e.target.value); }, 100);
+                });
+
+                // Event delegation per la galleria
+                gallery.addEventListener("click", function(e) {
+                    const galleryItem = e.target.closest(".gallery-item");
+                    // Non aprire se si clicca sul link
+                    if (!galleryItem || e.target.closest("a")) return;
+                    openModal(galleryPosition[Number(galleryItem.dataset.row)]);
+                });
+
+                // Event delegation per la sidebar
+                domainList.addEventListener("click", function(e) {
+                    const domainItem = e.target.closest(".domain-item");
+                    // Non aprire se si clicca sul link URL
+                    if (!domainItem || e.target.closest("a")) return;
+                    const position = galleryPosition[Number(domainItem.dataset.row)];
+                    if (position >= 0) {
+                        openModal(position);
+                        scrollToGalleryItem(position);
+                    }
+                });
+
+                // Tasto destro per escludere immagini simili
+                gallery.addEventListener("contextmenu", function(event) {
+                    const target = event.target;
+                    const galleryItem = target.tagName === "IMG" && target.closest(".gallery-item");
+                    if (galleryItem) {
+                        event.preventDefault();
+                        selectedCluster = target.getAttribute("data-cluster");
+                        selectedRow = Number(galleryItem.dataset.row);
+                        if (selectedCluster) {
+                            const menu = createContextMenu();
+                            menu.style.top = `${event.clientY}px`;
+                            menu.style.left = `${event.clientX}px`;
+                            menu.style.display = "flex";
+                            menu.style.position = "fixed";
+                            menu.style.zIndex = "10000";
+                        }
+                    }
+                });
+
+                document.getElementById("arrow-left").addEventListener("click", function() { navigate(-1); });
+                document.getElementById("arrow-right").addEventListener("click", function() { navigate(1); });
+                document.getElementById("modal-close-btn").addEventListener("click", function() { closeModal(); });
+
+                // Screenshot simili a quello nel modal
+                if (data.similarity) {
+                    similarButton.addEventListener("click", toggleSimilar);
+                    similarStrip.addEventListener("click", function(e) {
+                        const item = e.target.closest(".similar-item");
+                        if (!item) return;
+                        currentIndex = galleryPosition[Number(item.dataset.row)];
+                        showModalImage(currentIndex);
+                    });
+                } else {
+                    similarButton.style.display = "none";
+                }
+            }
+
+            // Inizializza quando il DOM è pronto
+            if (document.readyState === "loading") {
+                document.addEventListener("DOMContentLoaded", setup);
+            } else {
+                setup();
+            }
+
+            })(); // Fine IIFE
+"""
+
+
+def render_report_page(title, count, data_src, nav_html="", search_src=""):
+    """The report page shell; the rows come from the data script at data_src, the search index from search_src"""
+    return f"""
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Screenshot Report - {os.path.basename(output_folder)}</title>
+        <title>Screenshot Report - {html.escape(title)}</title>
         <style>
             * {{
                 box-sizing: border-box;
@@ -122,6 +1387,14 @@ def generate_report(output_folder, columns=4):
                 font-size: 14px;
                 opacity: 0.9;
             }}
+            .header .nav {{
+                margin-top: 6px;
+                font-size: 14px;
+            }}
+            .header .nav a {{
+                color: white;
+                margin-right: 16px;
+            }}
             .main-container {{
                 display: flex;
                 flex: 1;
@@ -131,7 +1404,9 @@ def generate_report(output_folder, columns=4):
                 width: 300px;
                 background-color: #fff;
                 border-right: 1px solid #e0e0e0;
-                overflow-y: auto;
+                display: flex;
+                flex-direction: column;
+                overflow: hidden;
                 padding: 20px;
                 box-shadow: 2px 0 5px rgba(0,0,0,0.05);
             }}
@@ -160,12 +1435,26 @@ def generate_report(output_folder, columns=4):
                 margin-bottom: 10px;
             }}
             .domain-list {{
+                flex: 1;
+                overflow-y: auto;
+                overflow-x: hidden;
+            }}
+            .virtual-spacer {{
+                position: relative;
+            }}
+            .virtual-window {{
+                position: absolute;
+                top: 0;
+                left: 0;
+                right: 0;
                 list-style: none;
                 padding: 0;
                 margin: 0;
             }}
             .domain-item {{
-                padding: 12px;
+                height: 88px;
+                overflow: hidden;
+                padding: 10px 12px;
                 margin-bottom: 8px;
                 background-color: #f8f9fa;
                 border-radius: 8px;
@@ -205,10 +1494,59 @@ def generate_report(output_folder, columns=4):
                 white-space: nowrap;
             }}
             .domain-url {{
+                display: block;
                 font-size: 12px;
                 color: #666;
                 text-decoration: none;
-                word-break: break-all;
+                overflow: hidden;
+                text-overflow: ellipsis;
+                white-space: nowrap;
+            }}
+            .rescan-badge {{
+                display: inline-block;
+                font-size: 10px;
+                font-weight: 600;
+                text-transform: uppercase;
+                padding: 2px 6px;
+                border-radius: 4px;
+                margin-top: 4px;
+                color: white;
+            }}
+            .rescan-badge.changed {{
+                background-color: #e67e22;
+            }}
+            .rescan-badge.new {{
+                background-color: #27ae60;
+            }}
+            .cluster-badge {{
+                display: inline-block;
+                font-size: 10px;
+                font-weight: 600;
+                padding: 2px 6px;
+                border-radius: 4px;
+                margin-top: 4px;
+                margin-left: 4px;
+                color: #764ba2;
+                background-color: #f0ebf8;
+            }}
+            .category-badge {{
+                display: inline-block;
+                font-size: 10px;
+                font-weight: 600;
+                padding: 2px 6px;
+                border-radius: 4px;
+                margin-top: 4px;
+                margin-left: 4px;
+                color: #7f8c8d;
+                background-color: #ecf0f1;
+            }}
+            .domain-aliases {{
+                font-size: 11px;
+                color: #764ba2;
+                margin-top: 4px;
+                overflow: hidden;
+                text-overflow: ellipsis;
+                white-space: nowrap;
             }}
             .domain-url:hover {{
                 text-decoration: underline;
@@ -219,12 +1557,12 @@ def generate_report(output_folder, columns=4):
                 padding: 20px;
                 background-color: #f5f5f5;
             }}
-            .gallery {{
+            .gallery-window {{
                 display: grid;
-                grid-template-columns: repeat(auto-fill, minmax(200px, 1fr));
                 gap: 20px;
             }}
             .gallery-item {{
+                height: 300px;
                 background: white;
                 border-radius: 12px;
                 overflow: hidden;
@@ -238,15 +1576,15 @@ def generate_report(output_folder, columns=4):
             }}
             .gallery-item img {{
                 width: 100%;
-                height: auto;
+                height: 200px;
                 display: block;
-                max-height: 250px;
                 object-fit: contain;
                 background: #f8f9fa;
-                loading: lazy;
             }}
             .gallery-item .caption {{
-                padding: 12px;
+                height: 100px;
+                overflow: hidden;
+                padding: 10px 12px;
                 text-align: center;
             }}
             .gallery-item .caption .domain-name {{
@@ -254,6 +1592,9 @@ def generate_report(output_folder, columns=4):
                 color: #333;
                 font-size: 14px;
                 margin-bottom: 4px;
+                overflow: hidden;
+                text-overflow: ellipsis;
+                white-space: nowrap;
             }}
             .gallery-item .caption .domain-title {{
                 font-size: 11px;
@@ -306,30 +1647,110 @@ def generate_report(output_folder, columns=4):
                 object-fit: contain;
                 border-radius: 8px;
             }}
-            .modal-info {{
-                margin-top: 15px;
-                padding-top: 15px;
-                border-top: 1px solid #e0e0e0;
+            .modal-info {{
+                margin-top: 15px;
+                padding-top: 15px;
+                border-top: 1px solid #e0e0e0;
+            }}
+            .modal-info .domain-name {{
+                font-size: 18px;
+                font-weight: 600;
+                color: #333;
+                margin-bottom: 8px;
+            }}
+            .modal-info .domain-title {{
+                font-size: 14px;
+                color: #888;
+                font-style: italic;
+                margin: 4px 0 8px 0;
+            }}
+            .modal-info .domain-url {{
+                font-size: 14px;
+                color: #667eea;
+                text-decoration: none;
+            }}
+            .modal-info .domain-url:hover {{
+                text-decoration: underline;
+            }}
+            .similar-button {{
+                margin-top: 10px;
+                padding: 6px 14px;
+                border: 1px solid #667eea;
+                border-radius: 16px;
+                background: white;
+                color: #667eea;
+                font-size: 13px;
+                cursor: pointer;
+            }}
+            .similar-button:hover, .similar-button.active {{
+                background: #667eea;
+                color: white;
+            }}
+            .similar-strip {{
+                display: none;
+                gap: 8px;
+                margin-top: 12px;
+                max-width: 80vw;
+                overflow-x: auto;
+            }}
+            .modal-content.with-similar .similar-strip {{
+                display: flex;
+            }}
+            .modal-content.with-similar #modal-image {{
+                max-height: calc(90vh - 230px);
+            }}
+            .modal-tiles {{
+                display: none;
+                position: relative;
+                width: calc(90vw - 40px);
+                height: calc(90vh - 120px);
+                overflow: auto;
+                background: #f5f5f5;
+                border-radius: 8px;
+            }}
+            .modal-content.with-similar .modal-tiles {{
+                height: calc(90vh - 230px);
             }}
-            .modal-info .domain-name {{
-                font-size: 18px;
-                font-weight: 600;
-                color: #333;
-                margin-bottom: 8px;
+            .tile-canvas {{
+                position: relative;
+                margin: 0 auto;
             }}
-            .modal-info .domain-title {{
-                font-size: 14px;
-                color: #888;
-                font-style: italic;
-                margin: 4px 0 8px 0;
+            .modal-content .tile-canvas img.tile {{
+                position: absolute;
+                max-width: none;
+                max-height: none;
+                border-radius: 0;
             }}
-            .modal-info .domain-url {{
-                font-size: 14px;
-                color: #667eea;
-                text-decoration: none;
+            .similar-item {{
+                position: relative;
+                flex: 0 0 auto;
+                cursor: pointer;
             }}
-            .modal-info .domain-url:hover {{
-                text-decoration: underline;
+            .modal-content .similar-item img {{
+                width: 96px;
+                height: 72px;
+                max-height: none;
+                object-fit: cover;
+                object-position: top;
+                border-radius: 4px;
+                border: 2px solid transparent;
+            }}
+            .modal-content .similar-item:hover img {{
+                border-color: #667eea;
+            }}
+            .similar-distance {{
+                position: absolute;
+                right: 4px;
+                bottom: 6px;
+                padding: 0 5px;
+                border-radius: 8px;
+                background: rgba(0,0,0,0.7);
+                color: white;
+                font-size: 11px;
+            }}
+            .similar-empty {{
+                color: #888;
+                font-size: 13px;
             }}
             .modal-close {{
                 position: absolute;
@@ -458,471 +1879,563 @@ def generate_report(output_folder, columns=4):
     </head>
     <body>
         <div class="header">
-            <h1>📸 Screenshot Report - {html.escape(os.path.basename(output_folder))}</h1>
-            <div class="stats">Total: {len(ordered_images)} screenshots</div>
+            <h1>📸 Screenshot Report - {html.escape(title)}</h1>
+            <div class="stats">Total: {count} screenshots</div>
+            {nav_html}
         </div>
         <div class="main-container">
             <div class="sidebar">
-                <h2>🌐 Domains ({len(sidebar_domains)})</h2>
-                <input type="text" class="search-box" id="domain-search" placeholder="🔍 Search domains...">
-                <div class="domain-count" id="domain-count">Showing {len(sidebar_domains)} domains</div>
-                <ul class="domain-list" id="domain-list">
-    """
-
-    for idx, domain_info in enumerate(sidebar_domains):
-        domain = domain_info['domain']
-        domain_url = domain_info['url']
-        img = domain_info['img']
-        img_path = f"screenshots/{img}"
-        page_title = domain_info.get('title', '')
-        truncated_domain = domain if len(domain) <= 25 else domain[:25] + "..."
-        truncated_title = page_title if len(page_title) <= 30 else page_title[:30] + "..." if page_title else ""
-        
-        html_content += f"""
-                    <li class="domain-item" data-img="{html.escape(img_path)}" data-index="{idx}">
-                        <div class="domain-name">{html.escape(truncated_domain)}</div>
-                        {f'<div class="domain-title">{html.escape(truncated_title)}</div>' if truncated_title else ''}
-                        <a href="{html.escape(domain_url)}" class="domain-url" target="_blank" onclick="event.stopPropagation()">{html.escape(domain_url)}</a>
-                    </li>
-        """
-
-    html_content += """
-                </ul>
-            </div>
-            <div class="gallery-container">
-                <div class="gallery" id="gallery">
-    """
-
-    for img in ordered_images:
-        if img not in image_hashes:
-            continue
-        img_hash = image_hashes[img]
-        domain = os.path.splitext(img)[0]
-        truncated_domain = domain if len(domain) <= 20 else domain[:20] + "..."
-        
-        domain_url = domain_urls.get(domain, f"https://{domain}")
-        if not domain_url.startswith(("http://", "https://")):
-            domain_url = f"https://{domain_url}"
-        
-        page_title = domain_titles.get(domain, "")
-        truncated_title = page_title if len(page_title) <= 25 else page_title[:25] + "..." if page_title else ""
-        
-        domain_url_escaped = html.escape(domain_url)
-        
-        img_path = f"screenshots/{html.escape(img)}"
-        html_content += f"""
-                    <div class="gallery-item" data-img="{img_path}" data-domain="{html.escape(domain)}">
-                        <img src="{img_path}" alt="{html.escape(domain)}" data-hash="{img_hash}" loading="lazy">
-                        <div class="caption">
-                            <div class="domain-name">{html.escape(truncated_domain)}</div>
-                            {f'<div class="domain-title">{html.escape(truncated_title)}</div>' if truncated_title else ''}
-                            <a href="{domain_url_escaped}" class="domain-url" target="_blank">{html.escape(truncated_domain)}</a>
-                        </div>
+                <h2>🌐 Domains ({count})</h2>
+                <input type="text" class="search-box" id="domain-search" placeholder="🔍 Search (e.g. login, status:403, title:admin)...">
+                <div class="domain-count" id="domain-count">Showing {count} domains</div>
+                <div class="domain-list" id="domain-list">
+                    <div class="virtual-spacer" id="domain-spacer">
+                        <ul class="virtual-window" id="domain-window"></ul>
                     </div>
-        """
-
-    html_content += """
+                </div>
+            </div>
+            <div class="gallery-container" id="gallery-container">
+                <div class="gallery virtual-spacer" id="gallery">
+                    <div class="gallery-window virtual-window" id="gallery-window"></div>
                 </div>
             </div>
         </div>
         <div class="modal" id="modal">
             <span class="arrow left" id="arrow-left">‹</span>
-            <div class="modal-content">
+            <div class="modal-content" id="modal-content">
                 <button class="modal-close" id="modal-close-btn">×</button>
                 <img id="modal-image" src="" alt="Image">
+                <div class="modal-tiles" id="modal-tiles">
+                    <div class="tile-canvas" id="tile-canvas"></div>
+                </div>
                 <div class="modal-info">
                     <div class="domain-name" id="modal-domain-name"></div>
                     <div class="domain-title" id="modal-domain-title"></div>
                     <a href="#" class="domain-url" id="modal-domain-url" target="_blank"></a>
+                    <div>
+                        <span class="zoom-controls" id="zoom-controls">
+                            <button class="similar-button" id="zoom-out" title="Zoom out (-)">&minus;</button>
+                            <button class="similar-button" id="zoom-fit" title="Fit the width">Fit</button>
+                            <button class="similar-button" id="zoom-in" title="Zoom in (+, Ctrl + wheel)">+</button>
+                        </span>
+                        <button class="similar-button" id="similar-button" title="Screenshots with the closest perceptual hashes">Show similar</button>
+                    </div>
+                    <div class="similar-strip" id="similar-strip"></div>
                 </div>
             </div>
             <span class="arrow right" id="arrow-right">›</span>
         </div>
+        <script src="{html.escape(data_src)}"></script>
+        <script src="{html.escape(search_src)}" id="search-data" async></script>
         <script>
-            (function() {
-            let modal = document.getElementById("modal");
-            let modalImage = document.getElementById("modal-image");
-            let modalDomainName = document.getElementById("modal-domain-name");
-            let modalDomainTitle = document.getElementById("modal-domain-title");
-            let modalDomainUrl = document.getElementById("modal-domain-url");
-            let currentIndex = -1;
-            let allImages = [];
-            let domainItems = [];
-            let contextMenu = null;
-            let selectedHash = "";
-            let filters = new Set();
-            
-            function init() {
-                allImages = Array.from(document.querySelectorAll(".gallery-item img"));
-                domainItems = Array.from(document.querySelectorAll(".domain-item"));
-                console.log("Initialized:", allImages.length, "images,", domainItems.length, "domain items");
-            }
-
-            function getVisibleImages() {
-                return allImages.filter(img => {
-                    let item = img.closest(".gallery-item");
-                    return item && !item.classList.contains("hidden");
-                });
-            }
+    """ + REPORT_SCRIPT + """
+        </script>
+    </body>
+    </html>
+    """
 
-            function openModal(imgElement) {
-                if (!imgElement) return;
-                const visibleImages = getVisibleImages();
-                currentIndex = visibleImages.findIndex(img => img === imgElement);
-                if (currentIndex === -1 && visibleImages.length > 0) {
-                    // Se non trovato, prova a trovare per src
-                    const imgSrc = imgElement.src || imgElement.getAttribute("src");
-                    currentIndex = visibleImages.findIndex(img => {
-                        const item = img.closest(".gallery-item");
-                        return item && item.getAttribute("data-img") && imgSrc.includes(item.getAttribute("data-img"));
-                    });
-                }
-                if (currentIndex === -1 && visibleImages.length > 0) {
-                    currentIndex = 0;
-                }
-                if (currentIndex >= 0) {
-                    showModalImage(currentIndex);
-                    modal.classList.add("active");
-                    updateActiveDomain();
-                }
-            }
 
-            function closeModal() {
-                modal.classList.remove("active");
-                currentIndex = -1;
-                updateActiveDomain();
-            }
+SHARDS_FOLDER = "shards"
+SHARD_MANIFEST_FILE = "manifest.json"
+SHARD_GROUPINGS = ["order", "cluster", "status", "suffix", "template"]
 
-            function navigate(direction) {
-                const visibleImages = getVisibleImages();
-                if (currentIndex === -1 || visibleImages.length === 0) return;
-                currentIndex = (currentIndex + direction + visibleImages.length) % visibleImages.length;
-                showModalImage(currentIndex);
-                updateActiveDomain();
-            }
 
-            function showModalImage(index) {
-                const visibleImages = getVisibleImages();
-                if (index < 0 || index >= visibleImages.length) return;
-                const img = visibleImages[index];
-                const galleryItem = img.closest(".gallery-item");
-                const domain = galleryItem.getAttribute("data-domain");
-                const imgSrc = galleryItem.getAttribute("data-img");
-                
-                modalImage.src = imgSrc;
-                modalDomainName.textContent = domain;
-                
-                // Trova il titolo dalla caption
-                const titleElement = galleryItem.querySelector(".domain-title");
-                if (titleElement) {
-                    modalDomainTitle.textContent = titleElement.textContent;
-                    modalDomainTitle.style.display = "";
-                } else {
-                    modalDomainTitle.textContent = "";
-                    modalDomainTitle.style.display = "none";
-                }
-                
-                // Trova l'URL dal link nella caption
-                const urlLink = galleryItem.querySelector(".domain-url");
-                if (urlLink) {
-                    modalDomainUrl.href = urlLink.getAttribute("href");
-                    modalDomainUrl.textContent = urlLink.getAttribute("href");
-                }
-                
-                // Scroll nella sidebar
-                scrollToDomain(domain);
-            }
+def domain_suffix(url):
+    """Last two labels of the host name ("ip" for IP addresses), used to group subdomains of one site"""
+    host = urlparse(url).hostname or ""
+    if not host:
+        return "unknown"
+    if ":" in host or host.replace(".", "").isdigit():
+        return "ip"
+    return ".".join(host.split(".")[-2:])
 
-            function updateActiveDomain() {
-                if (currentIndex === -1) {
-                    domainItems.forEach(item => item.classList.remove("active"));
-                    return;
-                }
-                const visibleImages = getVisibleImages();
-                if (currentIndex >= 0 && currentIndex < visibleImages.length) {
-                    const img = visibleImages[currentIndex];
-                    const galleryItem = img.closest(".gallery-item");
-                    const imgSrc = galleryItem.getAttribute("data-img");
-                    
-                    domainItems.forEach(item => {
-                        if (item.getAttribute("data-img") === imgSrc) {
-                            item.classList.add("active");
-                        } else {
-                            item.classList.remove("active");
-                        }
-                    });
-                }
-            }
 
-            function scrollToDomain(domain) {
-                domainItems.forEach(item => {
-                    const dataImg = item.getAttribute("data-img");
-                    const domainName = item.querySelector(".domain-name");
-                    if ((dataImg && dataImg.startsWith(domain.replace(/[^a-zA-Z0-9._-]/g, "_"))) ||
-                        (domainName && domainName.textContent.includes(domain))) {
-                        item.scrollIntoView({ behavior: "smooth", block: "center" });
-                    }
-                });
-            }
+def shard_group(row, shard_by, cluster_sizes, status_codes, templates=None):
+    if shard_by == "cluster":
+        cluster_id = row[REPORT_FIELDS.index("cluster")]
+        return f"cluster-{cluster_id}" if cluster_sizes.get(cluster_id, 1) > 1 else "unique"
+    if shard_by == "status":
+        domain = row[REPORT_FIELDS.index("domain")]
+        return f"status-{status_codes.get(domain) or 'unknown'}"
+    if shard_by == "suffix":
+        return domain_suffix(row[REPORT_FIELDS.index("url")])
+    if shard_by == "template":
+        domain = row[REPORT_FIELDS.index("domain")]
+        template = (templates or {}).get(domain)
+        return f"template-{template}" if template is not None else "unique"
+    return "all"
 
-            // Context menu per escludere immagini simili
-            function createContextMenu() {
-                if (!contextMenu) {
-                    contextMenu = document.createElement("div");
-                    contextMenu.className = "context-menu";
-                    contextMenu.id = "context-menu";
-                    const button = document.createElement("button");
-                    button.textContent = "Exclude all matching images";
-                    button.onclick = excludeImages;
-                    contextMenu.appendChild(button);
-                    document.body.appendChild(contextMenu);
-                }
-                return contextMenu;
-            }
 
-            function excludeImages() {
-                const imagesToHide = document.querySelectorAll(`img[data-hash='${selectedHash}']`);
-                imagesToHide.forEach(img => {
-                    const item = img.closest(".gallery-item");
-                    if (item) {
-                        item.classList.add("hidden");
-                    }
-                });
-                if (!filters.has(selectedHash)) {
-                    filters.add(selectedHash);
-                    addFilterInfo(selectedHash, imagesToHide[0].src);
-                }
-                if (contextMenu) {
-                    contextMenu.style.display = "none";
-                }
-            }
+def render_index_page(title, total, shard_by, groups):
+    """Lightweight entry page of a sharded report: one line per group with links to its pages"""
+    lines = []
+    for group, count, pages, preview in groups:
+        links = " ".join(
+            f'<a href="{SHARDS_FOLDER}/{html.escape(name)}.html" title="{page_count} screenshots">{number}</a>'
+            for number, (name, page_count) in enumerate(pages, 1)
+        )
+        preview_html = f'<img src="{html.escape(preview)}" alt="" loading="lazy">' if preview else ""
+        lines.append(f"<tr><td>{preview_html}</td><td>{html.escape(group)}</td><td>{count}</td><td>{links}</td></tr>")
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Screenshot Report - {html.escape(title)}</title>
+    <style>
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
+            margin: 0;
+            background-color: #f5f5f5;
+        }}
+        .header {{
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: white;
+            padding: 20px;
+        }}
+        .header h1 {{
+            margin: 0;
+            font-size: 24px;
+            font-weight: 600;
+        }}
+        table {{
+            margin: 20px;
+            border-collapse: collapse;
+            background: white;
+            border-radius: 8px;
+        }}
+        th, td {{
+            padding: 8px 14px;
+            text-align: left;
+            border-bottom: 1px solid #e0e0e0;
+            font-size: 14px;
+        }}
+        td img {{
+            width: 80px;
+            height: 50px;
+            object-fit: contain;
+            background: #f8f9fa;
+        }}
+        td a {{
+            color: #667eea;
+            margin-right: 6px;
+        }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>📸 Screenshot Report - {html.escape(title)}</h1>
+        <div>Total: {total} screenshots in {len(groups)} groups (by {shard_by})</div>
+    </div>
+    <table>
+        <tr><th></th><th>Group</th><th>Screenshots</th><th>Pages</th></tr>
+        {"".join(lines)}
+    </table>
+</body>
+</html>
+"""
 
-            function addFilterInfo(hash, src) {
-                let filterInfo = document.getElementById("filter-info");
-                if (!filterInfo) {
-                    filterInfo = document.createElement("div");
-                    filterInfo.id = "filter-info";
-                    filterInfo.className = "filter-info";
-                    document.querySelector(".header").appendChild(filterInfo);
-                }
-                const filterItem = document.createElement("div");
-                filterItem.className = "filter-item";
-                filterItem.dataset.hash = hash;
-                filterItem.innerHTML = `
-                    <img src="${src}" alt="Filter">
-                    <button onclick="removeFilter('${hash}')">X</button>
-                `;
-                filterInfo.appendChild(filterItem);
-            }
 
-            function removeFilter(hash) {
-                filters.delete(hash);
-                document.querySelectorAll(`.filter-item[data-hash='${hash}']`).forEach(item => item.remove());
-                document.querySelectorAll(`.hidden img[data-hash='${hash}']`).forEach(img => {
-                    const item = img.closest(".gallery-item");
-                    if (item) {
-                        item.classList.remove("hidden");
-                    }
-                });
-                const filterInfo = document.getElementById("filter-info");
-                if (filterInfo && filterInfo.children.length === 0) {
-                    filterInfo.remove();
-                }
-            }
+def write_sharded_report(output_folder, title, rows, cluster_sizes, status_codes, shard_size, shard_by="order", body_excerpts=None,
+                         image_hashes=None, similarity_hash="ahash", templates=None, storage_layout=None):
+    """Split the report rows into pages of at most shard_size per group; only shards whose rows changed are rewritten.
 
+    Shards live in shards/ (one page, one data script and one search index each) and
+    report.html becomes the index. shards/manifest.json records the
+    version of every shard so unchanged ones are skipped.
+    """
+    # The data and search scripts of a single-page report written earlier
+    for name in (REPORT_DATA_FILE, REPORT_SEARCH_FILE):
+        try:
+            os.remove(os.path.join(output_folder, name))
+        except FileNotFoundError:
+            pass
+    shards_folder = os.path.join(output_folder, SHARDS_FOLDER)
+    os.makedirs(shards_folder, exist_ok=True)
+    manifest_path = os.path.join(shards_folder, SHARD_MANIFEST_FILE)
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
 
-            document.addEventListener("click", function(event) {
-                if (contextMenu && !event.target.closest(".context-menu")) {
-                    contextMenu.style.display = "none";
-                }
-            });
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(shard_group(row, shard_by, cluster_sizes, status_codes, templates), []).append(row)
+    group_order = sorted(grouped, key=lambda group: (-len(grouped[group]), group))
 
-            // Tastiera
-            document.addEventListener("keydown", function(event) {
-                if (modal.classList.contains("active")) {
-                    if (event.key === "ArrowLeft") navigate(-1);
-                    if (event.key === "ArrowRight") navigate(1);
-                    if (event.key === "Escape") closeModal();
-                }
-            });
+    shard_versions = {}
+    written = 0
+    index_groups = []
+    for group in group_order:
+        group_rows = grouped[group]
+        slug = re.sub(r"[^A-Za-z0-9._-]", "_", group)
+        chunks = [group_rows[start:start + shard_size] for start in range(0, len(group_rows), shard_size)]
+        names = [f"{slug}-{number:04d}" for number in range(1, len(chunks) + 1)]
+        for number, (name, chunk) in enumerate(zip(names, chunks), 1):
+            chunk_clusters = {row[REPORT_FIELDS.index("cluster")] for row in chunk}
+            script = report_data_script({
+                "fields": REPORT_FIELDS,
+                "rows": chunk,
+                "clusterSizes": {cluster_id: cluster_sizes[cluster_id] for cluster_id in sorted(chunk_clusters) if cluster_sizes[cluster_id] > 1},
+                "clusterRows": cluster_rows(chunk),
+                "categoryRows": category_rows(chunk),
+                "similarity": similarity_index(chunk, image_hashes, similarity_hash) if image_hashes else None,
+                **(storage_layout or {}),
+                "base": "../",
+            })
+            nav_links = ['<a href="../report.html">&larr; Index</a>', f"<span>{html.escape(group)}: page {number} of {len(chunks)}</span>"]
+            if number > 1:
+                nav_links.append(f'<a href="{html.escape(names[number - 2])}.html">&lsaquo; Previous</a>')
+            if number < len(chunks):
+                nav_links.append(f'<a href="{html.escape(names[number])}.html">Next &rsaquo;</a>')
+            nav_html = f'<div class="nav">{" ".join(nav_links)}</div>'
+            # The navigation changes when pages are added to or removed from the group, even if these rows did not
+            search_key = search_index_key(chunk, status_codes, body_excerpts or {})
+            version = hashlib.sha1((script + search_key + nav_html).encode("utf-8")).hexdigest()[:12]
+            shard_versions[name] = version
+            page_path = os.path.join(shards_folder, f"{name}.html")
+            data_path = os.path.join(shards_folder, f"{name}.js")
+            search_path = os.path.join(shards_folder, f"{name}-search.js")
+            if manifest.get(name) == version and all(os.path.exists(path) for path in (page_path, data_path, search_path)):
+                continue
+            write_file_atomic(data_path, script)
+            write_search_index(search_path, chunk, status_codes, body_excerpts or {})
+            write_file_atomic(page_path, render_report_page(
+                f"{title} - {group}", len(chunk), f"{name}.js?v={version}", nav_html, f"{name}-search.js?v={version}"
+            ))
+            written += 1
+        first_row = group_rows[0]
+        preview = thumbnail_path("", first_row[REPORT_FIELDS.index("img")], any((storage_layout or {}).values())).replace(os.sep, "/") if first_row[REPORT_FIELDS.index("thumb")] else ""
+        index_groups.append((group, len(group_rows), list(zip(names, (len(chunk) for chunk in chunks))), preview))
 
-            // Click fuori dal modal per chiudere
-            modal.addEventListener("click", function(event) {
-                if (event.target === modal) {
-                    closeModal();
-                }
-            });
+    # Shards that no longer exist (their group shrank or disappeared)
+    for name in set(manifest) - set(shard_versions):
+        for extension in (".html", ".js", "-search.js"):
+            try:
+                os.remove(os.path.join(shards_folder, name + extension))
+            except OSError:
+                pass
 
-            // Funzione globale per removeFilter (chiamata dal filter button)
-            window.removeFilter = removeFilter;
-            
-            // Rendi le funzioni globali per gli onclick
-            window.navigate = navigate;
-            window.closeModal = closeModal;
-            
-            // Funzione per filtrare i domini nella sidebar
-            function filterDomains(searchTerm) {
-                const searchLower = searchTerm.toLowerCase();
-                let visibleCount = 0;
-                
-                domainItems.forEach(item => {
-                    const domainName = item.querySelector(".domain-name");
-                    const domainUrl = item.querySelector(".domain-url");
-                    const text = (domainName ? domainName.textContent : "") + " " + (domainUrl ? domainUrl.textContent : "");
-                    const matches = text.toLowerCase().includes(searchLower);
-                    
-                    if (matches) {
-                        item.style.display = "";
-                        visibleCount++;
-                    } else {
-                        item.style.display = "none";
-                    }
-                });
-                
-                const countEl = document.getElementById("domain-count");
-                if (countEl) {
-                    countEl.textContent = `Showing ${visibleCount} of ${domainItems.length} domains`;
-                }
-            }
-            
-            // Inizializza quando il DOM è pronto
-            function setup() {
-                init();
-                
-                // Barra di ricerca per i domini
-                const searchBox = document.getElementById("domain-search");
-                if (searchBox) {
-                    searchBox.addEventListener("input", function(e) {
-                        filterDomains(e.target.value);
-                    });
-                }
-                
-                // Event delegation per la galleria
-                const gallery = document.getElementById("gallery");
-                if (gallery) {
-                    gallery.addEventListener("click", function(e) {
-                        const galleryItem = e.target.closest(".gallery-item");
-                        if (!galleryItem) return;
-                        
-                        // Non aprire se si clicca sul link
-                        if (e.target.tagName === "A" || e.target.closest("a")) {
-                            return;
-                        }
-                        
-                        e.stopPropagation();
-                        console.log("Click on gallery item:", galleryItem);
-                        const img = galleryItem.querySelector("img");
-                        if (img) {
-                            openModal(img);
-                        }
-                    }, true);
-                    
-                    // Imposta cursor pointer su tutti gli item
-                    document.querySelectorAll(".gallery-item").forEach(item => {
-                        item.style.cursor = "pointer";
-                    });
-                } else {
-                    console.error("Gallery not found!");
-                }
+    with open(manifest_path, "w") as f:
+        json.dump(shard_versions, f, indent=2)
+    write_file_atomic(os.path.join(output_folder, "report.html"), render_index_page(title, len(rows), shard_by, index_groups))
+    print(f"Sharded report: {len(shard_versions)} pages in {len(index_groups)} groups by {shard_by}, {written} rewritten.")
 
-                // Event delegation per la sidebar
-                const domainList = document.getElementById("domain-list");
-                if (domainList) {
-                    domainList.addEventListener("click", function(e) {
-                        const domainItem = e.target.closest(".domain-item");
-                        if (!domainItem) return;
-                        
-                        // Non aprire se si clicca sul link URL
-                        if (e.target.tagName === "A" || e.target.closest("a")) {
-                            return;
-                        }
-                        
-                        e.stopPropagation();
-                        console.log("Click on domain item:", domainItem);
-                        const imgSrc = domainItem.getAttribute("data-img");
-                        if (imgSrc) {
-                            const galleryItem = document.querySelector(`.gallery-item[data-img="${imgSrc}"]`);
-                            if (galleryItem) {
-                                const img = galleryItem.querySelector("img");
-                                if (img) {
-                                    openModal(img);
-                                    // Scroll alla gallery item
-                                    galleryItem.scrollIntoView({ behavior: "smooth", block: "center" });
-                                }
-                            }
-                        }
-                    }, true);
-                    
-                    // Imposta cursor pointer su tutti gli item
-                    document.querySelectorAll(".domain-item").forEach(item => {
-                        item.style.cursor = "pointer";
-                    });
-                } else {
-                    console.error("Domain list not found!");
-                }
-                
-                // Tasto destro per escludere immagini simili
-                if (gallery) {
-                    gallery.addEventListener("contextmenu", function(event) {
-                        let target = event.target;
-                        if (target.tagName === "IMG" && target.closest(".gallery-item")) {
-                            event.preventDefault();
-                            event.stopPropagation();
-                            event.stopImmediatePropagation();
-                            selectedHash = target.getAttribute("data-hash");
-                            console.log("Context menu on image, hash:", selectedHash);
-                            if (selectedHash) {
-                                const menu = createContextMenu();
-                                menu.style.top = `${event.pageY}px`;
-                                menu.style.left = `${event.pageX}px`;
-                                menu.style.display = "flex";
-                                menu.style.position = "fixed";
-                                menu.style.zIndex = "10000";
-                            }
-                            return false;
-                        }
-                    }, true);
-                }
-                
-                // Aggiungi event listener per le frecce e il pulsante di chiusura
-                const arrowLeft = document.getElementById("arrow-left");
-                const arrowRight = document.getElementById("arrow-right");
-                const closeBtn = document.getElementById("modal-close-btn");
-                
-                if (arrowLeft) {
-                    arrowLeft.addEventListener("click", function() { navigate(-1); });
-                }
-                if (arrowRight) {
-                    arrowRight.addEventListener("click", function() { navigate(1); });
-                }
-                if (closeBtn) {
-                    closeBtn.addEventListener("click", function() { closeModal(); });
-                }
-            }
-            
-            // Inizializza quando il DOM è pronto
-            if (document.readyState === "loading") {
-                document.addEventListener("DOMContentLoaded", setup);
-            } else {
-                setup();
-            }
-            
-            })(); // Fine IIFE
-        </script>
-    </body>
-    </html>
-    """
+
+def generate_report(output_folder, columns=4, cluster_threshold=CLUSTER_THRESHOLD, hash_algorithms=DEFAULT_HASH_ALGORITHMS, cluster_hash="ahash",
+                    shard_size=None, shard_by="order", tile_threshold=TILE_THRESHOLD):
+    report_path = os.path.join(output_folder, "report.html")
+    # --storage archive: the screenshots are read straight from the container, addressed as paths inside it;
+    # --storage sharded: they are listed by the manifest instead of the folders
+    archived = archive_entries(os.path.join(output_folder, ARCHIVE_FILE))
+    sharded = {} if archived else load_screenshot_manifest(output_folder)
+    screenshots_folder = os.path.join(output_folder, SCREENSHOTS_FOLDER)
+    if archived:
+        image_paths = {name: os.path.join(output_folder, ARCHIVE_FILE, name) for name in archived}
+    elif sharded:
+        image_paths = {name: os.path.join(screenshots_folder, *path.split("/")) for name, path in sharded.items()}
+    else:
+        if not os.path.exists(screenshots_folder):
+            print("No screenshots directory found in the specified directory.")
+            return
+        image_paths = {name: os.path.join(screenshots_folder, name) for name in os.listdir(screenshots_folder)}
+    image_files = [name for name in image_paths if name.endswith(".png")]
+    storage_layout = {"archived": 1 if archived else 0, "sharded": 1 if sharded else 0}
+    # Sharded and archive output keep thumbnails and tiles (always files) in the <ab>/<cd> folders of their screenshot
+    sharded_files = bool(sharded or archived)
+    if archived:
+        # Archives written before their thumbnails and tiles were sharded
+        shard_previews(output_folder)
+    if not image_files:
+        print("No screenshots found in the screenshots directory.")
+        return
+    
+    report_info_path = os.path.join(output_folder, "report_info.json")
+    successful_domains_order = []
+    domain_urls = {}
+    domain_titles = {}
+    domain_status_codes = {}
+    domain_details = {}
+    domain_body_excerpts = {}
+    
+    if os.path.exists(report_info_path):
+        try:
+            with open(report_info_path, "r") as f:
+                report_info = json.load(f)
+                successful_domains_order = report_info.get("successful_domains_order", [])
+                domain_urls = report_info.get("domain_urls", {})
+                domain_titles = report_info.get("domain_titles", {})
+                domain_status_codes = report_info.get("domain_status_codes", {})
+                domain_details = report_info.get("domain_details", {})
+                domain_body_excerpts = report_info.get("domain_body_excerpts", {})
+        except Exception as e:
+            print(f"Warning: Could not load report info: {e}")
+
+    algorithms = list(dict.fromkeys(["ahash", *hash_algorithms, cluster_hash]))
+
+    def load_inputs(img):
+        img_path = image_paths[img]
+        try:
+            return img, load_hash_inputs(img_path, thumbnail_path(output_folder, img, sharded_files), algorithms)
+        except Exception as e:
+            print(f"Failed to process image {img}: {e}")
+            return img, None
+
+    # Hashes computed by the capture workers, valid as long as the file still has the size they were computed for
+    capture_hashes = {}
+    for details in domain_details.values():
+        if details.get("screenshot") and details.get("hashes") and not details.get("alias_of"):
+            capture_hashes[details["screenshot"]] = (details.get("screenshot_size"), details["hashes"])
+
+    # Only hash screenshots that are new or changed since the cached hashes were computed
+    hash_cache = load_hash_cache(output_folder)
+    report_index = load_report_index(output_folder, cluster_hash, cluster_threshold)
+    image_hashes = {}
+    image_stats = {}
+    # Hardlinked screenshots (content-addressed storage, carried-forward captures) and archive entries with one digest
+    # are the same image: hash, thumbnail and tile it once
+    same_file = {}
+    to_hash = []
+    for img in image_files:
+        if archived:
+            size, mtime_ns, same_file[img] = archived[img]
+        else:
+            try:
+                stat = os.stat(image_paths[img])
+            except OSError:
+                continue
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            if stat.st_nlink > 1 and stat.st_ino:
+                same_file[img] = (stat.st_dev, stat.st_ino)
+        image_stats[img] = (size, mtime_ns)
+        cached = hash_cache.get(img)
+        captured = capture_hashes.get(img)
+        if cached and cached.get("size") == size and cached.get("mtime_ns") == mtime_ns and all(a in cached.get("hashes", {}) for a in algorithms):
+            image_hashes[img] = cached["hashes"]
+        elif captured and captured[0] == size and all(a in captured[1] for a in algorithms):
+            image_hashes[img] = captured[1]
+        else:
+            to_hash.append(img)
+
+    linked_copies = group_linked_copies(to_hash, same_file)
+    unique_to_hash = [copies[0] for copies in linked_copies]
+    if to_hash:
+        copies = f", {len(to_hash) - len(unique_to_hash)} identical copies" if len(to_hash) > len(unique_to_hash) else ""
+        print(f"Hashing {len(unique_to_hash)} new or changed images ({len(image_hashes)} cached{copies}, {', '.join(algorithms)}).")
+        # Threads decode and downscale; the hash bits of each batch are computed together with NumPy
+        with ThreadPoolExecutor() as executor, tqdm(total=len(unique_to_hash), desc="Processing images") as progress:
+            for start in range(0, len(unique_to_hash), HASH_BATCH_SIZE):
+                loaded = [(img, inputs) for img, inputs in executor.map(load_inputs, unique_to_hash[start:start + HASH_BATCH_SIZE]) if inputs is not None]
+                if loaded:
+                    hexes = compute_hashes_batch([inputs for _, inputs in loaded], algorithms)[1]
+                    for (img, _), img_hashes in zip(loaded, hexes):
+                        image_hashes[img] = img_hashes
+                progress.update(min(HASH_BATCH_SIZE, len(unique_to_hash) - start))
+        for copies in linked_copies:
+            if copies[0] in image_hashes:
+                for img in copies[1:]:
+                    image_hashes[img] = image_hashes[copies[0]]
+
+    # Screenshots the last run already included, unchanged since; anything else is new to the report
+    to_hash_set = set(to_hash)
+    indexed = {
+        img for img, entry in report_index.items()
+        if img in image_hashes and img not in to_hash_set and [entry.get("size"), entry.get("mtime_ns")] == list(image_stats[img])
+    }
+
+    # The gallery shows thumbnails; the original screenshot is only loaded by the modal viewer
+    thumbnails = {img for img in indexed if report_index[img].get("thumb")}
+    missing_thumbnails = []
+    for img in image_hashes:
+        if img in thumbnails:
+            continue
+        if thumbnail_is_fresh(image_paths[img], thumbnail_path(output_folder, img, sharded_files)):
+            thumbnails.add(img)
+        else:
+            missing_thumbnails.append(img)
+    if missing_thumbnails:
+        linked_copies = group_linked_copies(missing_thumbnails, same_file)
+        unique_missing = [copies[0] for copies in linked_copies]
+        with ThreadPoolExecutor() as executor:
+            created = list(tqdm(
+                executor.map(lambda img: ensure_thumbnail(image_paths[img], thumbnail_path(output_folder, img, sharded_files)), unique_missing),
+                total=len(unique_missing), desc="Creating thumbnails"
+            ))
+        for copies, ok in zip(linked_copies, created):
+            if not ok:
+                continue
+            thumbnails.add(copies[0])
+            for img in copies[1:]:
+                try:
+                    link_file(thumbnail_path(output_folder, copies[0], sharded_files), thumbnail_path(output_folder, img, sharded_files))
+                    thumbnails.add(img)
+                except OSError:
+                    pass
+
+    # Screenshots too large for a single <img> are shown by the modal from their tile pyramid
+    image_sizes = {img: tuple(report_index[img]["dims"]) for img in indexed if report_index[img].get("dims")}
+    for img in image_hashes:
+        if img not in image_sizes:
+            try:
+                image_sizes[img] = image_size(image_paths[img])
+            except OSError:
+                pass
+    large = [img for img, (width, height) in image_sizes.items() if tile_threshold and max(width, height) > tile_threshold]
+    tiled = {img for img in large if img in indexed and report_index[img].get("tiles")}
+    missing_tiles = []
+    for img in large:
+        if img in tiled:
+            continue
+        if tiles_are_fresh(image_paths[img], tiles_folder(output_folder, img, sharded_files)):
+            tiled.add(img)
+        else:
+            missing_tiles.append(img)
+    if missing_tiles:
+        linked_copies = group_linked_copies(missing_tiles, same_file)
+        unique_missing = [copies[0] for copies in linked_copies]
+        with ThreadPoolExecutor() as executor:
+            built = list(tqdm(
+                executor.map(lambda img: build_tiles(image_paths[img], tiles_folder(output_folder, img, sharded_files)), unique_missing),
+                total=len(unique_missing), desc="Building tiles"
+            ))
+        for copies, ok in zip(linked_copies, built):
+            if not ok:
+                continue
+            tiled.add(copies[0])
+            for img in copies[1:]:
+                try:
+                    shutil.rmtree(tiles_folder(output_folder, img, sharded_files), ignore_errors=True)
+                    shutil.copytree(tiles_folder(output_folder, copies[0], sharded_files), tiles_folder(output_folder, img, sharded_files), copy_function=link_file)
+                    tiled.add(img)
+                except (OSError, shutil.Error):
+                    pass
+
+    # Hashes from the capture workers stay in report_info.json, so new screenshots alone do not need a rewrite
+    if to_hash or not hash_cache.keys() <= image_hashes.keys():
+        save_hash_cache(output_folder, {
+            img: {"size": image_stats[img][0], "mtime_ns": image_stats[img][1], "hashes": img_hashes}
+            for img, img_hashes in image_hashes.items()
+        })
+    
+    # Removing or changing a screenshot can split a cluster, so earlier clusters are only reused when nothing was
+    if report_index and len(indexed) == len(report_index):
+        previous = {img: report_index[img]["cluster"] for img in indexed}
+        print(f"Updating the report with {len(image_hashes) - len(indexed)} new screenshots ({len(indexed)} indexed).")
+    else:
+        previous = None
+    clusters, cluster_sizes = cluster_hashes({img: h[cluster_hash] for img, h in image_hashes.items()}, cluster_threshold, previous)
+    if not previous or len(indexed) != len(image_hashes):
+        save_clusters(output_folder, clusters, cluster_sizes, cluster_threshold, cluster_hash)
+    grouped = sum(size for size in cluster_sizes.values() if size > 1)
+    print(f"Clustered {len(image_hashes)} screenshots into {len(cluster_sizes)} clusters "
+          f"({grouped} in clusters of two or more, {cluster_hash} within {cluster_threshold} bits).")
+
+    aliases_by_image = {}
+    for domain in successful_domains_order:
+        details = domain_details.get(domain, {})
+        if details.get("alias_of") and details.get("screenshot"):
+            aliases_by_image.setdefault(details["screenshot"], []).append(domain)
+
+    # File names carry the scheme and port of the endpoint, so the row a screenshot belongs to comes from the details that captured it
+    captured_by = {details["screenshot"]: domain for domain, details in domain_details.items() if details.get("screenshot") and not details.get("alias_of")}
+    filename_to_domain = {img: captured_by.get(img) or (report_index[img]["domain"] if img in report_index else os.path.splitext(img)[0]) for img in image_files}
+    image_by_domain = {domain: img for img, domain in filename_to_domain.items()}
+
+    # Processing order first, then screenshots the report info does not know about
+    ordered_images = list(dict.fromkeys(image_by_domain[domain] for domain in successful_domains_order if domain in image_by_domain))
+    listed = set(ordered_images)
+    ordered_images.extend(img for img in image_files if img not in listed)
+
+    # One compact row per screenshot, in REPORT_FIELDS order; the page renders them from report_data.js
+    report_rows = []
+    for img in ordered_images:
+        if img not in image_hashes:
+            continue
+        domain = filename_to_domain[img]
+        domain_url = domain_urls.get(domain, f"https://{domain}")
+        if not domain_url.startswith(("http://", "https://")):
+            domain_url = f"https://{domain_url}"
+        report_rows.append([
+            img,
+            domain_url,
+            domain_titles.get(domain, ""),
+            1 if img in thumbnails else 0,
+            image_hashes[img]["ahash"],
+            clusters[img],
+            domain_details.get(domain, {}).get("rescan", ""),
+            aliases_by_image.get(img, []),
+            domain_details.get(domain, {}).get("category", ""),
+            [*image_sizes[img], TILE_SIZE] if img in tiled else 0,
+            domain,
+        ])
+    save_report_index(output_folder, cluster_hash, cluster_threshold, {
+        img: {
+            "domain": filename_to_domain[img],
+            "size": image_stats[img][0],
+            "mtime_ns": image_stats[img][1],
+            "thumb": 1 if img in thumbnails else 0,
+            "dims": list(image_sizes[img]) if img in image_sizes else None,
+            "tiles": 1 if img in tiled else 0,
+            "cluster": clusters[img],
+        }
+        for img in image_hashes
+    })
+    # What --serve needs to answer queries without reading the written files back
+    report = {"rows": report_rows, "cluster_sizes": cluster_sizes, "status_codes": domain_status_codes, "body_excerpts": domain_body_excerpts}
+    if shard_size:
+        write_sharded_report(output_folder, os.path.basename(output_folder), report_rows, cluster_sizes, domain_status_codes, shard_size, shard_by,
+                             domain_body_excerpts, image_hashes, cluster_hash, template_groups(domain_details), storage_layout)
+        return report
+
+    # The shards of a sharded report written earlier
+    shutil.rmtree(os.path.join(output_folder, SHARDS_FOLDER), ignore_errors=True)
+    data_version = write_report_data(output_folder, {
+        "fields": REPORT_FIELDS,
+        "rows": report_rows,
+        "clusterSizes": {cluster_id: size for cluster_id, size in cluster_sizes.items() if size > 1},
+        "clusterRows": cluster_rows(report_rows),
+        "categoryRows": category_rows(report_rows),
+        "similarity": similarity_index(report_rows, image_hashes, cluster_hash),
+        **storage_layout,
+    })
+    # A separate script loaded asynchronously, so the gallery does not wait for the search index
+    search_version = write_search_index(os.path.join(output_folder, REPORT_SEARCH_FILE), report_rows, domain_status_codes, domain_body_excerpts)
+
+    html_content = render_report_page(os.path.basename(output_folder), len(report_rows), f"{REPORT_DATA_FILE}?v={data_version}",
+                                      search_src=f"{REPORT_SEARCH_FILE}?v={search_version}")
 
     with open(report_path, "w", encoding="utf-8") as report_file:
         report_file.write(html_content)
 
     print(f"Report generated at: {report_path}")
+    return report
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Generate an HTML report for screenshots.")
     parser.add_argument("-o", "--output-folder", required=True, help="Directory containing screenshots.")
+    parser.add_argument("--cluster-threshold", type=int, default=CLUSTER_THRESHOLD,
+                        help=f"Maximum Hamming distance (bits) between near-duplicate screenshots, 0 for exact matches only (default: {CLUSTER_THRESHOLD}).")
+    parser.add_argument("--hashes", default=",".join(DEFAULT_HASH_ALGORITHMS),
+                        help=f"Comma-separated hash algorithms to compute, from a single decode per screenshot ({', '.join(HASH_ALGORITHMS)}; default: {','.join(DEFAULT_HASH_ALGORITHMS)}).")
+    parser.add_argument("--cluster-hash", choices=HASH_ALGORITHMS, default="ahash", help="Hash algorithm used for near-duplicate clustering (default: ahash).")
+    parser.add_argument("--shard-size", type=int, help="Write a sharded report: pages of at most N screenshots under shards/, with report.html as the index.")
+    parser.add_argument("--shard-by", choices=SHARD_GROUPINGS, default="order",
+                        help="Group shards by processing order, near-duplicate cluster, HTTP status code, domain suffix or page template (default: order).")
+    parser.add_argument("--tile-threshold", type=int, default=TILE_THRESHOLD,
+                        help=f"Build deep-zoom tiles for screenshots with a side longer than N pixels, 0 to disable (default: {TILE_THRESHOLD}).")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="After generating the report, serve it with a paginated JSON API at http://HOST:PORT/ (HOST defaults to 127.0.0.1; IPv6 in brackets, e.g. [::1]:8080).")
     args = parser.parse_args()
 
-    generate_report(args.output_folder)
+    hash_algorithms = [a.strip() for a in args.hashes.split(",") if a.strip()]
+    unknown = [a for a in hash_algorithms if a not in HASH_ALGORITHMS]
+    if unknown:
+        parser.error(f"unknown hash algorithm(s): {', '.join(unknown)}")
+    report = generate_report(args.output_folder, cluster_threshold=args.cluster_threshold, hash_algorithms=hash_algorithms, cluster_hash=args.cluster_hash,
+                             shard_size=args.shard_size, shard_by=args.shard_by, tile_threshold=args.tile_threshold)
+    if args.serve and report:
+        from report_server import serve_report
+        serve_report(args.output_folder, report, args.serve)
@@ -0,0 +1,104 @@
+import numpy as np
+from PIL import Image
+
+# Perceptual hashes computed in batches with NumPy. Each screenshot is
+# decoded once; the per-image work is limited to a few small resizes, and
+# all bit manipulation runs on stacked arrays for the whole batch.
+#
+# ahash, dhash and phash give the same bits as imagehash.average_hash,
+# dhash and phash on the same image; whash and colorhash follow
+# imagehash.whash and colorhash on fixed-size inputs so they can be batched.
+
+HASH_ALGORITHMS = ["ahash", "phash", "dhash", "whash", "colorhash"]
+HASH_SIZE = 8
+PHASH_SIZE = HASH_SIZE * 4
+WHASH_SIZE = HASH_SIZE * 4
+COLORHASH_SIZE = 64
+COLORHASH_BINBITS = 3
+
+# Unnormalized DCT-II basis (scipy.fftpack.dct type 2): y[k] = 2 * sum(x[n] * cos(pi * k * (2n + 1) / 2N))
+DCT_MATRIX = 2 * np.cos(np.pi * np.outer(np.arange(PHASH_SIZE), 2 * np.arange(PHASH_SIZE) + 1) / (2 * PHASH_SIZE))
+
+
+def prepare_hash_inputs(image, algorithms=HASH_ALGORITHMS):
+    """Small arrays every requested algorithm needs, taken from one decoded image"""
+    gray = image.convert("L")
+    inputs = {}
+    if "ahash" in algorithms:
+        inputs["ahash"] = np.asarray(gray.resize((HASH_SIZE, HASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    if "dhash" in algorithms:
+        inputs["dhash"] = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    if "phash" in algorithms:
+        inputs["phash"] = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    if "whash" in algorithms:
+        inputs["whash"] = np.asarray(gray.resize((WHASH_SIZE, WHASH_SIZE), Image.BOX), dtype=np.float64) / 255
+    if "colorhash" in algorithms:
+        small = image.convert("RGB").resize((COLORHASH_SIZE, COLORHASH_SIZE), Image.BOX)
+        inputs["colorhash"] = np.stack([np.asarray(small.convert("L")), *(np.asarray(band) for band in small.convert("HSV").split())])
+    return inputs
+
+
+def hash_bits(algorithm, stack):
+    """Hash bits (N x bits, bool) of a stack of prepared inputs"""
+    count = stack.shape[0]
+    if algorithm == "ahash":
+        return (stack > stack.mean(axis=(1, 2), keepdims=True)).reshape(count, -1)
+    if algorithm == "dhash":
+        return (stack[:, :, 1:] > stack[:, :, :-1]).reshape(count, -1)
+    if algorithm == "phash":
+        low = (DCT_MATRIX @ stack @ DCT_MATRIX.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(count, -1)
+        return low > np.median(low, axis=1, keepdims=True)
+    if algorithm == "whash":
+        # Haar LL band at 8x8: removing the coarsest LL (the image mean) does not change the comparison with the median
+        block = WHASH_SIZE // HASH_SIZE
+        low = stack.reshape(count, HASH_SIZE, block, HASH_SIZE, block).mean(axis=(2, 4)).reshape(count, -1)
+        return low > np.median(low, axis=1, keepdims=True)
+    if algorithm == "colorhash":
+        intensity, hue, saturation = (stack[:, i].reshape(count, -1).astype(np.int32) for i in range(3))
+        mask_black = intensity < 256 // 8
+        mask_gray = saturation < 256 // 3
+        mask_colors = ~mask_black & ~mask_gray
+        mask_faint = mask_colors & (saturation < 256 * 2 // 3)
+        mask_bright = mask_colors & (saturation > 256 * 2 // 3)
+        colors = np.maximum(1, mask_colors.sum(axis=1))
+        hue_bins = np.minimum(np.digitize(hue, np.linspace(0, 255, 7)[1:-1]), 5)
+        fractions = [mask_black.mean(axis=1), (~mask_black & mask_gray).mean(axis=1)]
+        for mask in (mask_faint, mask_bright):
+            for hue_bin in range(6):
+                fractions.append((mask & (hue_bins == hue_bin)).sum(axis=1) / colors)
+        maxvalue = 2 ** COLORHASH_BINBITS
+        values = np.minimum(maxvalue - 1, (np.stack(fractions, axis=1) * maxvalue).astype(np.int64))
+        bits = [values // 2 ** (COLORHASH_BINBITS - i - 1) % 2 ** (COLORHASH_BINBITS - i) > 0 for i in range(COLORHASH_BINBITS)]
+        return np.stack(bits, axis=2).reshape(count, -1)
+    raise ValueError(f"Unknown hash algorithm '{algorithm}'")
+
+
+def pack_bits(bits):
+    """Pack N x bits boolean rows (at most 64 bits, first bit most significant) into uint64 integers"""
+    weights = np.left_shift(np.uint64(1), np.arange(bits.shape[1] - 1, -1, -1, dtype=np.uint64))
+    return (bits.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+
+
+def compute_hashes_batch(inputs_list, algorithms=HASH_ALGORITHMS):
+    """Hashes of many prepared images at once.
+
+    Returns (packed, hexes): packed maps each algorithm to a uint64 array
+    with one packed hash per image, hexes is a list of {algorithm: hex}
+    dicts in the same order (the form stored in JSON).
+    """
+    packed = {}
+    widths = {}
+    for algorithm in algorithms:
+        bits = hash_bits(algorithm, np.stack([inputs[algorithm] for inputs in inputs_list]))
+        packed[algorithm] = pack_bits(bits)
+        widths[algorithm] = (bits.shape[1] + 3) // 4
+    hexes = [
+        {algorithm: f"{int(packed[algorithm][i]):0{widths[algorithm]}x}" for algorithm in algorithms}
+        for i in range(len(inputs_list))
+    ]
+    return packed, hexes
+
+
+def compute_hashes(image, algorithms=HASH_ALGORITHMS):
+    """Hashes of a single image as {algorithm: hex}"""
+    return compute_hashes_batch([prepare_hash_inputs(image, algorithms)], algorithms)[1][0]
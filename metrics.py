@@ -0,0 +1,209 @@
+import os
+import time
+import socket
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Metric updates from the capture loop and the workers are plain dict operations under a lock.
+# Everything expensive (formatting, /proc scanning for RSS) happens in the exporter thread.
+
+METRIC_PREFIX = "dscreenshoter"
+METRIC_FAMILIES = {
+    "targets": ("counter", "Targets completed, by outcome (captured, alias, unchanged, skipped, failed)"),
+    "failures": ("counter", "Failed targets, by error class"),
+    "browser_launches": ("counter", "Chrome/chromedriver launches, by result"),
+    "vpn_rotations": ("counter", "Successful VPN (re)connections, by VPN mode"),
+    "targets_in_flight": ("gauge", "Targets currently being captured by a worker"),
+    "queue_depth": ("gauge", "Targets waiting for a worker"),
+    "throughput_targets_per_minute": ("gauge", "Targets completed during the last 60 seconds"),
+    "driver_rss_bytes": ("gauge", "Resident memory of all chromedriver/Chrome processes started by this run"),
+    "start_time_seconds": ("gauge", "Unix time at which the run started"),
+}
+
+metrics_lock = threading.Lock()
+counters = {}
+gauges = {}
+completion_times = deque(maxlen=100000)
+start_time = time.time()
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        counters[key] = counters.get(key, 0) + amount
+        if name == "targets":
+            completion_times.append(time.time())
+
+
+def set_gauge(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        gauges[key] = value
+
+
+def add_gauge(name, amount, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        gauges[key] = gauges.get(key, 0) + amount
+
+
+def track_in_flight(func):
+    """Wrap a worker function so the in-flight gauge follows it"""
+    def wrapper(*args, **kwargs):
+        add_gauge("targets_in_flight", 1)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            add_gauge("targets_in_flight", -1)
+    return wrapper
+
+
+def record_target(outcome, error_class=None):
+    inc("targets", outcome=outcome)
+    if outcome == "failed":
+        inc("failures", error_class=error_class or "unknown")
+
+
+def driver_rss_bytes():
+    """Sum the RSS of every descendant process (chromedriver and Chrome) via /proc; None if unavailable"""
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            # The command name may contain spaces: ppid is the second field after the closing parenthesis
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    pending = list(children.get(os.getpid(), []))
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm", "r") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+    return total
+
+
+def snapshot():
+    """Copy the current values, adding the metrics computed at export time"""
+    now = time.time()
+    with metrics_lock:
+        counter_values = dict(counters)
+        gauge_values = dict(gauges)
+        recent = sum(1 for t in completion_times if now - t <= 60)
+    pending = gauge_values.pop(("targets_pending", ()), 0)
+    in_flight = gauge_values.get(("targets_in_flight", ()), 0)
+    gauge_values[("targets_in_flight", ())] = in_flight
+    gauge_values[("queue_depth", ())] = max(0, pending - in_flight)
+    gauge_values[("throughput_targets_per_minute", ())] = recent
+    gauge_values[("start_time_seconds", ())] = start_time
+    rss = driver_rss_bytes()
+    if rss is not None:
+        gauge_values[("driver_rss_bytes", ())] = rss
+    return counter_values, gauge_values
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_metrics(openmetrics=False):
+    """Render all metrics in the Prometheus text format (or OpenMetrics when openmetrics=True)"""
+    counter_values, gauge_values = snapshot()
+    lines = []
+    for name, (metric_type, help_text) in METRIC_FAMILIES.items():
+        values = counter_values if metric_type == "counter" else gauge_values
+        samples = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        full_name = f"{METRIC_PREFIX}_{name}"
+        sample_name = f"{full_name}_total" if metric_type == "counter" else full_name
+        # OpenMetrics names the counter family without the _total suffix, the Prometheus text format with it
+        family_name = full_name if openmetrics else sample_name
+        lines.append(f"# HELP {family_name} {help_text}")
+        lines.append(f"# TYPE {family_name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{sample_name}{format_labels(labels)} {value}")
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = render_metrics(openmetrics).encode("utf-8")
+        self.send_response(200)
+        if openmetrics:
+            self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        else:
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServerV6(ThreadingHTTPServer):
+    address_family = socket.AF_INET6
+
+
+def make_http_server(address, handler):
+    """HTTP server on [HOST:]PORT (HOST defaults to 127.0.0.1); an IPv6 HOST is written in brackets, e.g. [::1]:9100"""
+    host, _, port = str(address).rpartition(":")
+    host = host or "127.0.0.1"
+    if host.startswith("[") and host.endswith("]"):
+        return ThreadingHTTPServerV6((host[1:-1], int(port)), handler)
+    return ThreadingHTTPServer((host, int(port)), handler)
+
+
+def start_metrics_server(address):
+    """Serve /metrics on [HOST:]PORT (HOST defaults to 127.0.0.1) from a daemon thread"""
+    server = make_http_server(address, MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    return server
+
+
+def write_metrics_file(path):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(render_metrics())
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.getLogger('general_errors').error(f"Failed to write metrics file '{path}': {str(e)}")
+
+
+def start_metrics_file(path, interval=15):
+    """Rewrite path atomically every interval seconds (node_exporter textfile collector format)"""
+    def loop():
+        while True:
+            write_metrics_file(path)
+            time.sleep(interval)
+    thread = threading.Thread(target=loop, name="metrics-file", daemon=True)
+    thread.start()
+    return thread
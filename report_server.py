@@ -0,0 +1,405 @@
+import os
+import re
+import json
+import html
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+from generate_report import REPORT_FIELDS, thumbnail_path
+from storage import find_screenshot, screenshot_stat, open_screenshot
+from metrics import make_http_server
+
+# Local server for browsing a run without loading all of it in the browser:
+# the page asks for one page of rows at a time from a JSON API, and images are
+# served with ETag/Last-Modified validation and byte ranges. The rows are the
+# ones generate_report just built, held in memory with one lowercase search
+# text per row; filtered row lists are cached so paging through a filter does
+# not scan the rows again.
+
+SERVE_PAGE_SIZE = 100
+SERVE_MAX_PAGE_SIZE = 500
+# Filtered row lists kept for paging (one per distinct filter)
+SERVE_FILTER_CACHE = 32
+SERVE_CHUNK_SIZE = 256 * 1024
+# Files the server exposes, relative to the output folder
+SERVE_FOLDERS = ["screenshots", "thumbnails", "tiles", "shards"]
+SERVE_FILES = ["report.html", "report_data.js", "report_search.js", "report.csv", "clusters.json"]
+CONTENT_TYPES = {
+    ".png": "image/png", ".jpg": "image/jpeg", ".html": "text/html; charset=utf-8", ".js": "application/javascript; charset=utf-8",
+    ".json": "application/json", ".csv": "text/csv; charset=utf-8",
+}
+# Screenshots change only when a run rewrites them, and then their ETag changes
+FILE_CACHE_CONTROL = "public, max-age=3600"
+FILTERS = ["q", "status", "cluster", "category", "rescan"]
+
+
+def prepare_served_report(output_folder, report):
+    """State shared by the request handlers: the rows as dicts, their search texts and the filter cache"""
+    rows = []
+    texts = []
+    for row in report["rows"]:
+        entry = dict(zip(REPORT_FIELDS, row))
+        domain = entry["domain"]
+        entry["status"] = str(report["status_codes"].get(domain) or "")
+        entry["clusterSize"] = report["cluster_sizes"].get(entry["cluster"], 1)
+        rows.append(entry)
+        texts.append(" ".join([domain, entry["url"], entry["title"], *entry["aliases"], entry["category"],
+                               report["body_excerpts"].get(domain) or ""]).lower())
+    version = hashlib.sha1(json.dumps(report["rows"], separators=(",", ":")).encode("utf-8")).hexdigest()[:12]
+    return {
+        "output_folder": os.path.realpath(output_folder),
+        "title": os.path.basename(os.path.abspath(output_folder)),
+        "rows": rows,
+        "texts": texts,
+        "version": version,
+        "filters": OrderedDict(),
+        "lock": threading.Lock(),
+    }
+
+
+def filtered_rows(state, filters):
+    """Row numbers matching every filter (words of q as substrings, status by prefix, the others exactly)"""
+    key = tuple(filters.get(name, "") for name in FILTERS)
+    with state["lock"]:
+        if key in state["filters"]:
+            state["filters"].move_to_end(key)
+            return state["filters"][key]
+    words = filters.get("q", "").lower().split()
+    status, category, rescan = filters.get("status", ""), filters.get("category", ""), filters.get("rescan", "")
+    cluster = int(filters["cluster"]) if filters.get("cluster", "").isdigit() else None
+    matches = []
+    for number, (entry, text) in enumerate(zip(state["rows"], state["texts"])):
+        if status and not entry["status"].startswith(status):
+            continue
+        if cluster is not None and entry["cluster"] != cluster:
+            continue
+        if category and entry["category"] != category:
+            continue
+        if rescan and entry["rescan"] != rescan:
+            continue
+        if all(word in text for word in words):
+            matches.append(number)
+    with state["lock"]:
+        state["filters"][key] = matches
+        while len(state["filters"]) > SERVE_FILTER_CACHE:
+            state["filters"].popitem(last=False)
+    return matches
+
+
+def summary(state):
+    """Totals for the page header and the filter choices"""
+    statuses, categories = {}, {}
+    for entry in state["rows"]:
+        statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+        if entry["category"]:
+            categories[entry["category"]] = categories.get(entry["category"], 0) + 1
+    return {"title": state["title"], "total": len(state["rows"]), "version": state["version"], "statuses": statuses, "categories": categories}
+
+
+def parse_range(header, size):
+    """(start, end) of a single "bytes=" range within size, None to send the whole file, or False if unsatisfiable"""
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if not match.group(1):
+        length = int(match.group(2))
+        return (max(0, size - length), size - 1) if length and size else False
+    start = int(match.group(1))
+    # An invalid range is ignored, one that starts past the end cannot be satisfied
+    if match.group(2) and int(match.group(2)) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    # Keep-alive: a page of thumbnails is many small requests
+    protocol_version = "HTTP/1.1"
+    head_only = False
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = {name: values[-1] for name, values in parse_qs(parsed.query).items()}
+        state = self.server.report
+        try:
+            if path == "/":
+                self.send_text(render_serve_page(state["title"]), "text/html; charset=utf-8")
+            elif path == "/api/summary":
+                self.send_json(summary(state))
+            elif path == "/api/rows":
+                self.send_rows(state, query)
+            else:
+                self.send_file(state, path)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_HEAD(self):
+        self.head_only = True
+        self.do_GET()
+
+    def send_rows(self, state, query):
+        try:
+            offset = max(0, int(query.get("offset", 0)))
+            limit = min(SERVE_MAX_PAGE_SIZE, max(1, int(query.get("limit", SERVE_PAGE_SIZE))))
+        except ValueError:
+            self.send_error(400, "offset and limit must be integers")
+            return
+        matches = filtered_rows(state, query)
+        self.send_json({
+            "total": len(matches),
+            "offset": offset,
+            "limit": limit,
+            "rows": [state["rows"][number] for number in matches[offset:offset + limit]],
+        })
+
+    def send_json(self, data):
+        body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        # The rows only change when the server restarts with a new report, so the body digest is a stable validator
+        etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if not self.head_only:
+            self.wfile.write(body)
+
+    def send_text(self, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if not self.head_only:
+            self.wfile.write(body)
+
+    def send_file(self, state, path):
+        parts = [part for part in path.split("/") if part]
+        allowed = (len(parts) == 1 and parts[0] in SERVE_FILES) or (len(parts) >= 2 and parts[0] in SERVE_FOLDERS)
+        file_path = os.path.realpath(os.path.join(state["output_folder"], *parts)) if allowed else ""
+        if not file_path.startswith(state["output_folder"] + os.sep):
+            self.send_error(404)
+            return
+        if not os.path.isfile(file_path):
+            if len(parts) == 2 and parts[0] == "screenshots":
+                # Output written with --storage sharded or archive: the screenshot is in its shard folder or the container
+                file_path = find_screenshot(state["output_folder"], parts[1])
+            elif len(parts) == 2 and parts[0] == "thumbnails":
+                # --storage sharded or archive: the thumbnail is in the shard folder of its screenshot
+                file_path = thumbnail_path(state["output_folder"], os.path.splitext(parts[1])[0] + ".png", True)
+            else:
+                self.send_error(404)
+                return
+        try:
+            size, mtime_ns = screenshot_stat(file_path)
+        except OSError:
+            self.send_error(404)
+            return
+        etag = f'"{size:x}-{mtime_ns:x}"'
+        last_modified = formatdate(mtime_ns / 1e9, usegmt=True)
+        if self.not_modified(etag, mtime_ns / 1e9):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Cache-Control", FILE_CACHE_CONTROL)
+            self.end_headers()
+            return
+
+        byte_range = None
+        if self.headers.get("Range") and self.headers.get("If-Range", etag) in (etag, last_modified):
+            byte_range = parse_range(self.headers["Range"], size)
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        start, end = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(os.path.splitext(file_path)[1].lower(), "application/octet-stream"))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Cache-Control", FILE_CACHE_CONTROL)
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if self.head_only:
+            return
+        with open_screenshot(file_path) as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(SERVE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_report(output_folder, report, address):
+    """Serve the report rows of output_folder on [HOST:]PORT (HOST defaults to 127.0.0.1, IPv6 in brackets) until interrupted"""
+    host, _, port = str(address).rpartition(":")
+    server = make_http_server(address, ReportHandler)
+    server.daemon_threads = True
+    server.report = prepare_served_report(output_folder, report)
+    print(f"Serving {len(server.report['rows'])} screenshots at http://{host or '127.0.0.1'}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        server.server_close()
+
+
+SERVE_SCRIPT = """
+            (function() {
+            const PAGE_SIZE = %d;
+            const grid = document.getElementById("grid");
+            const form = document.getElementById("filters");
+            const info = document.getElementById("page-info");
+            let offset = 0;
+            let total = 0;
+
+            function escapeHtml(text) {
+                return String(text).replace(/[&<>"']/g, c => ({ "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" })[c]);
+            }
+
+            function thumbnailSrc(row) {
+                return row.thumb ? "thumbnails/" + encodeURIComponent(row.img.replace(/\.png$/, ".jpg")) : "screenshots/" + encodeURIComponent(row.img);
+            }
+
+            // Solo la pagina corrente è in memoria: ogni cambio di pagina o filtro chiede le sue righe all'API
+            async function load() {
+                const params = new URLSearchParams(new FormData(form));
+                params.set("offset", offset);
+                params.set("limit", PAGE_SIZE);
+                const response = await fetch("api/rows?" + params.toString());
+                const page = await response.json();
+                total = page.total;
+                grid.innerHTML = page.rows.map(row => `<div class="item">
+                        <a href="screenshots/${encodeURIComponent(row.img)}" target="_blank"><img src="${thumbnailSrc(row)}" alt="${escapeHtml(row.domain)}" loading="lazy"></a>
+                        <div class="domain">${escapeHtml(row.domain)}</div>
+                        ${row.title ? `<div class="title">${escapeHtml(row.title)}</div>` : ""}
+                        <a class="url" href="${escapeHtml(row.url)}" target="_blank">${escapeHtml(row.url)}</a>
+                        <div>
+                            ${row.status ? `<span class="badge">${escapeHtml(row.status)}</span>` : ""}
+                            ${row.clusterSize > 1 ? `<a class="badge cluster" href="#" data-cluster="${row.cluster}">#${row.cluster} &times;${row.clusterSize}</a>` : ""}
+                            ${row.category ? `<span class="badge">${escapeHtml(row.category)}</span>` : ""}
+                        </div>
+                    </div>`).join("");
+                const last = Math.min(total, offset + PAGE_SIZE);
+                info.textContent = total ? `${offset + 1}-${last} of ${total}` : "No screenshots";
+            }
+
+            form.addEventListener("submit", function(event) {
+                event.preventDefault();
+                offset = 0;
+                load();
+            });
+            document.getElementById("prev").addEventListener("click", function() {
+                if (offset === 0) return;
+                offset = Math.max(0, offset - PAGE_SIZE);
+                load();
+            });
+            document.getElementById("next").addEventListener("click", function() {
+                if (offset + PAGE_SIZE >= total) return;
+                offset += PAGE_SIZE;
+                load();
+            });
+            // Click su un badge di cluster: filtra il cluster
+            grid.addEventListener("click", function(event) {
+                const badge = event.target.closest(".cluster");
+                if (!badge) return;
+                event.preventDefault();
+                form.elements.cluster.value = badge.dataset.cluster;
+                offset = 0;
+                load();
+            });
+            fetch("api/summary").then(response => response.json()).then(function(data) {
+                const select = form.elements.category;
+                Object.keys(data.categories).sort().forEach(function(category) {
+                    select.insertAdjacentHTML("beforeend", `<option value="${escapeHtml(category)}">${escapeHtml(category)} (${data.categories[category]})</option>`);
+                });
+            });
+            load();
+            })();
+""" % SERVE_PAGE_SIZE
+
+
+def render_serve_page(title):
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Screenshot Report - {html.escape(title)}</title>
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; margin: 0; background-color: #f5f5f5; }}
+        .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 16px 24px; }}
+        .header h1 {{ margin: 0 0 12px 0; font-size: 22px; }}
+        .header form {{ display: flex; flex-wrap: wrap; gap: 8px; align-items: center; }}
+        .header input, .header select, .header button {{ padding: 6px 10px; border: none; border-radius: 4px; font-size: 13px; }}
+        .grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 20px; padding: 20px; }}
+        .item {{ background: white; border-radius: 8px; padding: 10px; box-shadow: 0 2px 6px rgba(0, 0, 0, 0.08); overflow: hidden; }}
+        .item img {{ width: 100%; height: 180px; object-fit: cover; object-position: top; border-radius: 4px; }}
+        .domain {{ font-weight: 600; font-size: 13px; margin-top: 6px; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; }}
+        .title {{ font-size: 12px; color: #555; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; }}
+        .url {{ font-size: 11px; color: #667eea; display: block; overflow: hidden; text-overflow: ellipsis; white-space: nowrap; }}
+        .badge {{ display: inline-block; font-size: 10px; font-weight: 600; padding: 2px 6px; border-radius: 4px; margin-top: 4px; color: #764ba2; background-color: #f0ebf8; text-decoration: none; }}
+        .pager {{ display: flex; gap: 12px; align-items: center; padding: 0 20px 20px 20px; }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>📸 Screenshot Report - {html.escape(title)}</h1>
+        <form id="filters">
+            <input type="text" name="q" placeholder="🔍 Search domain, URL, title, body...">
+            <input type="text" name="status" placeholder="Status (e.g. 403, 4)" size="12">
+            <input type="text" name="cluster" placeholder="Cluster" size="8">
+            <select name="category"><option value="">Any category</option></select>
+            <select name="rescan"><option value="">Any re-scan state</option><option value="new">new</option><option value="changed">changed</option><option value="unchanged">unchanged</option></select>
+            <button type="submit">Filter</button>
+            <a href="report.html" style="color: white;">Full report</a>
+        </form>
+    </div>
+    <div class="grid" id="grid"></div>
+    <div class="pager">
+        <button id="prev">‹ Previous</button>
+        <span id="page-info"></span>
+        <button id="next">Next ›</button>
+    </div>
+    <script>
+{SERVE_SCRIPT}
+    </script>
+</body>
+</html>
+"""
@@ -0,0 +1,80 @@
+import os
+import re
+import json
+
+# Known boilerplate pages (default server pages, parked domains, router logins,
+# challenge pages, browser error pages), matched against what the capture
+# already has: the title, the body text, the page fingerprints and the
+# perceptual hashes. signatures.json ships with the tool; files given with
+# --signatures are checked first, so they can add categories or override ours.
+
+SIGNATURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "signatures.json")
+# Default Hamming distance for the "fingerprints" and "hashes" conditions of a signature
+SIGNATURE_DISTANCE = 6
+SIGNATURE_CONDITIONS = ["title", "text", "fingerprints", "hashes"]
+# Boilerplate says what it is near the top; longer bodies are only matched up to here
+SIGNATURE_TEXT_CHARS = 10000
+
+
+def compile_signature(signature, source):
+    """Check one signature entry and compile its patterns; raises ValueError on an invalid entry"""
+    name = signature.get("name") or signature.get("category")
+    if not signature.get("category") or not re.fullmatch(r"[a-z0-9][a-z0-9_-]*", signature["category"]):
+        raise ValueError(f"{source}: signature '{name}' needs a category made of lowercase letters, digits, '-' and '_'")
+    if not any(signature.get(condition) for condition in SIGNATURE_CONDITIONS):
+        raise ValueError(f"{source}: signature '{name}' has no condition ({', '.join(SIGNATURE_CONDITIONS)})")
+    compiled = {"name": name, "category": signature["category"], "distance": int(signature.get("distance", SIGNATURE_DISTANCE))}
+    # Not a condition on its own: keeps body patterns to short pages, where boilerplate is the whole page
+    if signature.get("max_text") is not None:
+        compiled["max_text"] = int(signature["max_text"])
+    for condition in ("title", "text"):
+        if signature.get(condition):
+            try:
+                compiled[condition] = re.compile(signature[condition], re.IGNORECASE)
+            except re.error as e:
+                raise ValueError(f"{source}: signature '{name}' has an invalid {condition} pattern → {e}")
+    for condition in ("fingerprints", "hashes"):
+        if signature.get(condition):
+            compiled[condition] = {kind: int(value, 16) for kind, value in signature[condition].items()}
+    return compiled
+
+
+def load_signatures(extra_files=()):
+    """Signatures of extra_files (in order) followed by the bundled ones, compiled for classify_page"""
+    signatures = []
+    for path in [*extra_files, SIGNATURES_FILE]:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for signature in entries.get("signatures", []) if isinstance(entries, dict) else entries:
+            signatures.append(compile_signature(signature, path))
+    return signatures
+
+
+def hashes_within(expected, values, distance):
+    for kind, value in expected.items():
+        if not values.get(kind) or bin(value ^ int(values[kind], 16)).count("1") > distance:
+            return False
+    return True
+
+
+def classify_page(signatures, title, text, fingerprints=None, hashes=None):
+    """(category, signature name) of the first signature whose conditions all match, or ("", "")
+
+    Signatures with a "hashes" condition only match once the screenshot has
+    been hashed; without hashes they are skipped. Signatures with "max_text"
+    only match pages whose body text is at most that long.
+    """
+    title, text_length, text = title or "", len(text or ""), (text or "")[:SIGNATURE_TEXT_CHARS]
+    for signature in signatures:
+        if "max_text" in signature and text_length > signature["max_text"]:
+            continue
+        if "title" in signature and not signature["title"].search(title):
+            continue
+        if "text" in signature and not signature["text"].search(text):
+            continue
+        if "fingerprints" in signature and not hashes_within(signature["fingerprints"], fingerprints or {}, signature["distance"]):
+            continue
+        if "hashes" in signature and not hashes_within(signature["hashes"], hashes or {}, signature["distance"]):
+            continue
+        return signature["category"], signature["name"]
+    return "", ""
@@ -0,0 +1,347 @@
+import io
+import os
+import json
+import atexit
+import time
+import sqlite3
+import shutil
+import hashlib
+import threading
+from stat import S_ISREG
+
+# Content-addressed storage (--storage cas): every unique screenshot is written
+# once under blobs/, named by the SHA-256 of its PNG bytes, and the per-target
+# file in screenshots/ is a hardlink to it. Parked pages and default pages
+# served on many hosts then take the disk space (and the hashing) of one.
+#
+# Archive storage (--storage archive): the screenshots live in a single SQLite
+# file, screenshots.sqlite, with the same content addressing (one row per
+# unique PNG, one row per target pointing at it) instead of one file each.
+# A screenshot in the archive is addressed like a file inside a folder named
+# after it, <output>/screenshots.sqlite/<name>.png, so the readers below take
+# plain paths and archive paths alike.
+#
+# Sharded storage (--storage sharded): plain files, but spread over two levels
+# of folders named after a hash of the file name, screenshots/<ab>/<cd>/<name>,
+# and listed in screenshots/manifest.jsonl (one JSON line per file, appended as
+# they are written) so nothing has to list the folders.
+
+STORAGE_MODES = ["files", "cas", "archive", "sharded"]
+SCREENSHOTS_FOLDER = "screenshots"
+SCREENSHOT_MANIFEST_FILE = "manifest.jsonl"
+BLOBS_FOLDER = "blobs"
+BLOB_MANIFEST_FILE = "manifest.json"
+BLOB_MANIFEST_VERSION = 1
+ARCHIVE_FILE = "screenshots.sqlite"
+ARCHIVE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, data BLOB NOT NULL);
+    CREATE TABLE IF NOT EXISTS screenshots (name TEXT PRIMARY KEY, digest TEXT NOT NULL REFERENCES blobs(digest), size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL);
+"""
+
+# One connection per archive, shared by the worker threads; every statement runs under archive_lock
+archive_connections = {}
+archive_lock = threading.Lock()
+manifest_lock = threading.Lock()
+
+
+def blob_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_path(output_folder, digest):
+    """blobs/<first two hex digits>/<digest>.png, so no folder holds more than a fraction of the blobs"""
+    return os.path.join(output_folder, BLOBS_FOLDER, digest[:2], digest + ".png")
+
+
+def store_blob(output_folder, data, digest):
+    """Write data as the blob named digest unless it already exists; returns (path, whether it was written now)"""
+    path = blob_path(output_folder, digest)
+    if os.path.exists(path):
+        return path, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Two workers can capture the same new page at once: each writes its own temporary file
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path, True
+
+
+def link_file(source, target):
+    """Make target the same file as source: a hardlink, or a copy where the filesystem cannot link. Replaces target."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def build_blob_index(domain_details):
+    """Map the blobs already stored in this output folder to the screenshot and hashes of their first capture"""
+    index = {}
+    for details in (domain_details or {}).values():
+        if details.get("blob") and details.get("screenshot") and not details.get("alias_of"):
+            index.setdefault(details["blob"], {"screenshot": details["screenshot"], "hashes": details.get("hashes", {})})
+    return index
+
+
+def write_blob_manifest(output_folder, domain_details):
+    """Write blobs/manifest.json: target -> screenshot file name, blob digest and size"""
+    targets = {
+        domain: {"screenshot": details["screenshot"], "blob": details["blob"], "size": details.get("screenshot_size")}
+        for domain, details in domain_details.items()
+        if details.get("blob") and details.get("screenshot") and not details.get("alias_of")
+    }
+    path = os.path.join(output_folder, BLOBS_FOLDER, BLOB_MANIFEST_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "version": BLOB_MANIFEST_VERSION,
+            "blobs": len({entry["blob"] for entry in targets.values()}),
+            "targets": targets,
+        }, f)
+    os.replace(tmp_path, path)
+    return targets
+
+
+def open_archive(archive_path, create=False):
+    """Connection to the archive at archive_path (created with create=True), or None when it does not exist"""
+    with archive_lock:
+        connection = archive_connections.get(archive_path)
+        if connection is None:
+            if not create and not os.path.isfile(archive_path):
+                return None
+            os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+            connection = sqlite3.connect(archive_path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(ARCHIVE_SCHEMA)
+            archive_connections[archive_path] = connection
+        return connection
+
+
+def close_archives():
+    with archive_lock:
+        for connection in archive_connections.values():
+            connection.close()
+        archive_connections.clear()
+
+
+# Closing checkpoints the write-ahead log, so a finished run leaves a single file
+atexit.register(close_archives)
+
+
+def archive_put(archive_path, name, data, digest=None):
+    """Store data as name in the archive (its bytes only once per digest); returns the digest"""
+    digest = digest or blob_digest(data)
+    connection = open_archive(archive_path, create=True)
+    with archive_lock:
+        connection.execute("BEGIN")
+        try:
+            connection.execute("INSERT OR IGNORE INTO blobs (digest, data) VALUES (?, ?)", (digest, sqlite3.Binary(data)))
+            connection.execute("INSERT OR REPLACE INTO screenshots (name, digest, size, mtime_ns) VALUES (?, ?, ?, ?)", (name, digest, len(data), time.time_ns()))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    return digest
+
+
+def archive_entries(archive_path):
+    """name -> (size, mtime_ns, digest) of every screenshot in the archive ({} without an archive)"""
+    connection = open_archive(archive_path)
+    if connection is None:
+        return {}
+    with archive_lock:
+        return {name: (size, mtime_ns, digest) for name, size, mtime_ns, digest in connection.execute("SELECT name, size, mtime_ns, digest FROM screenshots")}
+
+
+def split_archive_path(path):
+    """(archive path, name) for a path inside an archive, (None, path) for a plain file"""
+    folder, name = os.path.split(path)
+    if os.path.basename(folder) == ARCHIVE_FILE and os.path.isfile(folder):
+        return folder, name
+    return None, path
+
+
+def archive_row(archive_path, name, columns):
+    connection = open_archive(archive_path)
+    row = None
+    if connection is not None:
+        with archive_lock:
+            row = connection.execute(f"SELECT {columns} FROM screenshots JOIN blobs USING (digest) WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        raise FileNotFoundError(f"No screenshot '{name}' in {archive_path}")
+    return row
+
+
+def screenshot_stat(path):
+    """(size, mtime_ns) of a screenshot file or archive entry; raises OSError when it does not exist"""
+    archive_path, name = split_archive_path(path)
+    if archive_path is None:
+        stat = os.stat(path)
+        if not S_ISREG(stat.st_mode):
+            raise IsADirectoryError(f"Not a screenshot file: {path}")
+        return stat.st_size, stat.st_mtime_ns
+    return tuple(archive_row(archive_path, name, "size, mtime_ns"))
+
+
+def screenshot_exists(path):
+    try:
+        screenshot_stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def open_screenshot(path):
+    """Binary file object with the PNG of a screenshot file or archive entry"""
+    archive_path, name = split_archive_path(path)
+    if archive_path is None:
+        return open(path, "rb")
+    return io.BytesIO(archive_row(archive_path, name, "data")[0])
+
+
+def shard_prefix(name):
+    """Folders of name in sharded storage, "<ab>/<cd>": the top two bytes of its 32-bit FNV-1a hash (shardPrefix in the report)"""
+    value = 0x811c9dc5
+    for byte in name.encode("utf-8"):
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return f"{value >> 24:02x}/{(value >> 16) & 0xff:02x}"
+
+
+def shard_folder(folder, name):
+    """The <ab>/<cd> subfolder of folder for screenshot name; thumbnails and tiles use the same folders as their screenshot"""
+    return os.path.join(folder, *shard_prefix(name).split("/"))
+
+
+def sharded_path(output_folder, name):
+    return os.path.join(shard_folder(os.path.join(output_folder, SCREENSHOTS_FOLDER), name), name)
+
+
+def load_screenshot_manifest(output_folder):
+    """name -> path inside screenshots/ of every file in the sharded manifest ({} for other layouts)"""
+    manifest = {}
+    try:
+        with open(os.path.join(output_folder, SCREENSHOTS_FOLDER, SCREENSHOT_MANIFEST_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    manifest[entry["name"]] = entry["path"]
+                except (ValueError, KeyError, TypeError):
+                    # A line cut short by an interrupted run
+                    continue
+    except OSError:
+        pass
+    return manifest
+
+
+def record_screenshot(output_folder, manifest, name):
+    """Add a file written to its sharded path to the manifest (in memory and on disk)"""
+    with manifest_lock:
+        if name in manifest:
+            return
+        manifest[name] = f"{shard_prefix(name)}/{name}"
+        with open(os.path.join(output_folder, SCREENSHOTS_FOLDER, SCREENSHOT_MANIFEST_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"name": name, "path": manifest[name]}) + "\n")
+
+
+def screenshot_paths(output_folder):
+    """name -> path of every screenshot of an output folder, from the archive, the sharded manifest or the flat folder"""
+    archive_path = os.path.join(output_folder, ARCHIVE_FILE)
+    entries = archive_entries(archive_path)
+    if entries:
+        return {name: os.path.join(archive_path, name) for name in entries}
+    folder = os.path.join(output_folder, SCREENSHOTS_FOLDER)
+    manifest = load_screenshot_manifest(output_folder)
+    if manifest:
+        return {name: os.path.join(folder, *path.split("/")) for name, path in manifest.items()}
+    if not os.path.isdir(folder):
+        return {}
+    return {name: os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".png")}
+
+
+def find_screenshot(output_folder, name):
+    """Path of one screenshot whatever the layout (flat, sharded or archive); the flat path when there is none"""
+    for path in (os.path.join(output_folder, SCREENSHOTS_FOLDER, name), sharded_path(output_folder, name), os.path.join(output_folder, ARCHIVE_FILE, name)):
+        if screenshot_exists(path):
+            return path
+    return os.path.join(output_folder, SCREENSHOTS_FOLDER, name)
+
+
+def screenshot_output_folder(path):
+    """Output folder a screenshot file or archive entry belongs to"""
+    folder = os.path.dirname(path)
+    while os.path.basename(folder) not in (SCREENSHOTS_FOLDER, ARCHIVE_FILE) and os.path.dirname(folder) != folder:
+        folder = os.path.dirname(folder)
+    return os.path.dirname(folder)
+
+
+def shard_previews(output_folder):
+    """Move the flat thumbnails and tile folders of output_folder to the shard folders of their screenshot"""
+    from generate_report import THUMBNAILS_FOLDER, TILES_FOLDER, TILES_INFO_FILE
+
+    thumbnails = os.path.join(output_folder, THUMBNAILS_FOLDER)
+    if os.path.isdir(thumbnails):
+        with os.scandir(thumbnails) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".jpg"):
+                    target = os.path.join(shard_folder(thumbnails, os.path.splitext(entry.name)[0] + ".png"), entry.name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(entry.path, target)
+    tiles = os.path.join(output_folder, TILES_FOLDER)
+    if os.path.isdir(tiles):
+        with os.scandir(tiles) as entries:
+            for entry in entries:
+                # A tile pyramid has its info file; the shard folders do not
+                if entry.is_dir() and os.path.exists(os.path.join(entry.path, TILES_INFO_FILE)):
+                    target = os.path.join(shard_folder(tiles, entry.name + ".png"), entry.name)
+                    shutil.rmtree(target, ignore_errors=True)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(entry.path, target)
+
+
+def migrate_to_sharded(output_folder):
+    """Move the screenshots of a flat output folder to their sharded paths and write the manifest; returns how many moved.
+
+    Thumbnails and tile folders move to the shard folders of their screenshot.
+    Files keep their modification time (and hardlinks), so hashes, thumbnails
+    and the report index stay valid. Safe to run again after an interruption:
+    the manifest is rebuilt from the shard folders at the end.
+    """
+    folder = os.path.join(output_folder, SCREENSHOTS_FOLDER)
+    moved = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".png"):
+                target = sharded_path(output_folder, entry.name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(entry.path, target)
+                moved += 1
+    shard_previews(output_folder)
+    names = []
+    for top in sorted(os.listdir(folder)):
+        if len(top) == 2 and os.path.isdir(os.path.join(folder, top)):
+            for sub in sorted(os.listdir(os.path.join(folder, top))):
+                names.extend(f"{top}/{sub}/{name}" for name in sorted(os.listdir(os.path.join(folder, top, sub))) if name.endswith(".png"))
+    manifest_path = os.path.join(folder, SCREENSHOT_MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        for path in names:
+            f.write(json.dumps({"name": path.rsplit("/", 1)[1], "path": path}) + "\n")
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return moved
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the flat screenshots/ folder of an output folder to sharded storage (--storage sharded).")
+    parser.add_argument("-o", "--output-folder", required=True, help="Output folder whose screenshots/ folder is converted.")
+    args = parser.parse_args()
+    if not os.path.isdir(os.path.join(args.output_folder, SCREENSHOTS_FOLDER)):
+        parser.error(f"no {SCREENSHOTS_FOLDER}/ folder in '{args.output_folder}'")
+    moved = migrate_to_sharded(args.output_folder)
+    print(f"Moved {moved} screenshots; {len(load_screenshot_manifest(args.output_folder))} listed in {SCREENSHOTS_FOLDER}/{SCREENSHOT_MANIFEST_FILE}.")